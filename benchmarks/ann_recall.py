@@ -0,0 +1,146 @@
+"""
+Recall vs latency of the approximate IVFIndex against exact GalleryIndex search.
+
+The bundled data/embeddings.pkl only holds a few identities, so larger galleries
+are synthesized from it: new identities are drawn around the bundled identity
+centers with the measured between- and within-identity spread.
+
+Usage:
+    python benchmarks/ann_recall.py --sizes 45 10000 100000 --output benchmarks/ann_recall.md
+"""
+import os
+import time
+import pickle
+import argparse
+import numpy as np
+from frsystem.gallery import GalleryIndex
+from frsystem.ann import IVFIndex
+
+
+def loadEmbeddings(path):
+    with open(path, "rb") as f:
+        embeddings = pickle.load(f)
+
+    centers, samples, owners = [], [], []
+    for ref_id, embed_list in embeddings.items():
+        person = np.vstack(embed_list).astype(np.float32)
+        centers.append(person.mean(axis=0))
+        samples.append(person - person.mean(axis=0))
+        owners += [ref_id] * len(embed_list)
+
+    bundled = np.vstack([e for l in embeddings.values() for e in l]).astype(np.float32)
+    return bundled, np.asarray(owners), np.vstack(centers), np.vstack(samples)
+
+def synthesizeGallery(centers, residuals, size, per_person=5, seed=0):
+    """
+    Returns 'size' embeddings of size // per_person synthetic identities,
+    the identity of every embedding and a function drawing new query
+    embeddings of those identities.
+    """
+    rng = np.random.RandomState(seed)
+    between = centers.std(axis=0)
+    within = residuals.std(axis=0)
+
+    n_people = max(1, size // per_person)
+    people = centers[rng.randint(len(centers), size=n_people)] + rng.randn(n_people, centers.shape[1]) * between
+    people = people.astype(np.float32)
+    owner = np.arange(size) % n_people
+    gallery = people[owner] + (rng.randn(size, centers.shape[1]) * within).astype(np.float32)
+
+    def queries(n):
+        picked = rng.randint(n_people, size=n)
+        return people[picked] + (rng.randn(n, centers.shape[1]) * within).astype(np.float32)
+
+    return gallery, owner, queries
+
+def timeSearch(index, queries, k, repeat=3, **kwargs):
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = index.search(queries, k=k, **kwargs)
+        best = min(best, time.perf_counter() - start)
+    return result, best / len(queries) * 1000
+
+def timeSingleSearch(index, queries, k, **kwargs):
+    """
+    Latency of one query at a time in milliseconds, as in the per-frame recognition path.
+    """
+    start = time.perf_counter()
+    for query in queries:
+        index.search(query, k=k, **kwargs)
+    return (time.perf_counter() - start) / len(queries) * 1000
+
+def identityAgreement(found, truth, owners):
+    return np.mean(owners[found[:, 0]] == owners[truth[:, 0]])
+
+def recallAtK(found, truth):
+    k = truth.shape[1]
+    hits = [len(np.intersect1d(f[:k], t)) for f, t in zip(found, truth)]
+    return np.sum(hits) / truth.size
+
+def run(args):
+    bundled, bundled_owners, centers, residuals = loadEmbeddings(args.embeddings)
+    lines = []
+    def emit(line):
+        lines.append(line)
+        print(line)
+
+    emit("| gallery | engine | nprobe | recall@1 | recall@{} | same identity@1 | ms/query (batch) | speedup | ms/query (single) | speedup |".format(args.k))
+    emit("|---:|---|---:|---:|---:|---:|---:|---:|---:|---:|")
+
+    for size in args.sizes:
+        if size <= len(bundled):
+            rng = np.random.RandomState(0)
+            gallery, owners = bundled[:size], bundled_owners[:size]
+            queries = gallery[rng.randint(size, size=args.queries)] + rng.randn(args.queries, gallery.shape[1]).astype(np.float32)
+        else:
+            gallery, owners, draw = synthesizeGallery(centers, residuals, size)
+            queries = draw(args.queries)
+        ids = np.arange(len(gallery))
+
+        exact = GalleryIndex()
+        exact.build({i: [e] for i, e in zip(ids, gallery)})
+        (truth, _), exact_ms = timeSearch(exact, queries, args.k)
+        exact_single = timeSingleSearch(exact, queries[:args.single], args.k)
+        emit("| {} | exact | - | 1.000 | 1.000 | 1.000 | {:.3f} | 1.0x | {:.3f} | 1.0x |".format(size, exact_ms, exact_single))
+
+        index = IVFIndex()
+        index.train(gallery)
+        index.add(gallery, ids)
+
+        for nprobe in args.nprobe:
+            if nprobe > index.nlist:
+                continue
+            (found, _), ms = timeSearch(index, queries, args.k, nprobe=nprobe)
+            single = timeSingleSearch(index, queries[:args.single], args.k, nprobe=nprobe)
+            emit("| {} | ivf (nlist={}) | {} | {:.3f} | {:.3f} | {:.3f} | {:.3f} | {:.1f}x | {:.3f} | {:.1f}x |".format(
+                size, index.nlist, nprobe,
+                recallAtK(found[:, :1], truth[:, :1]),
+                recallAtK(found, truth),
+                identityAgreement(found, truth, owners),
+                ms, exact_ms / ms, single, exact_single / single))
+
+    header = ["# IVFIndex recall vs latency", "",
+              "Exact GalleryIndex search vs IVFIndex on {} ({} queries, k={}).".format(args.embeddings, args.queries, args.k),
+              "Galleries larger than the bundled file are synthesized from its identity statistics.",
+              "recall@k is measured against the exact top-k rows, 'same identity@1' checks that",
+              "the approximate best match belongs to the same person as the exact one.",
+              "Latencies are given for the whole batch of queries in one call and for",
+              "{} queries searched one at a time.".format(args.single), ""]
+    report = "\n".join(header + lines) + "\n"
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report)
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recall vs latency of IVFIndex against exact search.")
+    parser.add_argument("--embeddings", default=os.path.join("data", "embeddings.pkl"))
+    parser.add_argument("--sizes", type=int, nargs="+", default=[45, 10000, 100000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--single", type=int, default=50, help="queries searched one at a time")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--output", default=None)
+
+    run(parser.parse_args())
@@ -0,0 +1,57 @@
+"""
+Checks that "import frsystem" stays fast and does not load any model framework.
+
+The import runs in fresh interpreters (best of --repeat) so that nothing is cached,
+then the heavy modules found in sys.modules are listed. Exits with status 1 when the
+import is slower than --budget seconds or loads one of the heavy modules, so it can
+run in CI next to stages.py.
+
+Usage:
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --budget 1.0 --repeat 5
+"""
+import sys
+import json
+import argparse
+import subprocess
+
+HEAVY_MODULES = ("tensorflow", "keras", "mtcnn", "sklearn", "onnxruntime", "onnx", "keras2onnx")
+
+PROBE = """
+import sys, time, json
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "modules": sorted(m for m in sys.modules if m.split(".")[0] in {heavy!r})}}))
+"""
+
+def importTime(module="frsystem", heavy=HEAVY_MODULES):
+    """
+    Imports 'module' in a new interpreter.
+    Returns the import time in seconds and the heavy modules it loaded.
+    """
+    code = PROBE.format(module=module, heavy=tuple(heavy))
+    output = subprocess.run([sys.executable, "-c", code], check=True, capture_output=True, text=True).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    return result["seconds"], result["modules"]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import time of frsystem and the heavy modules it loads.")
+    parser.add_argument("--module", default="frsystem")
+    parser.add_argument("--budget", type=float, default=1.0, help="maximal import time in seconds")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    runs = [importTime(args.module) for _ in range(args.repeat)]
+    seconds = min(t for t, _ in runs)
+    loaded = sorted(set(m for _, modules in runs for m in modules))
+    print("import {}: {:.3f}s (budget {:.3f}s)".format(args.module, seconds, args.budget))
+
+    failed = False
+    if seconds > args.budget:
+        print("too slow: import takes more than {:.3f}s".format(args.budget))
+        failed = True
+    if loaded:
+        print("heavy modules loaded at import: " + ", ".join(loaded))
+        failed = True
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,228 @@
+"""
+Micro-benchmarks of every stage of the recognition pipeline.
+
+Runs offline on the bundled images (static/img), on synthetic frames and on
+galleries synthesized from data/embeddings.pkl (see ann_recall.py), and reports
+p50/p95/p99 latency and throughput per stage, per face count and per gallery size.
+
+Results are saved as JSON so that two runs can be compared to catch regressions:
+
+Usage:
+    python benchmarks/stages.py --output benchmarks/results/baseline.json
+    python benchmarks/stages.py --output new.json --compare benchmarks/results/baseline.json
+
+The embedding stage only runs when the model weights are given (--weights).
+"""
+import os
+import sys
+import glob
+import json
+import time
+import platform
+import argparse
+import cv2
+import numpy as np
+from ann_recall import loadEmbeddings, synthesizeGallery
+from frsystem.frs import FaceRecognitionSystem
+from frsystem.gallery import GalleryIndex
+from frsystem.preprocess import FacePreprocessor
+from frsystem.box_utils import hard_nms
+
+
+def measure(fn, repeat, warmup=2, min_time=0.0):
+    """
+    Calls fn 'warmup' times, then at least 'repeat' times (and at least 'min_time' seconds).
+    Returns the latencies in milliseconds.
+    """
+    for _ in range(warmup):
+        fn()
+    samples = []
+    start = time.perf_counter()
+    while len(samples) < repeat or time.perf_counter() - start < min_time:
+        begin = time.perf_counter()
+        fn()
+        samples.append(1000 * (time.perf_counter() - begin))
+    return np.asarray(samples)
+
+def summarize(samples, items=1):
+    """
+    Latency percentiles of the samples and throughput in items per second.
+    """
+    return {"p50_ms": float(np.percentile(samples, 50)),
+            "p95_ms": float(np.percentile(samples, 95)),
+            "p99_ms": float(np.percentile(samples, 99)),
+            "mean_ms": float(samples.mean()),
+            "throughput": float(items * 1000 / samples.mean()),
+            "runs": int(samples.size)}
+
+def key(stage, **params):
+    return stage + "".join("[{}={}]".format(name, params[name]) for name in sorted(params))
+
+def loadImages(pattern):
+    images = {}
+    for path in sorted(glob.glob(pattern)):
+        image = cv2.imread(path)
+        if image is not None:
+            images[os.path.basename(path)] = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    # a frame without faces, as most webcam frames
+    images["empty-640x480"] = np.random.RandomState(0).randint(0, 255, (480, 640, 3)).astype(np.uint8)
+    return images
+
+def syntheticFeatures(image, n_faces, rng):
+    h, w = image.shape[:2]
+    features = []
+    for _ in range(n_faces):
+        size = rng.uniform(0.08, 0.2) * w
+        x, y = rng.uniform(0, w - 2 * size), rng.uniform(0, h - 2 * size)
+        features.append({"left_eye": (int(x + 0.3 * size), int(y + 0.4 * size)),
+                         "right_eye": (int(x + 0.7 * size), int(y + 0.42 * size)),
+                         "nose": (int(x + 0.5 * size), int(y + 0.6 * size))})
+    return features
+
+def syntheticPriors(n, rng):
+    """
+    UltraLight-like outputs: boxes in corner form around a few faces and their scores.
+    """
+    centers = rng.rand(max(1, n // 50), 2) * 0.8 + 0.1
+    picked = centers[rng.randint(len(centers), size=n)] + rng.randn(n, 2) * 0.01
+    sizes = rng.uniform(0.05, 0.15, (n, 2))
+    boxes = np.concatenate([picked - sizes / 2, picked + sizes / 2], axis=1)
+    scores = rng.uniform(0.3, 1.0, (n, 1))
+    return np.concatenate([boxes, scores], axis=1).astype(np.float32)
+
+def run(args):
+    rng = np.random.RandomState(0)
+    results = {}
+    def record(name, samples, items=1, **params):
+        results[key(name, **params)] = dict(stage=name, params=params, **summarize(samples, items))
+        r = results[key(name, **params)]
+        print("{:<60} p50 {:8.3f} ms  p95 {:8.3f} ms  p99 {:8.3f} ms  {:10.1f}/s".format(
+            key(name, **params), r["p50_ms"], r["p95_ms"], r["p99_ms"], r["throughput"]))
+
+    frs = FaceRecognitionSystem(embedding_model=args.model if args.weights else None,
+                                weights=args.weights,
+                                engine=args.engine,
+                                detector=args.detector,
+                                detector_path=args.detector_path,
+                                detection_cache_size=0)
+    images = loadImages(args.images)
+
+    # detection, on every bundled and synthetic image
+    detected = {}
+    for name, image in images.items():
+        samples = measure(lambda: frs.detectFaces(image), args.repeat)
+        detected[name] = frs.detectFaces(image)
+        record("detectFaces", samples, detector=args.detector, image=name, faces=len(detected[name][0]))
+
+    # alignment of one face, with real detected faces
+    for name, (locations, features) in detected.items():
+        if features:
+            samples = measure(lambda: frs.alignCropFace(images[name], 160, locations[0], features[0]), args.repeat)
+            record("alignCropFace", samples, image=name, face_size=160)
+
+    # batched alignment and normalisation, per face count
+    image = next(iter(images.values()))
+    for face_size in (160, 224):
+        preprocessor = FacePreprocessor(face_size)
+        for n_faces in args.faces:
+            features = syntheticFeatures(image, n_faces, rng)
+            samples = measure(lambda: preprocessor(image, features), args.repeat)
+            record("preprocess", samples, items=n_faces, face_size=face_size, faces=n_faces)
+
+    # embeddings, per face count
+    if args.weights:
+        for n_faces in args.faces:
+            features = syntheticFeatures(image, n_faces, rng)
+            locations = [None] * n_faces
+            samples = measure(lambda: frs.faceEmbeddings(image, locations, features), args.repeat)
+            record("faceEmbeddings", samples, items=n_faces, model=args.model, engine=args.engine, faces=n_faces)
+    else:
+        print("faceEmbeddings: skipped, no --weights given")
+
+    # matching, per gallery size
+    bundled, _, centers, residuals = loadEmbeddings(args.embeddings)
+    for size in args.gallery_sizes:
+        if size <= len(bundled):
+            gallery = bundled[:size]
+            queries = gallery[rng.randint(size, size=max(args.faces))] + 0.1
+        else:
+            gallery, _, draw = synthesizeGallery(centers, residuals, size)
+            queries = draw(max(args.faces))
+        samples = measure(lambda: FaceRecognitionSystem.faceDistance(queries[0], gallery), args.repeat)
+        record("faceDistance", samples, gallery=size)
+
+        index = GalleryIndex()
+        index.setMatrix(gallery, np.arange(size))
+        for n_faces in args.faces:
+            samples = measure(lambda: index.search(queries[:n_faces], k=1), args.repeat)
+            record("gallerySearch", samples, items=n_faces, gallery=size, faces=n_faces)
+
+    # non-maximum suppression, per number of candidate boxes
+    for n_boxes in args.boxes:
+        box_scores = syntheticPriors(n_boxes, rng)
+        samples = measure(lambda: hard_nms(box_scores, iou_threshold=0.3, candidate_size=200), args.repeat)
+        record("hard_nms", samples, boxes=n_boxes)
+
+    return {"meta": {"date": time.strftime("%Y-%m-%d %H:%M:%S"),
+                     "python": platform.python_version(),
+                     "numpy": np.__version__,
+                     "opencv": cv2.__version__,
+                     "machine": platform.machine(),
+                     "processor": platform.processor(),
+                     "cpu_count": os.cpu_count(),
+                     "args": vars(args)},
+            "results": results}
+
+def compare(current, baseline, tolerance):
+    """
+    Prints the p50 ratio of every stage found in both runs.
+    Returns the stages slower than baseline by more than 'tolerance'.
+    """
+    regressions = []
+    print("\n{:<60} {:>10} {:>10} {:>7}".format("stage", "base p50", "new p50", "ratio"))
+    for name, result in sorted(current["results"].items()):
+        if name not in baseline["results"]:
+            continue
+        old = baseline["results"][name]["p50_ms"]
+        ratio = result["p50_ms"] / old if old > 0 else float("inf")
+        flag = ""
+        if ratio > 1 + tolerance:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        elif ratio < 1 - tolerance:
+            flag = "  faster"
+        print("{:<60} {:10.3f} {:10.3f} {:6.2f}x{}".format(name, old, result["p50_ms"], ratio, flag))
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Latency and throughput of every stage of the recognition pipeline.")
+    parser.add_argument("--images", default=os.path.join("static", "img", "*.png"))
+    parser.add_argument("--embeddings", default=os.path.join("data", "embeddings.pkl"))
+    parser.add_argument("--detector", default="ultralight", choices=["mtcnn", "ultralight"])
+    parser.add_argument("--detector-path", default=None)
+    parser.add_argument("--model", default="facenet", choices=["facenet", "vggface"])
+    parser.add_argument("--weights", default=None, help="embedding model weights, enables the faceEmbeddings stage")
+    parser.add_argument("--engine", default="keras", choices=["keras", "onnx"])
+    parser.add_argument("--faces", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--gallery-sizes", type=int, nargs="+", default=[45, 1000, 10000, 100000])
+    parser.add_argument("--boxes", type=int, nargs="+", default=[100, 1000, 17640])
+    parser.add_argument("--repeat", type=int, default=30)
+    parser.add_argument("--output", default=None, help="JSON file to save the results to")
+    parser.add_argument("--compare", default=None, help="JSON results of a previous run")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="relative p50 slowdown reported as a regression")
+    args = parser.parse_args()
+
+    current = run(args)
+    if args.output:
+        if os.path.dirname(args.output):
+            os.makedirs(os.path.dirname(args.output), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(current, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(current, baseline, args.tolerance)
+        if regressions:
+            print("\n{} stage(s) slower than {} by more than {:.0%}".format(len(regressions), args.compare, args.tolerance))
+            sys.exit(1)
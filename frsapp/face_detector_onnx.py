@@ -2,15 +2,12 @@ import cv2
 #import dlib
 import numpy as np
 from imutils import face_utils
-from box_utils import *
 import os
-import onnx
 os.environ['KMP_DUPLICATE_LIB_OK']='True'
-import onnxruntime as ort
+from frsystem.detectors import UltraLightDetector
+from frsystem.mask import MaskClassifier
 
 #from tensorflow.keras.models import load_model
-from tensorflow.keras.preprocessing import image
-from tensorflow.keras.applications.xception import preprocess_input
 #from tensorflow.keras.applications.xception import preprocess_input
 
 #from onnx_tf.backend import prepare
@@ -18,57 +15,25 @@ from tensorflow.keras.applications.xception import preprocess_input
 video_capture = cv2.VideoCapture(0)
 
 onnx_path = 'util/ultra_light_640.onnx'
-onnx_model = onnx.load(onnx_path)
-#predictor = prepare(onnx_model)
-ort_session = ort.InferenceSession(onnx_path)
-input_name = ort_session.get_inputs()[0].name
+detector = UltraLightDetector(onnx_path, prob_threshold=0.7, iou_threshold=0.5, refine_eyes=False)
 
 #mask_classifier = load_model(os.path.join("frsapp","models","xception"))
 #shape_predictor = dlib.shape_predictor('FacialLandmarks/shape_predictor_5_face_landmarks.dat')
 #fa = face_utils.facealigner.FaceAligner(shape_predictor, desiredFaceWidth=112, desiredLeftEye=(0.3, 0.3))
 onnx_mask = 'frsapp/models/mask-xception-onnx.onnx'
-sess = ort.InferenceSession(onnx_mask)
-input_name_mask = sess.get_inputs()[0].name
+mask_classifier = MaskClassifier(onnx_mask)
 
 while True:
     ret, frame = video_capture.read()
     if frame is not None:
-        h, w, _ = frame.shape
+        rgb_img = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB) # convert bgr to rgb
+        detections = detector.detect(rgb_img)
+        # all faces of the frame in one session run
+        scores = mask_classifier.predict(rgb_img, detections.boxes)
 
-        # preprocess img acquired
-        img = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB) # convert bgr to rgb
-        img = cv2.resize(img, (640, 480)) # resize
-        img_mean = np.array([127, 127, 127])
-        img = (img - img_mean) / 128
-        img = np.transpose(img, [2, 0, 1])
-        img = np.expand_dims(img, axis=0)
-        img = img.astype(np.float32)
-
-        confidences, boxes = ort_session.run(None, {input_name: img})
-        #print(confidences, boxes)
-        boxes, labels, probs = predict(w, h, confidences, boxes, 0.7)
-
-        for i in range(boxes.shape[0]):
-            box = boxes[i, :]
-            x1, y1, x2, y2 = box
-            
-            rgb_img = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            #print(rgb_img.shape)
-            cropped_face = rgb_img[y1:y2, x1:x2]
-            #print(cropped_face.shape)
-            resized_face = cv2.resize(cropped_face, (299, 299))
-            #print(resized_face.shape)
-            face = image.img_to_array(resized_face)
-            #print(face.shape)
-            face = preprocess_input(face)
-            face = np.expand_dims(face, axis=0)
+        for (x, y, wid, hei), (mask, no_mask) in zip(detections.boxes, scores):
+            x1, y1, x2, y2 = x, y, x + wid, y + hei
             
-            #feed = dict([(input.name, x[n]) for n, input in enumerate(sess.get_inputs())])
-            pred_onnx = sess.run(None, {input_name_mask: face})[0]
-            #print(pred_onnx)
-            pred = np.squeeze(pred_onnx)
-            #print(pred)
-            (mask, no_mask) = pred
             #top_inds = pred.argsort()[::-1][:5]
             #print(top_inds)
             #for i in top_inds:
@@ -1,18 +1,11 @@
-tf = None
-try:
-  tf = __import__("tensorflow-gpu")
-  tf.operation_that_requires_gpu()
-except:
-  tf = __import__("tensorflow")
-tf.compat.v1.logging.set_verbosity(tf.compat.v1.logging.ERROR)
-
 import os
 os.environ['TF_CPP_MIN_LOG_LEVEL']='3'
 
 import cv2
-from  numpy import argmin
 from frsystem.frs import FaceRecognitionSystem
-from frsystem.helper import getEmbeddingsList
+from frsystem.gallery import GalleryIndex
+from frsystem.pipeline import Pipeline
+from frsystem.tracker import FaceTracker
 
 def drawDetections(db,
                    frame, 
@@ -52,60 +45,84 @@ def drawDetections(db,
 	
     return frame
 							
-def faceRecognizer(frs):
-
-    known_face_embeddings, known_face_names = getEmbeddingsList(frs.embeddings)
-    webcam = cv2.VideoCapture(0)
+def recognizeFaces(frs, gallery, frame, tracker=None, timestamp=None):
+    """
+    Inference stage: finds the faces of a BGR frame and matches them against the gallery.
+    The capture timestamp of the frame lets adaptive detection measure the frame rate.
+    Returns the face locations and names (database ids, or "Unknown").
+    With a tracker, only faces whose track has no valid cached identity are embedded and matched.
+    """
+    # Convert the image from BGR color (which OpenCV uses) to RGB color (which face_recognition uses)
+    rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    # Find all the faces and face embeddings in the current frame of video
+    face_locations, facial_features = frs.detectFaces(rgb_frame, timestamp=timestamp)
 
-    while webcam.isOpened():
-		# Grab a single frame of video
-        _,frame = webcam.read()
-		# Convert the image from BGR color (which OpenCV uses) to RGB color (which face_recognition uses)
-        rgb_small_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-		# Only process every other frame of video to save time
-        # Find all the faces and face embeddings in the current frame of video
-        face_locations, facial_features = frs.detectFaces(rgb_small_frame)
+    if len(face_locations) == 0:
+        if tracker is not None:
+            tracker.update([])
+        return face_locations, []
 
-        if len(face_locations) == 0:
-            continue
+    if tracker is not None:
+        tracks = tracker.update(face_locations)
+        stale = tracker.needIdentity(tracks)
+        indexes = [tracks.index(track) for track in stale]
+    else:
+        indexes = list(range(len(face_locations)))
 
-        face_embeddings = frs.faceEmbeddings(rgb_small_frame, 
-                                            face_locations=face_locations, 
-                                            facial_features=facial_features)
+    face_names = ["Unknown"] * len(indexes)
+    if indexes:
+        face_embeddings = frs.faceEmbeddings(rgb_frame, 
+                                            face_locations=[face_locations[i] for i in indexes], 
+                                            facial_features=[facial_features[i] for i in indexes])
 
         if face_embeddings.size != 0:
-            
-            face_names = []
-            for face_embedding in face_embeddings:
-                # See if the face is a match for the known face(s)
-                face_distances = FaceRecognitionSystem.faceDistance(face_embedding, known_face_embeddings)
-                matches = FaceRecognitionSystem.compareFaces(face_embedding, 
-                                                             known_face_embeddings, 
-                                                             distances=face_distances)
-    
-                best_match_index = argmin(face_distances)
+            # Match every face of the frame against the whole gallery at once
+            with frs.metrics.timer("matching"):
+                best_ids, best_distances = gallery.search(face_embeddings, k=1)
+            matches = FaceRecognitionSystem.compareFaces(None, 
+                                                         None, 
+                                                         distances=best_distances[:, 0])
+
+            face_names = [int(best_id) if match else "Unknown" for best_id, match in zip(best_ids[:, 0], matches)]
+            if tracker is not None:
+                for track, name, distance in zip(stale, face_names, best_distances[:, 0]):
+                    tracker.setIdentity(track, name, float(distance))
 
-                if matches[best_match_index]:
-                    name = known_face_names[best_match_index]
-                else:
-                    name = "Unknown"
-                face_names.append(name)
+    if tracker is None:
+        return face_locations, face_names
+    return face_locations, [track.identity if track.identity is not None else "Unknown" for track in tracks]
 
-        processed_frame = drawDetections(frs.db, 
-                                         frame, 
-                                         face_locations, 
-                                         face_names)
+def faceRecognizer(frs, gallery=None, source=0, tracker=None):
+    # any index with a search(queries, k) method can be used, e.g. frsystem.ann.IVFIndex for large galleries
+    if gallery is None:
+        gallery = GalleryIndex.fromDatabase(frs.connection)
+    # identities are cached per tracked face and only recomputed when needed
+    if tracker is None:
+        tracker = FaceTracker()
 
-        cv2.imshow("Face Recognizer", processed_frame)
-        if cv2.waitKey(1) & 0xFF == 27:
-            break
+    # capture, recognition and display run concurrently: the video stays fluid
+    # and recognition always works on the newest frame
+    def render(frame, results):
+        if results is None:
+            return frame
+        face_locations, face_names = results
+        return drawDetections(frs.db, frame, face_locations, face_names)
 
-    webcam.release()
-    cv2.destroyAllWindows()
+    pipeline = Pipeline(process=lambda frame, timestamp: recognizeFaces(frs, gallery, frame, tracker, timestamp),
+                        render=render,
+                        source=source,
+                        timestamps=True,
+                        metrics=frs.metrics,
+                        window_name="Face Recognizer")
+    stats = pipeline.run()
+    print("identities: {} computed, {} reused from tracks".format(tracker.identifications, tracker.reuses))
+    return stats
 
 if __name__ == "__main__":
     
     EMBEDDING_MODEL = "facenet"
+    DETECTOR = "mtcnn" # or "ultralight" for real-time CPU detection
+    ADAPTIVE_DETECTION = False # True: detect every few frames, track faces with optical flow in between
     WEIGHTS = os.path.join("util", "facenet_keras.h5")
     FACE_CLASSIFIER = os.path.join("util", "face_classifier.pkl")
     DB = os.path.join("data", "db.pkl")
@@ -114,7 +131,10 @@ if __name__ == "__main__":
     frs = FaceRecognitionSystem(embedding_model=EMBEDDING_MODEL,
                                weights=WEIGHTS,
                                face_classifier=FACE_CLASSIFIER,
+                               detector=DETECTOR,
+                               adaptive_detection=ADAPTIVE_DETECTION,
                                db_file=DB, 
                                embeddings_file=EMBEDDINGS)
+    frs.warmup()
       
     faceRecognizer(frs)
\ No newline at end of file
@@ -1,102 +1,112 @@
-tf = None
-try:
-  tf = __import__("tensorflow-gpu")
-  tf.operation_that_requires_gpu()
-except:
-  tf = __import__("tensorflow")
-  
-tf.compat.v1.logging.set_verbosity(tf.compat.v1.logging.ERROR)
-
 import os 
 os.environ['TF_CPP_MIN_LOG_LEVEL']='3'
 
 import cv2
 import numpy as np
-from tensorflow.keras.models import load_model
-from tensorflow.keras.preprocessing.image import img_to_array
-from tensorflow.keras.applications.xception import preprocess_input
 from frsystem.frs import FaceRecognitionSystem
+from frsystem.mask import MaskClassifier, clampBox
+from frsystem.pipeline import Pipeline
+from frsystem.tracker import FaceTracker
 
-def maskFaceRecognizer(frs):
-    #load my mask recognition model
-    mask_classifier = load_model(os.path.join("frsapp","models","xception.h5"))
-
-    webcam = cv2.VideoCapture(0) 
+def recognizeUnmaskedFaces(frs, mask_classifier, frame, tracker=None, timestamp=None):
+    """
+    Inference stage: returns a (box, label, color) tuple for every face of a BGR frame,
+    box being (startX, startY, endX, endY). Faces without a mask are identified.
+    With a tracker, identities are cached per track and only recomputed when needed.
+    The capture timestamp of the frame lets adaptive detection measure the frame rate.
+    """
+    img = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB) # BGR to RGB color channels	
+    
+    face_loc, face_features = frs.detectFaces(img, timestamp=timestamp)
+    tracks = tracker.update(face_loc) if tracker is not None else [None] * len(face_loc)
+    # all faces of the frame in one call
+    scores = mask_classifier.predict(img, face_loc)
 
-    while webcam.isOpened():
-        
-        _,frame = webcam.read()
-        img = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB) # BGR to RGB color channels	
-        
-        face_loc, face_features = frs.detectFaces(img)
-        
-        if face_features:
-                
-            for box, feature in zip(face_loc,face_features):
-                    
-                (startX, startY, width, height) = box
-                endX = startX + width
-                endY = startY + height
-                # ensure the bounding boxes fall within the dimensions of the frame
-                (startX, startY) = (max(0, startX), max(0, startY))
-                (endX, endY) = (min(img.shape[1] - 1, endX), min(img.shape[0] - 1, endY))
-                    
-                face = img[startY-20:endY+20, startX-20:endX+20]
-                face = cv2.resize(face, (299, 299))
-                face = img_to_array(face)
-                face = preprocess_input(face)
-                face = np.expand_dims(face, axis=0)
+    # faces without a mask whose identity is unknown or stale, identified in one call
+    unmasked = [i for i, (mask, no_mask) in enumerate(scores) if no_mask >= mask]
+    if tracker is not None:
+        stale = set(id(track) for track in tracker.needIdentity([tracks[i] for i in unmasked]))
+        unmasked = [i for i in unmasked if id(tracks[i]) in stale]
+    people = frs.identifyPeople(img, ([face_loc[i] for i in unmasked], [face_features[i] for i in unmasked]))
+    identities = {}
+    for i, person in zip(unmasked, people):
+        identities[i] = "Unknown"
+        if person["id"] is not None:
+            identities[i] = "{} {:.2f}%".format(person["name"], person["probability"] * 100)
+        if tracker is not None:
+            tracker.setIdentity(tracks[i], identities[i], person["probability"])
 
-                (mask, no_mask) = mask_classifier.predict(face)[0]
-                    
-                if mask > no_mask:
-                    label = "Mask: {:.2f}%".format(mask * 100)
-                    color = (0, 180, 0) 
-                else:
-                    label = frs.identifyPerson(img, 
-                                        [(startX, startY, endX, endY)], 
-                                        [feature])
-                    color = (0, 60, 255) 
-                    if label is "Unknown":
-                        color = (255, 60, 0)            
-                    
-                x, y, wid, hei = startX, startY, endX, endY
-                    
-                # ******** TOP **********
-                cv2.rectangle(frame, 
-                            (x, y - 20), # upper left
-                            (wid, y), # bottom right
-                            color, 
-                            -1) # -1 argument makes a filled rectangle
-                # ******** TEXT **********
-                cv2.putText(frame, 
-                            label, # text to draw
-                            (startX+2, startY - 10), # text start coordinates
-                            cv2.FONT_HERSHEY_PLAIN, # font
-                            0.8, # fontscale
-                            (255,255,255), # color
-                            1) # thickness
-                # ******** FACE FRAME *********
-                cv2.rectangle(frame, 
-                            (startX, startY), 
-                            (endX, endY), 
-                            color, 
-                            2)
-                    
+    labels = []
+    for i, (box, track, (mask, no_mask)) in enumerate(zip(face_loc, tracks, scores)):
+            
+        # ensure the bounding boxes fall within the dimensions of the frame
+        (startX, startY, endX, endY) = clampBox(box, img.shape)
+            
+        if mask > no_mask:
+            label = "Mask: {:.2f}%".format(mask * 100)
+            color = (0, 180, 0) 
         else:
-            continue
+            label = identities[i] if i in identities else track.identity
+            color = (0, 60, 255) 
+            if label == "Unknown":
+                color = (255, 60, 0)            
 
-        cv2.imshow("COVID-19 Mask Classifier App", frame)
+        labels.append(((startX, startY, endX, endY), label, color))
 
-        if cv2.waitKey(1) & 0xFF == 27:
-            break
+    return labels
+
+def drawLabels(frame, labels):
+    for (startX, startY, endX, endY), label, color in labels:
+            
+        x, y, wid, hei = startX, startY, endX, endY
+            
+        # ******** TOP **********
+        cv2.rectangle(frame, 
+                    (x, y - 20), # upper left
+                    (wid, y), # bottom right
+                    color, 
+                    -1) # -1 argument makes a filled rectangle
+        # ******** TEXT **********
+        cv2.putText(frame, 
+                    label, # text to draw
+                    (startX+2, startY - 10), # text start coordinates
+                    cv2.FONT_HERSHEY_PLAIN, # font
+                    0.8, # fontscale
+                    (255,255,255), # color
+                    1) # thickness
+        # ******** FACE FRAME *********
+        cv2.rectangle(frame, 
+                    (startX, startY), 
+                    (endX, endY), 
+                    color, 
+                    2)
+
+    return frame
+
+def maskFaceRecognizer(frs, source=0, tracker=None):
+    #load my mask recognition model
+    mask_classifier = MaskClassifier(os.path.join("frsapp","models","xception.h5"))
+    # identities are cached per tracked face and only recomputed when needed
+    if tracker is None:
+        tracker = FaceTracker()
 
-    webcam.release()
-    cv2.destroyAllWindows()
+    # capture, recognition and display run concurrently: the video stays fluid
+    # and recognition always works on the newest frame
+    pipeline = Pipeline(process=lambda frame, timestamp: recognizeUnmaskedFaces(frs, mask_classifier, frame, tracker, timestamp),
+                        render=lambda frame, labels: drawLabels(frame, labels or []),
+                        source=source,
+                        timestamps=True,
+                        metrics=frs.metrics,
+                        window_name="COVID-19 Mask Classifier App")
+    stats = pipeline.run()
+    print("identities: {} computed, {} reused from tracks".format(tracker.identifications, tracker.reuses))
+    return stats
 
 if __name__ == "__main__":
     
     EMBEDDING_MODEL = "facenet"
+    DETECTOR = "mtcnn" # or "ultralight" for real-time CPU detection
+    ADAPTIVE_DETECTION = False # True: detect every few frames, track faces with optical flow in between
     WEIGHTS = os.path.join("util", "facenet_keras.h5")
     FACE_CLASSIFIER = os.path.join("util", "face_classifier.pkl")
     DB = os.path.join("data", "db.pkl")
@@ -105,7 +115,10 @@ if __name__ == "__main__":
     frs = FaceRecognitionSystem(embedding_model=EMBEDDING_MODEL,
                                weights=WEIGHTS,
                                face_classifier=FACE_CLASSIFIER,
+                               detector=DETECTOR,
+                               adaptive_detection=ADAPTIVE_DETECTION,
                                db_file=DB, 
                                embeddings_file=EMBEDDINGS)
+    frs.warmup()
 
     maskFaceRecognizer(frs)
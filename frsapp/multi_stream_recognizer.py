@@ -0,0 +1,101 @@
+import os 
+os.environ['TF_CPP_MIN_LOG_LEVEL']='3'
+
+import argparse
+import cv2
+import numpy as np
+from frsystem.frs import FaceRecognitionSystem
+from frsystem.mask import MaskClassifier, clampBox
+from frsystem.gallery import GalleryIndex
+from frsystem.streams import MultiStreamRunner
+
+def recognizeStreams(frs, gallery, mask_classifier, frames):
+    """
+    Inference stage shared by all cameras: the faces of every frame go through
+    one detector call, one mask classifier call and one embedding call.
+    Returns, for every frame, a list of (box, label, color) tuples.
+    """
+    images = [cv2.cvtColor(frame.image, cv2.COLOR_BGR2RGB) for frame in frames]
+    detections = frs.detectBatch(images)
+
+    # one batch with the faces of all frames for the mask classifier
+    boxes, owners = [], []
+    for i, (img, faces) in enumerate(zip(images, detections)):
+        for box in faces.boxes:
+            boxes.append(clampBox(box, img.shape))
+            owners.append(i)
+    if not boxes:
+        return [[] for _ in frames]
+    predictions = np.concatenate(mask_classifier.predictBatch(images, [faces.boxes for faces in detections]))
+
+    # faces without a mask are identified, again in one batch
+    unmasked = [[] for _ in frames]
+    face_index = 0
+    for i, faces in enumerate(detections):
+        for features in faces.features:
+            mask, no_mask = predictions[face_index]
+            if no_mask >= mask:
+                unmasked[i].append(features)
+            face_index += 1
+    names = []
+    embeddings = [e for e in frs.faceEmbeddingsBatch(images, unmasked) if e.size != 0]
+    if embeddings:
+        with frs.metrics.timer("matching"):
+            best_ids, best_distances = gallery.search(np.concatenate(embeddings), k=1)
+        matches = FaceRecognitionSystem.compareFaces(None, None, distances=best_distances[:, 0])
+        names = [frs.db[int(best_id)] if match else "Unknown" for best_id, match in zip(best_ids[:, 0], matches)]
+
+    results = [[] for _ in frames]
+    names = iter(names)
+    for owner, corners, (mask, no_mask) in zip(owners, boxes, predictions):
+        if mask > no_mask:
+            label = "Mask: {:.2f}%".format(mask * 100)
+            color = (0, 180, 0)
+        else:
+            label = next(names)
+            color = (255, 60, 0) if label == "Unknown" else (0, 60, 255)
+        results[owner].append((corners, label, color))
+    return results
+
+def drawLabels(frame, labels):
+    for (startX, startY, endX, endY), label, color in labels or []:
+        cv2.rectangle(frame, (startX, startY - 20), (endX, startY), color, -1)
+        cv2.putText(frame, label, (startX+2, startY - 10), cv2.FONT_HERSHEY_PLAIN, 0.8, (255,255,255), 1)
+        cv2.rectangle(frame, (startX, startY), (endX, endY), color, 2)
+    return frame
+
+def multiStreamRecognizer(frs, sources, display=True, duration=None, gallery=None):
+    #load my mask recognition model, shared by all cameras
+    mask_classifier = MaskClassifier(os.path.join("frsapp","models","xception.h5"))
+    if gallery is None:
+        gallery = GalleryIndex.fromDatabase(frs.connection)
+
+    runner = MultiStreamRunner(sources,
+                               process_batch=lambda frames: recognizeStreams(frs, gallery, mask_classifier, frames),
+                               render=drawLabels,
+                               metrics=frs.metrics)
+    return runner.run(display=display, duration=duration, report_every=10)
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Mask and face recognition on many cameras with shared models.")
+    parser.add_argument("sources", nargs="*", default=["0"], help="camera indices, video files or stream URLs")
+    parser.add_argument("--headless", action="store_true", help="do not open windows, only print stats")
+    parser.add_argument("--duration", type=float, default=None, help="stop after so many seconds")
+    args = parser.parse_args()
+    
+    EMBEDDING_MODEL = "facenet"
+    DETECTOR = "ultralight" # batches the frames of all cameras in one call
+    WEIGHTS = os.path.join("util", "facenet_keras.h5")
+    DB = os.path.join("data", "db.pkl")
+    EMBEDDINGS = os.path.join("data", "embeddings.pkl")
+    
+    # adaptive detection follows a single video, so it stays off with several cameras
+    frs = FaceRecognitionSystem(embedding_model=EMBEDDING_MODEL,
+                               weights=WEIGHTS,
+                               detector=DETECTOR,
+                               db_file=DB, 
+                               embeddings_file=EMBEDDINGS)
+
+    sources = [int(source) if source.isdigit() else source for source in args.sources]
+    multiStreamRecognizer(frs, sources, display=not args.headless, duration=args.duration)
@@ -0,0 +1,152 @@
+import os 
+os.environ['TF_CPP_MIN_LOG_LEVEL']='3'
+
+import sys
+import json
+import time
+import argparse
+import cv2
+import numpy as np
+from frsystem.frs import FaceRecognitionSystem
+from frsystem.mask import MaskClassifier
+from frsystem.gallery import GalleryIndex
+
+def readFrames(path, start=None, end=None, stride=1):
+    """
+    Yields (frame index, timestamp in seconds, BGR frame) of a video file,
+    from 'start' to 'end' seconds, keeping one frame every 'stride'.
+    Skipped frames are only grabbed, not decoded.
+    """
+    if stride < 1:
+        raise AttributeError("Invalid stride {}, it must be at least 1.".format(stride))
+    video = cv2.VideoCapture(path)
+    if not video.isOpened():
+        raise IOError("Could not open video {}".format(path))
+    fps = video.get(cv2.CAP_PROP_FPS) or 0.0
+
+    index = 0
+    if start:
+        video.set(cv2.CAP_PROP_POS_MSEC, start * 1000.0)
+        index = int(round(video.get(cv2.CAP_PROP_POS_FRAMES)))
+    first = index
+    try:
+        while True:
+            timestamp = index / fps if fps > 0 else video.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+            if end is not None and timestamp > end:
+                break
+            if (index - first) % stride != 0:
+                if not video.grab():
+                    break
+                index += 1
+                continue
+            ok, frame = video.read()
+            if not ok:
+                break
+            yield index, timestamp, frame
+            index += 1
+    finally:
+        video.release()
+
+def batches(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def analyzeFrames(frs, gallery, mask_classifier, images):
+    """
+    Detection, mask classification and recognition of a batch of RGB frames.
+    Returns, for every frame, a list of dictionaries with the box, identity, distance and mask score of each face.
+    """
+    detections = frs.detectBatch(images)
+    faces = [[{"box": [int(v) for v in box], "identity": None, "id": None, "distance": None, "mask": None}
+              for box in frame_detections.boxes] for frame_detections in detections]
+
+    if mask_classifier is not None:
+        # the faces of all frames in one call
+        predictions = mask_classifier.predictBatch(images, [frame_detections.boxes for frame_detections in detections])
+        for frame_faces, frame_predictions in zip(faces, predictions):
+            for face, (mask, no_mask) in zip(frame_faces, frame_predictions):
+                face["mask"] = float(mask)
+
+    embeddings = [e for e in frs.faceEmbeddingsBatch(images, [d.features for d in detections]) if e.size != 0]
+    if embeddings:
+        best_ids, best_distances = gallery.search(np.concatenate(embeddings), k=1)
+        matches = FaceRecognitionSystem.compareFaces(None, None, distances=best_distances[:, 0])
+        for face, best_id, distance, match in zip([face for frame_faces in faces for face in frame_faces],
+                                                  best_ids[:, 0], best_distances[:, 0], matches):
+            face["id"] = int(best_id) if match else None
+            face["identity"] = frs.db[int(best_id)] if match else "Unknown"
+            face["distance"] = float(distance)
+    return faces
+
+def analyzeVideo(frs, gallery, mask_classifier, path, output, start=None, end=None, stride=1, batch_size=8):
+    """
+    Writes one JSON line per face found in the video to 'output'.
+    Returns the number of frames and faces processed.
+    """
+    n_frames, n_faces = 0, 0
+    for batch in batches(readFrames(path, start=start, end=end, stride=stride), batch_size):
+        images = [cv2.cvtColor(frame, cv2.COLOR_BGR2RGB) for _, _, frame in batch]
+        for (index, timestamp, _), faces in zip(batch, analyzeFrames(frs, gallery, mask_classifier, images)):
+            for face in faces:
+                record = {"video": path, "frame": index, "timestamp": round(timestamp, 3)}
+                record.update(face)
+                output.write(json.dumps(record) + "\n")
+            n_faces += len(faces)
+        n_frames += len(batch)
+    return n_frames, n_faces
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Offline face recognition and mask classification of video files, written as JSON lines.")
+    parser.add_argument("videos", nargs="+", help="video files")
+    parser.add_argument("-o", "--output", default="-", help="JSON lines output file, '-' for stdout")
+    parser.add_argument("--start", type=float, default=None, help="start time in seconds")
+    parser.add_argument("--end", type=float, default=None, help="end time in seconds")
+    parser.add_argument("--stride", type=int, default=1, help="process one frame every STRIDE frames")
+    parser.add_argument("--batch", type=int, default=8, help="frames processed per batch")
+    parser.add_argument("--detector", default="ultralight", choices=["mtcnn", "ultralight"])
+    parser.add_argument("--no-mask", action="store_true", help="skip mask classification")
+    args = parser.parse_args()
+    if args.stride < 1:
+        parser.error("--stride must be at least 1")
+    if args.batch < 1:
+        parser.error("--batch must be at least 1")
+
+    EMBEDDING_MODEL = "facenet"
+    WEIGHTS = os.path.join("util", "facenet_keras.h5")
+    DB = os.path.join("data", "db.pkl")
+    EMBEDDINGS = os.path.join("data", "embeddings.pkl")
+    MASK_MODEL = os.path.join("frsapp","models","xception.h5")
+
+    frs = FaceRecognitionSystem(embedding_model=EMBEDDING_MODEL,
+                               weights=WEIGHTS,
+                               detector=args.detector,
+                               db_file=DB, 
+                               embeddings_file=EMBEDDINGS)
+    gallery = GalleryIndex.fromDatabase(frs.connection)
+    mask_classifier = None if args.no_mask else MaskClassifier(MASK_MODEL)
+
+    output = sys.stdout if args.output == "-" else open(args.output, "w")
+    total_frames, total_faces = 0, 0
+    begin = time.time()
+    try:
+        for path in args.videos:
+            n_frames, n_faces = analyzeVideo(frs, gallery, mask_classifier, path, output,
+                                             start=args.start, end=args.end,
+                                             stride=args.stride, batch_size=args.batch)
+            total_frames += n_frames
+            total_faces += n_faces
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+    elapsed = time.time() - begin
+    print("Processed {} frames and {} faces in {:.1f}s: {:.1f} frames/s, {:.1f} faces/s".format(
+        total_frames, total_faces, elapsed, total_frames / max(elapsed, 1e-9), total_faces / max(elapsed, 1e-9)),
+        file=sys.stderr)
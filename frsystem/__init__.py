@@ -1,8 +1,12 @@
 from .version import __version__
 from .frs import FaceRecognitionSystem
+from .gallery import GalleryIndex
+from .ann import IVFIndex
 
 # if somebody does "from somepackage import *", this is what they will
 # be able to access:
 __all__ = [
     'FaceRecognitionSystem',
+    'GalleryIndex',
+    'IVFIndex',
 ]
\ No newline at end of file
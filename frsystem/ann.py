@@ -0,0 +1,284 @@
+import numpy as np
+from .helper import pairwiseDistances
+
+
+def kMeans(data, n_clusters, n_iter=20, seed=0, batch_size=65536):
+    """
+    ### Description
+        Plain Lloyd k-means written with NumPy only.
+        Points are assigned in batches so that memory stays bounded on large inputs.
+
+    ### Args
+        data (nparray): float32 array of shape (n, dim).
+        n_clusters (int): number of clusters.
+        n_iter (int, optional): number of Lloyd iterations. Defaults to 20.
+        seed (int, optional): random seed used to pick the initial centroids. Defaults to 0.
+        batch_size (int, optional): number of points assigned at once. Defaults to 65536.
+
+    ### Returns
+        nparray: centroids of shape (n_clusters, dim).
+    """
+    rng = np.random.RandomState(seed)
+    n = data.shape[0]
+    n_clusters = min(n_clusters, n)
+    centroids = data[rng.choice(n, n_clusters, replace=False)].copy()
+
+    for _ in range(n_iter):
+        assign = assignClusters(data, centroids, batch_size=batch_size)
+        counts = np.bincount(assign, minlength=n_clusters)
+        empty = counts == 0
+
+        # per-cluster sums over the points sorted by cluster
+        order = np.argsort(assign, kind="stable")
+        starts = (np.cumsum(counts) - counts)[~empty]
+        sums = np.add.reduceat(data[order], starts, axis=0)
+        centroids[~empty] = sums / counts[~empty, np.newaxis]
+        # re-seed empty clusters with random points
+        if empty.any():
+            centroids[empty] = data[rng.choice(n, int(empty.sum()), replace=False)]
+
+    return centroids
+
+def assignClusters(data, centroids, batch_size=65536):
+    """
+    ### Description
+        Returns the index of the closest centroid for every point.
+    """
+    assign = np.empty(data.shape[0], dtype=np.int64)
+    c_norms = np.sqrt(np.einsum("ij,ij->i", centroids, centroids))
+    for start in range(0, data.shape[0], batch_size):
+        stop = start + batch_size
+        dist = pairwiseDistances(data[start:stop], centroids, norms=c_norms)
+        assign[start:stop] = np.argmin(dist, axis=1)
+    return assign
+
+
+class IVFIndex(object):
+    """
+    ### Description
+        Approximate nearest-neighbour index for large galleries.
+
+        Known embeddings are clustered with k-means into 'nlist' inverted lists
+        (inverted file, IVF). A query is only compared to the embeddings of the
+        'nprobe' lists whose centroids are closest to it.
+
+        The index has the same search interface as GalleryIndex,
+        so both can be used interchangeably in the recognition path.
+    """
+
+    def __init__(self,
+                 nlist=None,
+                 nprobe=8,
+                 distance="euclidian",
+                 n_iter=20,
+                 max_train=None,
+                 seed=0):
+        """
+        ### Args
+            nlist (int, optional): number of inverted lists. Defaults to None (4 * sqrt(n)).
+            nprobe (int, optional): number of inverted lists visited per query. Defaults to 8.
+            distance (str, optional): options: 'cosine', 'euclidian'. Defaults to "euclidian".
+            n_iter (int, optional): number of k-means iterations. Defaults to 20.
+            max_train (int, optional): maximum number of embeddings used for training. Defaults to None (256 * nlist).
+            seed (int, optional): random seed. Defaults to 0.
+        """
+        if distance not in ("euclidian", "cosine"):
+            raise AttributeError("wrong distance attribute. Choose 'euclidian' or 'cosine'")
+
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.distance = distance
+        self.n_iter = n_iter
+        self.max_train = max_train
+        self.seed = seed
+
+        self.centroids = None
+        self.offsets = np.zeros(1, dtype=np.int64) # list i spans offsets[i]:offsets[i+1]
+        self.ids = np.empty((0,), dtype=np.int64)
+        self.vectors = None # (n, dim) float32
+        self.sq_norms = None # (n,) squared norms of the vectors
+
+    @classmethod
+    def fromDatabase(cls, connection, **kwargs):
+        """
+        ### Description
+            Trains an index on the embeddings of a "Database" object and adds all of them.
+
+        ### Args
+            connection (Database): connection to the database of known faces.
+            **kwargs: arguments passed to IVFIndex.
+
+        ### Returns
+            IVFIndex: trained index over all embeddings of the database.
+        """
+        index = cls(**kwargs)
+        if getattr(connection, "store", None) is not None:
+            if len(connection.store):
+                index.train(connection.store.matrix)
+                index.add(connection.store.matrix, connection.store.ids)
+        else:
+            index.build(connection.embeddings)
+        return index
+
+    def build(self, embeddings_dict):
+        """
+        ### Description
+            Trains the index and adds all embeddings from a dictionary {id : listOfEmbeddings}.
+        """
+        id_list = []
+        rows = []
+        for ref_id, embed_list in embeddings_dict.items():
+            for e in embed_list:
+                rows.append(np.asarray(e, dtype=np.float32).ravel())
+                id_list.append(ref_id)
+
+        if not rows:
+            return
+
+        matrix = np.vstack(rows)
+        self.train(matrix)
+        self.add(matrix, np.asarray(id_list, dtype=np.int64))
+
+    def __len__(self):
+        return self.ids.shape[0]
+
+    def _prepare(self, data):
+        data = np.ascontiguousarray(np.atleast_2d(data), dtype=np.float32)
+        if self.distance == "cosine":
+            # on unit vectors cosine distance = squared euclidean distance / 2
+            norms = np.sqrt(np.einsum("ij,ij->i", data, data))
+            data = data / np.maximum(norms, np.finfo(np.float32).tiny)[:, np.newaxis]
+        return data
+
+    def train(self, matrix):
+        """
+        ### Description
+            Learns the coarse centroids from a sample of embeddings.
+
+        ### Args
+            matrix (nparray): array of shape (n, dim) with training embeddings.
+        """
+        data = self._prepare(matrix)
+        n = data.shape[0]
+        if self.nlist is None:
+            self.nlist = max(1, int(4 * np.sqrt(n)))
+        self.nlist = min(self.nlist, n)
+
+        max_train = self.max_train or 256 * self.nlist
+        if n > max_train:
+            rng = np.random.RandomState(self.seed)
+            data = data[rng.choice(n, max_train, replace=False)]
+
+        self.centroids = kMeans(data, self.nlist, n_iter=self.n_iter, seed=self.seed)
+
+    def add(self, matrix, ids):
+        """
+        ### Description
+            Adds embeddings to the index. The index must be trained first.
+
+        ### Args
+            matrix (nparray): array of shape (n, dim) with known face embeddings.
+            ids (nparray): array of shape (n,) with ids of known faces.
+        """
+        if self.centroids is None:
+            raise RuntimeError("The index must be trained before adding embeddings.")
+
+        data = self._prepare(matrix)
+        ids = np.asarray(ids, dtype=np.int64)
+        assign = assignClusters(data, self.centroids)
+
+        # merge with the existing content and keep every inverted list contiguous
+        if len(self):
+            old_assign = np.repeat(np.arange(self.nlist), np.diff(self.offsets))
+            assign = np.concatenate([old_assign, assign])
+            ids = np.concatenate([self.ids, ids])
+            data = np.concatenate([self.vectors, data])
+
+        order = np.argsort(assign, kind="stable")
+        self.offsets = np.concatenate([[0], np.cumsum(np.bincount(assign, minlength=self.nlist))])
+        self.ids = ids[order]
+        self.vectors = np.ascontiguousarray(data[order])
+        self.sq_norms = np.einsum("ij,ij->i", self.vectors, self.vectors)
+
+    def search(self, queries, k=1, nprobe=None):
+        """
+        ### Description
+            Finds approximately the k closest known embeddings for every query embedding.
+
+            Queries are grouped by probed list: the embeddings of every list are
+            compared to all the queries probing it with one matrix product, so a
+            batch of queries reads every list at most once.
+
+        ### Args
+            queries (nparray): array of shape (n_queries, dim) or (dim,) with unknown face embeddings.
+            k (int, optional): number of neighbours to return per query. Defaults to 1.
+            nprobe (int, optional): number of inverted lists to visit. Defaults to self.nprobe.
+
+        ### Returns
+            (nparray): ids of shape (n_queries, k) of the closest known faces, best match first.
+            (nparray): distances of shape (n_queries, k) in the same order.
+                       Missing neighbours are marked with id -1 and distance inf.
+        """
+        queries = self._prepare(queries)
+        n_queries = queries.shape[0]
+        out_ids = np.full((n_queries, k), -1, dtype=np.int64)
+        out_dist = np.full((n_queries, k), np.inf, dtype=np.float32)
+
+        if len(self) == 0 or n_queries == 0:
+            return out_ids[:, :0], out_dist[:, :0]
+
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        coarse = pairwiseDistances(queries, self.centroids)
+        if nprobe < self.nlist:
+            probes = np.argpartition(coarse, nprobe - 1, axis=1)[:, :nprobe]
+        else:
+            probes = np.broadcast_to(np.arange(self.nlist), coarse.shape)
+
+        # (query, list) pairs sorted by list
+        pair_lists = probes.ravel()
+        order = np.argsort(pair_lists, kind="stable")
+        pair_queries = order // nprobe
+        pair_lists = pair_lists[order]
+        lists, first = np.unique(pair_lists, return_index=True)
+        bounds = np.append(first, len(pair_lists))
+
+        cand_queries, cand_rows, cand_dist = [], [], []
+        for i, l in enumerate(lists):
+            start, stop = self.offsets[l], self.offsets[l + 1]
+            if start == stop:
+                continue
+            qs = pair_queries[bounds[i]:bounds[i + 1]]
+            # squared distances up to the norm of the query, which does not change the ranking
+            dist = self.sq_norms[start:stop] - 2 * (queries[qs] @ self.vectors[start:stop].T)
+
+            # only the k best rows of a list can be in the top-k of a query
+            kl = min(k, stop - start)
+            if kl < stop - start:
+                top = np.argpartition(dist, kl - 1, axis=1)[:, :kl]
+                dist = np.take_along_axis(dist, top, axis=1)
+            else:
+                top = np.broadcast_to(np.arange(kl), dist.shape)
+            cand_queries.append(np.repeat(qs, kl))
+            cand_rows.append((top + start).ravel())
+            cand_dist.append(dist.ravel())
+
+        if not cand_queries:
+            # every probed list is empty
+            return out_ids, out_dist
+
+        cand_queries = np.concatenate(cand_queries)
+        cand_rows = np.concatenate(cand_rows)
+        cand_dist = np.concatenate(cand_dist) + np.einsum("ij,ij->i", queries, queries)[cand_queries]
+
+        # candidates sorted by query then distance, the first k of every query are kept
+        order = np.lexsort((cand_dist, cand_queries))
+        cand_queries, cand_rows, cand_dist = cand_queries[order], cand_rows[order], cand_dist[order]
+        rank = np.arange(len(order)) - np.searchsorted(cand_queries, cand_queries)
+        keep = rank < k
+        out_ids[cand_queries[keep], rank[keep]] = self.ids[cand_rows[keep]]
+        out_dist[cand_queries[keep], rank[keep]] = np.sqrt(np.maximum(cand_dist[keep], 0))
+
+        if self.distance == "cosine":
+            out_dist = out_dist ** 2 / 2
+
+        return out_ids, out_dist
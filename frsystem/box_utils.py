@@ -0,0 +1,234 @@
+import numpy as np
+
+# largest number of candidates whose pairwise IoU matrix is computed at once (8 MB per matrix);
+# above, e.g. with candidate_size <= 0 on the 17640 UltraLight priors, NMS compares one box at a time
+MAX_IOU_MATRIX = 1024
+
+def area_of(left_top, right_bottom):
+    """
+    Compute the areas of rectangles given two corners.
+    Args:
+        left_top (N, 2): left top corner.
+        right_bottom (N, 2): right bottom corner.
+    Returns:
+        area (N): return the area.
+    """
+    hw = np.clip(right_bottom - left_top, 0.0, None)
+    return hw[..., 0] * hw[..., 1]
+
+def iou_of(boxes0, boxes1, eps=1e-5):
+    """
+    Return intersection-over-union (Jaccard index) of boxes.
+    Args:
+        boxes0 (N, 4): ground truth boxes.
+        boxes1 (N or 1, 4): predicted boxes.
+        eps: a small number to avoid 0 as denominator.
+    Returns:
+        iou (N): IoU values.
+    """
+    overlap_left_top = np.maximum(boxes0[..., :2], boxes1[..., :2])
+    overlap_right_bottom = np.minimum(boxes0[..., 2:], boxes1[..., 2:])
+
+    overlap_area = area_of(overlap_left_top, overlap_right_bottom)
+    area0 = area_of(boxes0[..., :2], boxes0[..., 2:])
+    area1 = area_of(boxes1[..., :2], boxes1[..., 2:])
+    return overlap_area / (area0 + area1 - overlap_area + eps)
+
+def iou_matrix(boxes, eps=1e-5):
+    """
+    Pairwise intersection-over-union of boxes.
+    Args:
+        boxes (N, 4): boxes in corner-form.
+        eps: a small number to avoid 0 as denominator.
+    Returns:
+        iou (N, N): IoU of every pair of boxes.
+    """
+    return iou_of(boxes[:, np.newaxis, :], boxes[np.newaxis, :, :], eps=eps)
+
+def top_candidates(scores, candidate_size=200):
+    """
+    Indexes of the highest scores, sorted by decreasing score.
+    Only the candidates are sorted: they are first selected with a partial sort.
+    Args:
+        scores (N): scores.
+        candidate_size: number of candidates. If <= 0, keep all the scores.
+    Returns:
+        indexes (min(N, candidate_size)): indexes of the candidates.
+    """
+    if 0 < candidate_size < scores.shape[0]:
+        indexes = np.argpartition(scores, -candidate_size)[-candidate_size:]
+    else:
+        indexes = np.arange(scores.shape[0])
+    return indexes[np.argsort(-scores[indexes], kind="stable")]
+
+def hard_nms(box_scores, iou_threshold, top_k=-1, candidate_size=200):
+    """
+    Perform hard non-maximum-supression to filter out boxes with iou greater
+    than threshold
+    Args:
+        box_scores (N, 5): boxes in corner-form and probabilities.
+        iou_threshold: intersection over union threshold.
+        top_k: keep top_k results. If k <= 0, keep all the results.
+        candidate_size: only consider the candidates with the highest scores.
+    Returns:
+        picked: the kept boxes and probabilities, by decreasing probability
+    """
+    indexes = top_candidates(box_scores[:, -1], candidate_size)
+    if indexes.shape[0] == 0:
+        return box_scores[indexes, :]
+    if indexes.shape[0] > MAX_IOU_MATRIX:
+        return box_scores[greedy_nms(box_scores[:, :-1], indexes, iou_threshold, top_k), :]
+
+    # overlaps[i, j]: box j overlaps too much with the better scored box i
+    overlaps = np.triu(iou_matrix(box_scores[indexes, :-1]) > iou_threshold, k=1)
+
+    # a box is kept when no kept box with a higher score overlaps it.
+    # Iterating this rule from "keep everything" fixes at least one more box
+    # per pass in score order, and stops on the same result as the greedy loop,
+    # usually after a handful of vectorized passes.
+    keep = np.ones(indexes.shape[0], dtype=bool)
+    while True:
+        new_keep = ~np.any(overlaps[keep], axis=0)
+        if np.array_equal(new_keep, keep):
+            break
+        keep = new_keep
+
+    picked = indexes[keep]
+    if top_k > 0:
+        picked = picked[:top_k]
+    return box_scores[picked, :]
+
+def greedy_nms(boxes, indexes, iou_threshold, top_k=-1):
+    """
+    Hard non-maximum-supression comparing one kept box with the remaining ones at a time,
+    in O(N) memory.
+    Args:
+        boxes (N, 4): boxes in corner-form.
+        indexes (M): indexes of the candidates, by decreasing probability.
+        iou_threshold: intersection over union threshold.
+        top_k: keep top_k results. If k <= 0, keep all the results.
+    Returns:
+        picked: indexes of the kept boxes, by decreasing probability
+    """
+    picked = []
+    while indexes.shape[0] > 0:
+        current = indexes[0]
+        picked.append(current)
+        if 0 < top_k == len(picked):
+            break
+        rest = indexes[1:]
+        iou = iou_of(boxes[rest, :], boxes[current, np.newaxis, :])
+        indexes = rest[iou <= iou_threshold]
+    return np.array(picked, dtype=np.int64)
+
+def soft_nms(box_scores, iou_threshold=0.3, top_k=-1, candidate_size=200, sigma=0.5, score_threshold=0.001, method="gaussian"):
+    """
+    Perform soft non-maximum-supression: instead of removing the boxes overlapping
+    a kept box, their probability is decayed according to the overlap.
+    Args:
+        box_scores (N, 5): boxes in corner-form and probabilities.
+        iou_threshold: intersection over union threshold of the 'linear' method.
+        top_k: keep top_k results. If k <= 0, keep all the results.
+        candidate_size: only consider the candidates with the highest scores.
+        sigma: width of the 'gaussian' decay.
+        score_threshold: boxes whose decayed probability falls below are removed.
+        method: 'gaussian' or 'linear'.
+    Returns:
+        picked: the kept boxes and their decayed probabilities, by decreasing probability
+    """
+    if method not in ("gaussian", "linear"):
+        raise AttributeError("Invalid soft-NMS method. Please use 'gaussian' or 'linear'.")
+
+    indexes = top_candidates(box_scores[:, -1], candidate_size)
+    box_scores = box_scores[indexes, :].copy()
+    scores = box_scores[:, -1]
+    iou = iou_matrix(box_scores[:, :-1]) if box_scores.shape[0] <= MAX_IOU_MATRIX else None
+
+    picked = []
+    remaining = np.arange(box_scores.shape[0])
+    while remaining.shape[0] > 0:
+        current = remaining[np.argmax(scores[remaining])]
+        picked.append(current)
+        if 0 < top_k == len(picked):
+            break
+        remaining = remaining[remaining != current]
+        if iou is not None:
+            overlap = iou[current, remaining]
+        else:
+            overlap = iou_of(box_scores[remaining, :-1], box_scores[current, np.newaxis, :-1])
+        if method == "gaussian":
+            scores[remaining] *= np.exp(-(overlap * overlap) / sigma)
+        else:
+            scores[remaining] *= np.where(overlap > iou_threshold, 1 - overlap, 1)
+        remaining = remaining[scores[remaining] > score_threshold]
+
+    return box_scores[picked, :]
+
+def predict_batch(width, height, confidences, boxes, prob_threshold, iou_threshold=0.5, top_k=-1, candidate_size=200, nms_method="hard"):
+    """
+    Select boxes that contain human faces in a batch of images.
+    Thresholding and scaling of the whole batch are done at once, NMS per image.
+    Args:
+        width: original images width, one value for all images or one per image
+        height: original images height, one value for all images or one per image
+        confidences (B, N, 2): confidence array
+        boxes (B, N, 4): boxes array in corner-form
+        iou_threshold: intersection over union threshold.
+        top_k: keep top_k results. If k <= 0, keep all the results.
+        candidate_size: only consider the candidates with the highest scores.
+        nms_method: 'hard' or 'soft' (gaussian soft-NMS).
+    Returns:
+        results: a list with one (boxes, labels, probs) tuple per image, as returned by predict
+    """
+    if nms_method not in ("hard", "soft"):
+        raise AttributeError("Invalid NMS method. Please use 'hard' or 'soft'.")
+
+    batch_size = boxes.shape[0]
+    widths = np.broadcast_to(np.asarray(width, dtype=np.float32), (batch_size,))
+    heights = np.broadcast_to(np.asarray(height, dtype=np.float32), (batch_size,))
+    scale = np.stack([widths, heights, widths, heights], axis=1)
+
+    # candidates of every image and class at once
+    masks = confidences[:, :, 1:] > prob_threshold
+    results = []
+    for b in range(batch_size):
+        picked_box_probs = []
+        picked_labels = []
+        for class_index in np.flatnonzero(masks[b].any(axis=0)) + 1:
+            mask = masks[b, :, class_index - 1]
+            box_probs = np.concatenate([boxes[b, mask, :], confidences[b, mask, class_index, np.newaxis]], axis=1)
+            if nms_method == "hard":
+                box_probs = hard_nms(box_probs, iou_threshold=iou_threshold, top_k=top_k, candidate_size=candidate_size)
+            else:
+                box_probs = soft_nms(box_probs, iou_threshold=iou_threshold, top_k=top_k, candidate_size=candidate_size,
+                                     score_threshold=prob_threshold)
+            picked_box_probs.append(box_probs)
+            picked_labels.extend([class_index] * box_probs.shape[0])
+        if not picked_box_probs:
+            results.append((np.array([]), np.array([]), np.array([])))
+            continue
+        picked_box_probs = np.concatenate(picked_box_probs)
+        picked_box_probs[:, :4] *= scale[b]
+        results.append((picked_box_probs[:, :4].astype(np.int32), np.array(picked_labels), picked_box_probs[:, 4]))
+    return results
+
+def predict(width, height, confidences, boxes, prob_threshold, iou_threshold=0.5, top_k=-1, candidate_size=200, nms_method="hard"):
+    """
+    Select boxes that contain human faces
+    Args:
+        width: original image width
+        height: original image height
+        confidences (1, N, 2): confidence array
+        boxes (1, N, 4): boxes array in corner-form
+        iou_threshold: intersection over union threshold.
+        top_k: keep top_k results. If k <= 0, keep all the results.
+        candidate_size: only consider the candidates with the highest scores.
+        nms_method: 'hard' or 'soft' (gaussian soft-NMS).
+    Returns:
+        boxes (k, 4): an array of boxes kept
+        labels (k): an array of labels for each boxes kept
+        probs (k): an array of probabilities for each boxes being in corresponding labels
+    """
+    return predict_batch(width, height, confidences[:1], boxes[:1], prob_threshold,
+                         iou_threshold=iou_threshold, top_k=top_k,
+                         candidate_size=candidate_size, nms_method=nms_method)[0]
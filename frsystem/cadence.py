@@ -0,0 +1,238 @@
+import time
+import cv2
+import numpy as np
+from .detection import Detections
+
+KEYPOINT_NAMES = ("left_eye", "right_eye", "nose", "mouth_left", "mouth_right")
+
+
+class AdaptiveDetector(object):
+    """
+    ### Description
+        Runs the full face detector only every N frames of a video and propagates
+        boxes and keypoints with sparse optical flow (pyramidal Lucas-Kanade) on the
+        5 facial keypoints in the frames between, roughly dividing detector cost by N.
+
+        The full detector also runs when:
+        - the frame size changes or the scene changes abruptly (mean difference of
+          small grayscale thumbnails above 'scene_threshold'),
+        - a face is lost by the optical flow (too few keypoints tracked forward and back).
+
+        N adapts to the measured detector latency and to the motion of the faces:
+        the slower the detector compared to the frame period, the longer the interval,
+        while fast motion shortens it so that faces drift less than 'max_drift'
+        (fraction of the face width) between two detections. Motion is measured by the
+        optical flow and, when every frame is detected, by matching the faces of
+        consecutive detections, so that the interval grows again once faces slow down.
+
+        The frame period is the source's, not the time between two calls, which also
+        counts the rest of the processing of a frame: it is given as 'frame_period'
+        or measured from the capture timestamps passed to detect(). Without either,
+        N only adapts to motion, up to 'max_interval'.
+
+        The detector follows a single video. detectBatch (frames of several cameras)
+        runs the full detector on every frame and leaves the state untouched.
+
+        Same interface as the detectors of detectors.py, so it can replace the
+        detector of FaceRecognitionSystem (see the 'adaptive_detection' argument).
+    """
+
+    def __init__(self,
+                 detector,
+                 min_interval=1,
+                 max_interval=10,
+                 detection_budget=0.25,
+                 max_drift=0.25,
+                 scene_threshold=25.0,
+                 max_flow_error=2.0,
+                 frame_period=None):
+        """
+        ### Args
+            detector (object): face detector with a detect(image) method returning Detections.
+            min_interval (int, optional): minimal number of frames between full detections. Defaults to 1.
+            max_interval (int, optional): maximal number of frames between full detections. Defaults to 10.
+            detection_budget (float, optional): fraction of the frame period the detector may use on average. Defaults to 0.25.
+            max_drift (float, optional): motion allowed between detections, as a fraction of the face width. Defaults to 0.25.
+            scene_threshold (float, optional): mean gray level difference of thumbnails that triggers a detection. Defaults to 25.
+            max_flow_error (float, optional): forward-backward error in pixels above which a keypoint is lost. Defaults to 2.
+            frame_period (float, optional): seconds between two frames of the source, e.g. 1 / fps.
+                                            Defaults to None (measured from capture timestamps).
+        """
+        self.detector = detector
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.detection_budget = detection_budget
+        self.max_drift = max_drift
+        self.scene_threshold = scene_threshold
+        self.max_flow_error = max_flow_error
+        self.frame_period = frame_period
+        self.flow_params = dict(winSize=(21, 21), maxLevel=3,
+                                criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 20, 0.03))
+
+        self.interval = min_interval
+        self.full_detections = 0
+        self.propagations = 0
+        self.reset()
+
+    def reset(self):
+        self._previous_gray = None
+        self._previous_thumbnail = None
+        self._detections = None
+        self._since_detection = 0
+        self._detect_time = None
+        self._frame_time = self.frame_period
+        self._last_timestamp = None
+        self._motion = 0.0
+
+    def _sceneChanged(self, thumbnail):
+        if self._previous_thumbnail is None:
+            return True
+        return cv2.absdiff(thumbnail, self._previous_thumbnail).mean() > self.scene_threshold
+
+    def _updateInterval(self):
+        if self._detect_time is None:
+            return
+
+        if self._frame_time:
+            # frames per detection so that detection stays within its share of the frame period
+            interval = self._detect_time / (self.detection_budget * self._frame_time)
+        else:
+            interval = self.max_interval
+        # but detect again before faces drift too far
+        if self._motion > 0:
+            interval = min(interval, self.max_drift / self._motion)
+        self.interval = int(np.clip(round(interval), self.min_interval, self.max_interval))
+
+    def _fullDetection(self, image):
+        start = time.perf_counter()
+        detections = self.detector.detect(image)
+        elapsed = time.perf_counter() - start
+        self._detect_time = elapsed if self._detect_time is None else 0.8 * self._detect_time + 0.2 * elapsed
+        self._since_detection = 0
+        self.full_detections += 1
+        return detections
+
+    @staticmethod
+    def _detectionMotion(previous, detections):
+        """
+        Motion, in face widths, of the faces of two consecutive frames: every face is
+        matched to the nearest face of the previous frame. Faces farther than their
+        width from any previous face are new faces, not motion.
+        """
+        if previous is None or len(previous) == 0 or len(detections) == 0:
+            return 0.0
+        old = np.array([[x + w / 2.0, y + h / 2.0] for x, y, w, h in previous.boxes])
+        new = np.array([[x + w / 2.0, y + h / 2.0] for x, y, w, h in detections.boxes])
+        widths = np.maximum(np.array([w for _, _, w, _ in detections.boxes], dtype=np.float64), 1.0)
+        shifts = np.linalg.norm(new[:, np.newaxis] - old[np.newaxis], axis=2).min(axis=1)
+        matched = shifts < widths
+        return float((shifts[matched] / widths[matched]).max()) if matched.any() else 0.0
+
+    def _propagate(self, gray):
+        """
+        Moves the previous detections to the current frame with optical flow.
+        Returns None when a face is lost.
+        """
+        previous = self._detections
+        if len(previous) == 0:
+            return Detections()
+
+        points = np.array([[points[name] for name in KEYPOINT_NAMES] for points in previous.keypoints],
+                          dtype=np.float32).reshape(-1, 1, 2)
+        moved, status, _ = cv2.calcOpticalFlowPyrLK(self._previous_gray, gray, points, None, **self.flow_params)
+        back, back_status, _ = cv2.calcOpticalFlowPyrLK(gray, self._previous_gray, moved, None, **self.flow_params)
+
+        error = np.linalg.norm((back - points).reshape(-1, 2), axis=1)
+        good = ((status.ravel() == 1) & (back_status.ravel() == 1) & (error < self.max_flow_error))
+        good = good.reshape(len(previous), len(KEYPOINT_NAMES))
+        points = points.reshape(len(previous), len(KEYPOINT_NAMES), 2)
+        moved = moved.reshape(len(previous), len(KEYPOINT_NAMES), 2)
+
+        h, w = gray.shape[:2]
+        detections = Detections()
+        motions = []
+        for box, confidence, old, new, ok in zip(previous.boxes, previous.confidences, points, moved, good):
+            # both eyes are needed to align the face, and 3 points to estimate its scale
+            if ok.sum() < 3 or not (ok[0] and ok[1]):
+                return None
+
+            shift = np.median(new[ok] - old[ok], axis=0)
+            old_spread = np.linalg.norm(old[ok] - old[ok].mean(axis=0), axis=1).mean()
+            new_spread = np.linalg.norm(new[ok] - new[ok].mean(axis=0), axis=1).mean()
+            scale = new_spread / old_spread if old_spread > 0 else 1.0
+
+            # keypoints lost by the flow follow the face
+            new = np.where(ok[:, np.newaxis], new, old + shift)
+
+            x, y, bw, bh = box
+            center = np.array([x + bw / 2.0, y + bh / 2.0]) + shift
+            bw, bh = bw * scale, bh * scale
+            x1, y1 = max(0, int(round(center[0] - bw / 2))), max(0, int(round(center[1] - bh / 2)))
+            x2, y2 = min(w - 1, int(round(center[0] + bw / 2))), min(h - 1, int(round(center[1] + bh / 2)))
+            if x2 <= x1 or y2 <= y1:
+                return None
+
+            detections.boxes.append([x1, y1, x2 - x1, y2 - y1])
+            detections.keypoints.append({name: (int(round(px)), int(round(py))) for name, (px, py) in zip(KEYPOINT_NAMES, new)})
+            detections.confidences.append(confidence)
+            motions.append(np.linalg.norm(shift) / max(bw, 1.0))
+
+        motion = max(motions)
+        self._motion = 0.7 * self._motion + 0.3 * motion
+        return detections
+
+    def detect(self, image, timestamp=None):
+        """
+        ### Args
+            image (nparray): RGB video frame.
+            timestamp (float, optional): capture time of the frame in seconds, e.g. the
+                                         CAP_PROP_POS_MSEC of a video / 1000. Defaults to None.
+
+        ### Returns
+            Detections: detected or propagated boxes, keypoints and confidences.
+        """
+        if timestamp is not None and self.frame_period is None:
+            if self._last_timestamp is not None and timestamp > self._last_timestamp:
+                elapsed = timestamp - self._last_timestamp
+                self._frame_time = elapsed if self._frame_time is None else 0.8 * self._frame_time + 0.2 * elapsed
+            self._last_timestamp = timestamp
+
+        gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+        thumbnail = cv2.resize(gray, (64, 48), interpolation=cv2.INTER_AREA)
+
+        detections = None
+        # the previous frame shows the same scene
+        continuous = (self._previous_gray is not None
+                      and self._previous_gray.shape == gray.shape
+                      and not self._sceneChanged(thumbnail))
+        if continuous and self._since_detection + 1 < self.interval:
+            detections = self._propagate(gray)
+
+        if detections is None:
+            detections = self._fullDetection(image)
+            # without propagation, e.g. at the minimal interval, motion is measured between detections
+            motion = self._detectionMotion(self._detections, detections) if continuous else 0.0
+            self._motion = 0.7 * self._motion + 0.3 * motion
+        else:
+            self._since_detection += 1
+            self.propagations += 1
+
+        self._updateInterval()
+        self._previous_gray = gray
+        self._previous_thumbnail = thumbnail
+        self._detections = detections
+        return detections
+
+    def detectBatch(self, images):
+        """
+        ### Description
+            Frames of several streams: full detection of every frame, without adaptation.
+        """
+        if hasattr(self.detector, "detectBatch"):
+            return self.detector.detectBatch(images)
+        return [self.detector.detect(image) for image in images]
+
+    def detect_faces(self, image):
+        detections = self.detect(image)
+        return [{"box": box, "confidence": confidence, "keypoints": keypoints}
+                for box, keypoints, confidence in zip(detections.boxes, detections.keypoints, detections.confidences)]
@@ -0,0 +1,309 @@
+import hashlib
+import threading
+import numpy as np
+from .helper import atomicPickleDump
+
+
+def embeddingsVersion(embeddings_dict):
+    """
+    ### Description
+        Version of a set of embeddings: a digest of the number of embeddings of every id.
+        Enrollment only appends embeddings, so any enrollment changes the version.
+
+    ### Returns
+        str: hexadecimal digest.
+    """
+    counts = sorted((int(ref_id), len(embed_list)) for ref_id, embed_list in embeddings_dict.items())
+    return hashlib.sha1(repr(counts).encode("utf-8")).hexdigest()
+
+
+class IncrementalFaceClassifier(object):
+    """
+    ### Description
+        Face classifier with one prototype per person, the mean of its L2 normalised
+        embeddings. Probabilities are a softmax of the scaled cosine similarities between
+        an embedding and every prototype. Same predict_proba / classes_ interface as the
+        scikit-learn classifiers returned by models.faceClassifier.
+
+        Prototypes are running sums, so enrolling new embeddings or new people updates
+        the classifier in place (update): only the new embeddings are normalised and only
+        the prototypes of their people are recomputed, instead of retraining a
+        LogisticRegression on the whole database. The version check still reads the
+        number of embeddings of every person.
+
+        The classifier records the version of the embedding set it was trained on
+        (see embeddingsVersion). Updates only ever add embeddings; the classifier
+        retrains from scratch in a background thread, while the current one keeps
+        serving, when it drifts from the database (embeddings enrolled during the
+        retraining are added when it ends):
+        - embeddings were removed or replaced (an id has fewer embeddings than learnt),
+        - or the database grew by more than 'retrain_fraction' since the last full training,
+          which recalibrates the softmax scale to the new number of people.
+
+    ### Example
+        ```python
+        clf = IncrementalFaceClassifier(path="util/face_classifier.pkl").fit(frs.embeddings)
+        ...  # enroll people
+        clf.update(frs.embeddings)
+        ```
+    """
+
+    def __init__(self, scale=None, confidence=0.9, retrain_fraction=0.25, path=None):
+        """
+        ### Args
+            scale (float, optional): softmax scale of the cosine similarities. Defaults to None (calibrated by fit).
+            confidence (float, optional): probability given, on average, to the right person by the calibrated scale. Defaults to 0.9.
+            retrain_fraction (float, optional): growth of the database, since the last full training,
+                                                that triggers a background retraining. Defaults to 0.25.
+            path (str, optional): file the classifier saves itself to after every change. Defaults to None.
+        """
+        self.fixed_scale = scale
+        self.scale = scale if scale is not None else 10.0
+        self.confidence = confidence
+        self.retrain_fraction = retrain_fraction
+        self.path = path
+
+        self.classes_ = np.empty(0, dtype=np.int64)
+        self.sums = np.empty((0, 0), dtype=np.float64)
+        self.counts = {}
+        self.version = None
+        self.trained_size = 0
+        self.retrains = 0
+        self.updates = 0
+        self._prototypes = None
+        self._lock = threading.Lock()
+        self._retraining = None
+        self._pending = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"], state["_retraining"], state["_pending"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+        self._retraining = None
+        self._pending = None
+
+    @staticmethod
+    def _snapshot(embeddings_dict):
+        return {int(ref_id): list(embed_list) for ref_id, embed_list in embeddings_dict.items()}
+
+    @staticmethod
+    def _normalize(embeddings):
+        embeddings = np.asarray(embeddings, dtype=np.float64).reshape(len(embeddings), -1)
+        return embeddings / np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+
+    def _calibrate(self, classes, prototypes, embeddings_dict):
+        """
+        Softmax scale giving on average 'confidence' to the right person:
+        with a median margin m between the right and the best wrong prototype
+        and K people, p = 1 / (1 + (K - 1) exp(-scale m)).
+        """
+        if self.fixed_scale is not None or len(classes) < 2:
+            return self.scale
+        rows = {ref_id: i for i, ref_id in enumerate(classes)}
+        margins = []
+        for ref_id, embed_list in embeddings_dict.items():
+            similarities = self._normalize(embed_list) @ prototypes.T
+            right = similarities[:, rows[int(ref_id)]].copy()
+            similarities[:, rows[int(ref_id)]] = -np.inf
+            margins.extend(right - similarities.max(axis=1))
+        margin = float(np.median(margins))
+        if margin <= 0:
+            return self.scale
+        return float(np.log((len(classes) - 1) * self.confidence / (1 - self.confidence)) / margin)
+
+    def fit(self, embeddings_dict):
+        """
+        ### Description
+            Trains the classifier from scratch on {id : list of embeddings}.
+
+        ### Returns
+            IncrementalFaceClassifier: self.
+        """
+        embeddings_dict = {int(ref_id): list(embed_list) for ref_id, embed_list in embeddings_dict.items() if len(embed_list)}
+        classes = np.array(sorted(embeddings_dict), dtype=np.int64)
+        sums = np.array([self._normalize(embeddings_dict[ref_id]).sum(axis=0) for ref_id in classes]) \
+            if len(classes) else np.empty((0, 0), dtype=np.float64)
+        counts = {ref_id: len(embeddings_dict[ref_id]) for ref_id in classes.tolist()}
+        prototypes = self._normalize(sums) if len(classes) else sums
+        scale = self._calibrate(classes, prototypes, embeddings_dict)
+
+        with self._lock:
+            self.classes_, self.sums, self.counts, self.scale = classes, sums, counts, scale
+            self._prototypes = prototypes
+            self.version = embeddingsVersion(embeddings_dict)
+            self.trained_size = sum(counts.values())
+            self.retrains += 1
+        return self
+
+    def drifted(self, embeddings_dict):
+        """
+        ### Returns
+            bool: True if the classifier must be retrained from scratch on 'embeddings_dict'.
+        """
+        with self._lock:
+            counts, trained_size = self.counts, self.trained_size
+        # counts is replaced, never modified, by fit and update
+        size = 0
+        for ref_id, embed_list in embeddings_dict.items():
+            if len(embed_list) < counts.get(int(ref_id), 0):
+                return True
+            size += len(embed_list)
+        if len(counts) > 0 and any(ref_id not in embeddings_dict for ref_id in counts):
+            return True
+        return size > (1 + self.retrain_fraction) * max(trained_size, 1)
+
+    def update(self, embeddings_dict, background=True):
+        """
+        ### Description
+            Adds the embeddings of 'embeddings_dict' that the classifier has not learnt yet,
+            i.e. embeddings appended to known people and new people, then retrains
+            from scratch if the classifier drifted from the database.
+
+        ### Args
+            embeddings_dict (dict): {id : list of embeddings}, e.g. FaceRecognitionSystem.embeddings.
+            background (bool, optional): retrain in a background thread. Defaults to True.
+
+        ### Returns
+            int: number of embeddings added.
+        """
+        version = embeddingsVersion(embeddings_dict)
+        if version == self.version:
+            return 0
+
+        with self._lock:
+            if self._retraining is not None and threading.current_thread() is not self._retraining:
+                # added to the retrained classifier when the retraining ends
+                self._pending = self._snapshot(embeddings_dict)
+        if self.drifted(embeddings_dict):
+            self.retrain(embeddings_dict, background=background)
+
+        added = 0
+        with self._lock:
+            classes, counts = self.classes_, dict(self.counts)
+            rows = {ref_id: i for i, ref_id in enumerate(classes.tolist())}
+            sums = self.sums.copy()
+            prototypes = self._prototypes.copy() if self._prototypes is not None else sums.copy()
+            changed, new_ids, new_sums = [], [], []
+            for ref_id, embed_list in embeddings_dict.items():
+                ref_id = int(ref_id)
+                known = counts.get(ref_id, 0)
+                if len(embed_list) <= known:
+                    continue
+                new = self._normalize(embed_list[known:]).sum(axis=0)
+                if ref_id in rows:
+                    sums[rows[ref_id]] += new
+                    changed.append(rows[ref_id])
+                else:
+                    new_ids.append(ref_id)
+                    new_sums.append(new)
+                counts[ref_id] = len(embed_list)
+                added += len(embed_list) - known
+
+            if added:
+                if changed:
+                    prototypes[changed] = self._normalize(sums[changed])
+                if new_ids:
+                    order = np.argsort(new_ids)
+                    new_ids = np.array(new_ids, dtype=np.int64)[order]
+                    new_sums = np.array(new_sums)[order]
+                    if len(classes) == 0:
+                        sums = prototypes = np.empty((0, new_sums.shape[1]), dtype=np.float64)
+                    positions = np.searchsorted(classes, new_ids)
+                    classes = np.insert(classes, positions, new_ids)
+                    sums = np.insert(sums, positions, new_sums, axis=0)
+                    prototypes = np.insert(prototypes, positions, self._normalize(new_sums), axis=0)
+                self.classes_, self.sums, self.counts = classes, sums, counts
+                self._prototypes = prototypes
+                self.updates += 1
+            self.version = version
+        if added:
+            self.save()
+        return added
+
+    def retrain(self, embeddings_dict, background=True):
+        """
+        ### Description
+            Trains the classifier from scratch on a copy of 'embeddings_dict'. In the background,
+            the current prototypes keep serving and are replaced when training ends;
+            the embeddings passed to update() meanwhile are then added from a copy
+            taken by update(), the background thread never reads the caller's mapping.
+        """
+        snapshot = self._snapshot(embeddings_dict)
+        if not background:
+            self.fit(snapshot)
+            self.save()
+            return
+
+        def run():
+            self.fit(snapshot)
+            self.save()
+            while True:
+                with self._lock:
+                    pending, self._pending = self._pending, None
+                    if pending is None:
+                        self._retraining = None
+                        break
+                self.update(pending, background=False)
+
+        with self._lock:
+            if self._retraining is not None:
+                return
+            self._pending = None
+            self._retraining = threading.Thread(target=run, name="classifier-retrain", daemon=True)
+            thread = self._retraining
+        thread.start()
+
+    def wait(self, timeout=None):
+        """
+        ### Description
+            Waits for a background retraining to end.
+        """
+        thread = self._retraining
+        if thread is not None:
+            thread.join(timeout)
+
+    def save(self):
+        if self.path is not None:
+            with self._lock:
+                atomicPickleDump(self, self.path)
+
+    def predictWithClasses(self, X):
+        """
+        ### Description
+            predict_proba with the classes its columns belong to, both taken from the same
+            state: an update or a retraining may add people, and so columns, at any time.
+
+        ### Args
+            X (nparray): embeddings (n, dim).
+
+        ### Returns
+            nparray: (n_people,) ids of the columns.
+            nparray: (n, n_people) probabilities.
+        """
+        with self._lock:
+            classes, prototypes, scale = self.classes_, self._prototypes, self.scale
+        X = self._normalize(X)
+        if prototypes is None or len(prototypes) == 0:
+            return classes, np.empty((len(X), 0))
+        logits = scale * (X @ prototypes.T)
+        logits -= logits.max(axis=1, keepdims=True)
+        probabilities = np.exp(logits)
+        return classes, probabilities / probabilities.sum(axis=1, keepdims=True)
+
+    def predict_proba(self, X):
+        """
+        ### Args
+            X (nparray): embeddings (n, dim).
+
+        ### Returns
+            nparray: (n, n_people) probabilities, columns ordered as classes_ (see predictWithClasses).
+        """
+        return self.predictWithClasses(X)[1]
+
+    def predict(self, X):
+        classes, probabilities = self.predictWithClasses(X)
+        return classes[np.argmax(probabilities, axis=1)]
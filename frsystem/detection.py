@@ -0,0 +1,143 @@
+import hashlib
+import numpy as np
+from collections import OrderedDict
+
+
+class Detections(object):
+    """
+    ### Description
+        Result of one face detection pass over an image:
+        bounding boxes, facial keypoints and confidences of every face found.
+
+        - boxes: list of face location bounding box coordinates (x, y, width, height).
+        - keypoints: list of dictionaries of facial keypoints (left_eye, right_eye, nose, mouth_left, mouth_right).
+        - confidences: list of detection confidences.
+    """
+
+    def __init__(self, boxes=None, keypoints=None, confidences=None):
+        self.boxes = boxes if boxes is not None else []
+        self.keypoints = keypoints if keypoints is not None else []
+        self.confidences = confidences if confidences is not None else []
+
+    @classmethod
+    def fromMTCNN(cls, faces):
+        """
+        ### Description
+            Creates detections from the output of MTCNN.detect_faces.
+        """
+        return cls(boxes=[face["box"] for face in faces],
+                   keypoints=[face["keypoints"] for face in faces],
+                   confidences=[face["confidence"] for face in faces])
+
+    @property
+    def features(self):
+        """
+        list: list of facial features dictionaries as returned by FaceRecognitionSystem.detectFaces.
+        """
+        return [{ "left_eye": points["left_eye"],
+                  "right_eye": points["right_eye"],
+                  "nose": points["nose"] } for points in self.keypoints]
+
+    def __len__(self):
+        return len(self.boxes)
+
+
+class DetectionCache(object):
+    """
+    ### Description
+        Small bounded LRU cache of Detections, so that helpers called
+        several times on the same image run the detector only once.
+
+        Images are keyed either by their content hash ('hash', safe when
+        buffers are reused) or by the identity of the array ('identity', cheaper
+        but only valid while the array is not modified in place).
+    """
+
+    def __init__(self, maxsize=8, key="hash"):
+        if key not in ("hash", "identity"):
+            raise AttributeError("Invalid value for key. Please use 'hash' or 'identity'.")
+
+        self.maxsize = maxsize
+        self.key = key
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def _key(self, image):
+        image = np.asarray(image)
+        if self.key == "identity":
+            return (id(image), image.__array_interface__["data"][0], image.shape, image.dtype.str)
+
+        digest = hashlib.blake2b(np.ascontiguousarray(image).data, digest_size=16).digest()
+        return (digest, image.shape, image.dtype.str)
+
+    def get(self, image, detect):
+        """
+        ### Description
+            Returns the cached detections of an image,
+            or runs 'detect(image)' and caches its result.
+
+        ### Args
+            image (ndarray): image containing faces.
+            detect (callable): function returning Detections for an image.
+
+        ### Returns
+            Detections: detections of the image.
+        """
+        if self.maxsize <= 0:
+            return detect(image)
+
+        key = self._key(image)
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key]
+
+        self.misses += 1
+        detections = detect(image)
+        self._entries[key] = detections
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        return detections
+
+    def getBatch(self, images, detect_batch):
+        """
+        ### Description
+            Same as get for several images: the images missing from the cache
+            are detected together with a single 'detect_batch(images)' call.
+
+        ### Args
+            images (list): list of images containing faces.
+            detect_batch (callable): function returning a list of Detections for a list of images.
+
+        ### Returns
+            list: detections of every image.
+        """
+        if self.maxsize <= 0:
+            return detect_batch(images)
+
+        keys = [self._key(image) for image in images]
+        results = [None] * len(images)
+        missing = []
+        for i, key in enumerate(keys):
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                results[i] = self._entries[key]
+            else:
+                self.misses += 1
+                missing.append(i)
+
+        if missing:
+            for i, detections in zip(missing, detect_batch([images[i] for i in missing])):
+                results[i] = detections
+                self._entries[keys[i]] = detections
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return results
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
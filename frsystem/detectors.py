@@ -0,0 +1,263 @@
+import os
+import cv2
+import numpy as np
+from .box_utils import predict_batch
+from .detection import Detections
+
+# mean positions of the 5 facial keypoints inside a face box, as fractions of its width and height
+LANDMARK_TEMPLATE = {
+    "left_eye": (0.31, 0.40),
+    "right_eye": (0.69, 0.40),
+    "nose": (0.50, 0.58),
+    "mouth_left": (0.35, 0.78),
+    "mouth_right": (0.65, 0.78),
+}
+
+
+def createDetector(name="mtcnn", path=None, **kwargs):
+    """
+    ### Description
+        Creates a face detector by name.
+
+    ### Args
+        name (str, optional): 'mtcnn' or 'ultralight'. Defaults to "mtcnn".
+        path (str, optional): path to the model file of detectors that need one. Defaults to None.
+        **kwargs: arguments passed to the detector class.
+
+    ### Returns
+        detector object with a detect(image) method returning Detections.
+    """
+    if name == "mtcnn":
+        return MTCNNDetector(**kwargs)
+    elif name == "ultralight":
+        if path is not None:
+            kwargs["path"] = path
+        return UltraLightDetector(**kwargs)
+    else:
+        raise AttributeError("invalid detector. Please use 'mtcnn' or 'ultralight'.")
+
+def fivePointLandmarks(gray, box, refine_eyes=True):
+    """
+    ### Description
+        Cheap 5-point landmark estimate for detectors that only return boxes.
+        Keypoints are placed from a mean face template; eye centers are then
+        refined to the darkest spot (the pupil) of a small region around
+        the template position, which recovers the in-plane rotation of the face.
+
+    ### Args
+        gray (nparray): grayscale image.
+        box (tuple): face box (x, y, width, height).
+        refine_eyes (bool, optional): refine eye centers on the image. Defaults to True.
+
+    ### Returns
+        dict: keypoints dictionary with MTCNN keys.
+    """
+    x, y, w, h = box
+    keypoints = {name: (int(x + fx * w), int(y + fy * h)) for name, (fx, fy) in LANDMARK_TEMPLATE.items()}
+    if not refine_eyes or w < 24 or h < 24:
+        return keypoints
+
+    rw, rh = max(2, int(0.12 * w)), max(2, int(0.08 * h))
+    for name in ("left_eye", "right_eye"):
+        cx, cy = keypoints[name]
+        x1, y1 = max(0, cx - rw), max(0, cy - rh)
+        x2, y2 = min(gray.shape[1], cx + rw + 1), min(gray.shape[0], cy + rh + 1)
+        if x2 - x1 < 3 or y2 - y1 < 3:
+            continue
+
+        region = cv2.GaussianBlur(gray[y1:y2, x1:x2], (3, 3), 0)
+        min_val, _, min_loc, _ = cv2.minMaxLoc(region)
+        # only trust clearly dark spots, e.g. not on closed eyes or sunglasses glare
+        if region.mean() - min_val > 20:
+            keypoints[name] = (x1 + min_loc[0], y1 + min_loc[1])
+
+    return keypoints
+
+
+def makeBatchDynamic(path, output):
+    """
+    ### Description
+        Rewrites an ONNX detector exported with a fixed batch size of 1 (such as
+        util/ultra_light_640.onnx) so that it accepts any number of frames per call.
+        Weights listed as graph inputs by old exporters are also turned back into
+        constants, which lets ONNX Runtime fold them.
+
+    ### Args
+        path (str): path to the ONNX model.
+        output (str): path of the rewritten model.
+    """
+    import onnx
+
+    model = onnx.load(path)
+    initializers = {initializer.name for initializer in model.graph.initializer}
+    inputs = [tensor for tensor in model.graph.input if tensor.name not in initializers]
+    del model.graph.input[:]
+    model.graph.input.extend(inputs)
+
+    for tensor in list(model.graph.input) + list(model.graph.output):
+        tensor.type.tensor_type.shape.dim[0].dim_param = "batch"
+    # inferred shapes still carry the fixed batch size
+    del model.graph.value_info[:]
+
+    onnx.checker.check_model(model)
+    onnx.save(model, output)
+    print("Saved batched detector to {}".format(output))
+
+
+class MTCNNDetector(object):
+    """
+    ### Description
+        MTCNN face detector: boxes, confidences and 5 facial keypoints.
+    """
+
+    def __init__(self, **kwargs):
+        from mtcnn import MTCNN
+        self.model = MTCNN(**kwargs)
+
+    def detect_faces(self, image):
+        return self.model.detect_faces(image)
+
+    def detect(self, image):
+        return Detections.fromMTCNN(self.model.detect_faces(image))
+
+    def detectBatch(self, images):
+        return [self.detect(image) for image in images]
+
+
+class UltraLightDetector(object):
+    """
+    ### Description
+        Lightweight UltraLight (RFB 640) ONNX face detector followed by a cheap
+        5-point landmark stage, so that faces can still be aligned with alignCropFace.
+        Much faster than MTCNN on CPU.
+
+        detectBatch runs several frames (e.g. from several cameras) through one
+        session call. Frames are resized and normalised straight into a float32
+        NCHW buffer allocated once and reused. Models exported with a fixed batch
+        size of 1 are run frame by frame on the same buffer; convert them with
+        makeBatchDynamic to get a single call.
+    """
+
+    def __init__(self,
+                 path=os.path.join("util", "ultra_light_640.onnx"),
+                 prob_threshold=0.7,
+                 iou_threshold=0.3,
+                 input_size=(640, 480),
+                 refine_eyes=True,
+                 intra_op_threads=None,
+                 max_batch=4):
+        """
+        ### Args
+            path (str, optional): path to the UltraLight ONNX model. Defaults to util/ultra_light_640.onnx.
+            prob_threshold (float, optional): minimal face confidence. Defaults to 0.7.
+            iou_threshold (float, optional): intersection over union threshold of non-maximum suppression. Defaults to 0.3.
+            input_size (tuple, optional): (width, height) of the model input. Defaults to (640, 480).
+            refine_eyes (bool, optional): refine template eye positions on the image. Defaults to True.
+            intra_op_threads (int, optional): ONNX Runtime threads inside an operator. Defaults to None.
+            max_batch (int, optional): initial capacity of the input buffer, grown when needed. Defaults to 4.
+        """
+        os.environ['KMP_DUPLICATE_LIB_OK'] = 'True'
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.log_severity_level = 3
+        if intra_op_threads:
+            options.intra_op_num_threads = intra_op_threads
+
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        # a fixed first dimension means the model only takes one frame per call
+        self.batched = not isinstance(model_input.shape[0], int) or model_input.shape[0] > 1
+        self.prob_threshold = prob_threshold
+        self.iou_threshold = iou_threshold
+        self.input_size = input_size
+        self.refine_eyes = refine_eyes
+        self._batch = np.empty((max_batch, 3, input_size[1], input_size[0]), dtype=np.float32)
+        self._resized = np.empty((input_size[1], input_size[0], 3), dtype=np.uint8)
+
+    def _preprocess(self, images):
+        n = len(images)
+        if n > self._batch.shape[0]:
+            self._batch = np.empty((max(n, 2 * self._batch.shape[0]),) + self._batch.shape[1:], dtype=np.float32)
+
+        for i, image in enumerate(images):
+            cv2.resize(image, self.input_size, dst=self._resized)
+            # (x - 127) / 128, written channel first into the batch
+            np.multiply(self._resized.transpose(2, 0, 1), 1 / 128, out=self._batch[i], casting="unsafe")
+            self._batch[i] -= 127 / 128
+        return self._batch[:n]
+
+    def _run(self, batch):
+        if self.batched:
+            return self.session.run(None, {self.input_name: batch})
+
+        outputs = [self.session.run(None, {self.input_name: batch[i:i + 1]}) for i in range(batch.shape[0])]
+        return [np.concatenate(output) for output in zip(*outputs)]
+
+    def detectBatch(self, images):
+        """
+        ### Description
+            Detects faces in several frames with a single batched model call.
+
+        ### Args
+            images (list): list of RGB images, of any sizes.
+
+        ### Returns
+            list: one Detections per image.
+        """
+        if len(images) == 0:
+            return []
+
+        confidences, boxes = self._run(self._preprocess(images))
+        widths = [image.shape[1] for image in images]
+        heights = [image.shape[0] for image in images]
+        results = predict_batch(widths, heights, confidences, boxes, self.prob_threshold, iou_threshold=self.iou_threshold)
+        return [self._detections(image, boxes, probs) for image, (boxes, _, probs) in zip(images, results)]
+
+    def detect(self, image):
+        """
+        ### Args
+            image (nparray): RGB image.
+
+        ### Returns
+            Detections: boxes (x, y, width, height), estimated keypoints and confidences.
+        """
+        return self.detectBatch([image])[0]
+
+    def _detections(self, image, boxes, probs):
+        h, w = image.shape[:2]
+        detections = Detections()
+        if len(boxes) == 0:
+            return detections
+
+        gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+        for (x1, y1, x2, y2), prob in zip(boxes, probs):
+            x1, y1 = max(0, int(x1)), max(0, int(y1))
+            x2, y2 = min(w - 1, int(x2)), min(h - 1, int(y2))
+            if x2 <= x1 or y2 <= y1:
+                continue
+            box = [x1, y1, x2 - x1, y2 - y1]
+            detections.boxes.append(box)
+            detections.keypoints.append(fivePointLandmarks(gray, box, refine_eyes=self.refine_eyes))
+            detections.confidences.append(float(prob))
+        return detections
+
+    def detect_faces(self, image):
+        """
+        ### Description
+            Same output format as MTCNN.detect_faces.
+        """
+        detections = self.detect(image)
+        return [{"box": box, "confidence": confidence, "keypoints": keypoints}
+                for box, keypoints, confidence in zip(detections.boxes, detections.keypoints, detections.confidences)]
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Make the batch size of an ONNX face detector dynamic.")
+    parser.add_argument("path", help="path to the ONNX detector")
+    parser.add_argument("output", help="path of the rewritten model")
+    args = parser.parse_args()
+
+    makeBatchDynamic(args.path, args.output)
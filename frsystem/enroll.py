@@ -0,0 +1,172 @@
+import os
+import json
+import time
+import multiprocessing
+
+# face recognition system of a worker process, created once by _initWorker
+_worker_frs = None
+
+
+def listImages(base):
+    """
+    ### Description
+        Lists the images of a directory tree laid out as base/<person name>/<image>,
+        skipping hidden files and folders.
+
+    ### Returns
+        list: list of (path, name) tuples.
+    """
+    tasks = []
+    for folder in sorted(os.listdir(base)):
+        if folder[0] == ".":
+            continue
+
+        path = os.path.join(base, folder)
+        for image in sorted(os.listdir(path)):
+            if image[0] == ".":
+                continue
+            tasks.append((os.path.join(path, image), folder))
+    return tasks
+
+def _initWorker(frs_kwargs, threads_per_worker):
+    global _worker_frs
+
+    # ONNX Runtime workers get their threads from 'intra_op_threads'
+    if threads_per_worker and frs_kwargs.get("engine", "keras") == "keras":
+        import tensorflow as tf
+        tf.config.threading.set_intra_op_parallelism_threads(threads_per_worker)
+        tf.config.threading.set_inter_op_parallelism_threads(1)
+
+    from .frs import FaceRecognitionSystem
+    _worker_frs = FaceRecognitionSystem(**frs_kwargs)
+
+def _embedImage(task):
+    """
+    Runs in a worker: detects the first face of an image and returns its embedding.
+    Errors are captured and returned instead of raised.
+    """
+    import cv2
+    path, name = task
+    result = {"path": path, "name": name, "embedding": None, "status": "ok", "error": None}
+    try:
+        image = cv2.imread(path)
+        if image is None:
+            raise IOError("Could not read image.")
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+
+        face_locations, facial_features = _worker_frs.detectFaces(image)
+        if not facial_features:
+            result["status"] = "no_face"
+        else:
+            result["embedding"] = _worker_frs.faceEmbeddings(image,
+                                                             face_locations=face_locations,
+                                                             facial_features=facial_features)[0]
+    except Exception as e:
+        result["status"] = "error"
+        result["error"] = "{}: {}".format(type(e).__name__, e)
+    return result
+
+def _readCheckpoint(checkpoint):
+    done = set()
+    if checkpoint is None or not os.path.exists(checkpoint):
+        return done
+
+    with open(checkpoint, "r") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break # torn last record after a crash
+            # failed images are retried on resume
+            if record["status"] != "error":
+                done.add(record["path"])
+    return done
+
+def enrollParallel(frs,
+                   base,
+                   workers=None,
+                   checkpoint=None,
+                   commit_every=500,
+                   chunksize=4,
+                   threads_per_worker=1):
+    """
+    ### Description
+        Parallel version of FaceRecognitionSystem.addFacesUsingLoop.
+        Images are sharded across a pool of processes, each holding its own detector
+        and embedding model. Results are streamed back to the parent, which merges them
+        into the database in batches of 'commit_every' images.
+
+        Every processed image is recorded in the 'checkpoint' file after its batch is
+        committed, so an interrupted run resumes where it stopped when called again
+        with the same checkpoint. Images that failed with an error are retried.
+
+    ### Args
+        frs (FaceRecognitionSystem): system connected to the database to enroll into.
+        base (str): directory containing one folder of images per person.
+        workers (int, optional): number of worker processes. Defaults to None (number of CPUs).
+        checkpoint (str, optional): path to a JSON lines checkpoint file. Defaults to None.
+        commit_every (int, optional): number of images merged per database commit. Defaults to 500.
+        chunksize (int, optional): number of images sent to a worker at once. Defaults to 4.
+        threads_per_worker (int, optional): TensorFlow / ONNX Runtime threads per worker. Defaults to 1.
+
+    ### Returns
+        list: list of (path, error) tuples for images that failed.
+    """
+    tasks = listImages(base)
+    done = _readCheckpoint(checkpoint)
+    tasks = [task for task in tasks if task[0] not in done]
+    total = len(tasks)
+    print("Enrolling {} images with {} workers ({} already done)...".format(total, workers or os.cpu_count(), len(done)))
+    if total == 0:
+        return []
+
+    frs_kwargs = {"embedding_model": frs.embedding_model,
+                  "weights": frs.weights,
+                  "engine": frs.engine,
+                  "detector": frs.detector_name,
+                  "detector_path": frs.detector_path,
+                  "interpolation": frs.interpolation,
+                  "max_batch": frs.max_batch,
+                  "intra_op_threads": threads_per_worker}
+    errors = []
+    results = []
+    processed = 0
+    start = time.time()
+
+    def merge(results):
+        with frs.connection.batch():
+            for result in results:
+                if result["embedding"] is None:
+                    continue
+                ref_id = frs.connection.generateFaceID(result["name"])
+                if ref_id in frs.embeddings.keys():
+                    frs.embeddings[ref_id] += [result["embedding"]]
+                else:
+                    frs.embeddings[ref_id] = [result["embedding"]]
+            frs.connection.dumpEmbeddings()
+
+        if checkpoint is not None:
+            with open(checkpoint, "a") as f:
+                for result in results:
+                    f.write(json.dumps({"path": result["path"], "status": result["status"], "error": result["error"]}) + "\n")
+
+    # spawn: TensorFlow is not fork-safe
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(workers, initializer=_initWorker, initargs=(frs_kwargs, threads_per_worker)) as pool:
+        for result in pool.imap_unordered(_embedImage, tasks, chunksize=chunksize):
+            results.append(result)
+            processed += 1
+            if result["status"] == "error":
+                errors.append((result["path"], result["error"]))
+
+            if len(results) >= commit_every:
+                merge(results)
+                results = []
+                rate = processed / (time.time() - start)
+                print("Enrolled {}/{} images ({:.1f} images/s, {} errors)".format(processed, total, rate, len(errors)))
+
+    if results:
+        merge(results)
+    print("Enrolled {}/{} images in {:.1f}s, {} errors".format(processed, total, time.time() - start, len(errors)))
+
+    return errors
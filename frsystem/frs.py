@@ -1,21 +1,19 @@
-tf = None
-try:
-  tf = __import__("tensorflow-gpu")
-  tf.operation_that_requires_gpu()
-except:
-  tf = __import__("tensorflow")
-  
-tf.compat.v1.logging.set_verbosity(tf.compat.v1.logging.ERROR)
-
-from os import environ
-environ['TF_CPP_MIN_LOG_LEVEL']='3'
-
+import os
 import cv2 
+import time
 import pickle 
+from contextlib import contextmanager
 import numpy as np
-from .models import *
-from mtcnn import MTCNN
-from tensorflow.keras.applications.vgg19 import preprocess_input
+from .models import embeddingsPredictor, faceClassifier, FACE_SIZES
+from .helper import pairwiseDistances, atomicPickleDump
+from .store import EmbeddingStore, EmbeddingsView
+from .detection import DetectionCache
+from .detectors import createDetector
+from .cadence import AdaptiveDetector
+from .metrics import NULL_METRICS
+from .preprocess import FacePreprocessor, alignmentMatrices, INTERPOLATIONS
+from .inference import BucketedPredictor
+from .classifier import IncrementalFaceClassifier
 
 class FaceRecognitionSystem(object):
     
@@ -23,40 +21,213 @@ class FaceRecognitionSystem(object):
                  embedding_model=None,
                  weights=None,
                  face_classifier=None, 
+                 detector="mtcnn",
+                 detector_path=None,
+                 detection_cache_size=8,
+                 detection_cache_key="hash",
+                 adaptive_detection=False,
+                 max_detection_interval=10,
+                 frame_rate=None,
+                 interpolation="cubic",
+                 engine="keras",
+                 intra_op_threads=None,
+                 inter_op_threads=None,
+                 max_batch=32,
+                 incremental_classifier=False,
+                 metrics=None,
                  **kwargs): 
         
         """
         ### Description
             Face Recognition System creates an instance of the class with the following capabilities:
-            1. Calls MTCNN face detection model object.
+            1. Calls MTCNN (or UltraLight) face detection model object.
             2. Calls FaceNet or VGGFace model to extract embeddings (features) from face images.
             3. Creates a connection to the database of known faces by calling the "Database" class object. 
                 - self.db is the dictionary of known faces with id : name key-value pairs.
                 - self.embeddings is the dictionary of known faces with id : embeddings key-value pairs.
             4. Loads face classifier that was trained on the database of known faces.
 
+            Models are loaded on first use (or by warmup()), so creating the system
+            and using only its database or detector does not load TensorFlow.
+
         ### Args
             'embedding_model' (str): name of the desired feature extractor 'facenet' or 'vggface'. Defaults to 'facenet'.
             'weights' (str): path to the weights of chosen embedding model.
             'face_classifier' (str): path to the face classifier model.
+            'detector' (str): face detector 'mtcnn' or 'ultralight' (faster on CPU, see detectors.py). Defaults to 'mtcnn'.
+            'detector_path' (str): path to the detector model file, e.g. util/ultra_light_640.onnx. Defaults to None.
+            'detection_cache_size' (int): number of images whose detections are cached, 0 disables the cache. Defaults to 8.
+            'detection_cache_key' (str): 'hash' (image content) or 'identity' (array object). Defaults to 'hash'.
+            'adaptive_detection' (bool): for video, run the detector every N frames only and propagate faces 
+                                         with optical flow in between (see cadence.py). Defaults to False.
+            'max_detection_interval' (int): maximal N of adaptive detection. Defaults to 10.
+            'frame_rate' (float): frames per second of the video source, with which adaptive detection 
+                                  keeps the detector within its share of the frame period. 
+                                  Defaults to None (N only adapts to face motion).
+            'interpolation' (str): interpolation used to align faces: 'nearest', 'linear', 'cubic' or 'area'. Defaults to 'cubic'.
+            'engine' (str): inference engine of the embedding model, 'keras' or 'onnx'. 
+                            With 'onnx', 'weights' is the path to the converted .onnx model. Defaults to 'keras'.
+            'intra_op_threads' (int): ONNX Runtime threads inside an operator. Defaults to None.
+            'inter_op_threads' (int): ONNX Runtime threads across operators. Defaults to None.
+            'max_batch' (int): with the 'keras' engine, faces are embedded in batches padded to a power of two 
+                               up to 'max_batch', on a model compiled once per batch size (see inference.py). 
+                               0 calls the model with the exact batch, as the 'onnx' engine always does. Defaults to 32.
+            'incremental_classifier' (bool): use a face classifier that learns enrolled people in place
+                                             instead of retraining (see classifier.py). Defaults to False.
+            'metrics' (Metrics): collects per-stage timers and counters (see metrics.py). 
+                                 Defaults to None (no instrumentation).
             **kwargs:
                 'db_filel' (str): path to pickle file containing dictionary {id : name} of known faces.
                 'embeddings_file' (str):  path to pickle file containing dictionary {id : listOfEmbeddings} of known faces.
+                'store' (str): base path of a memory-mapped embedding store used instead of the pickle files.
         """
         print("Loading Face Recognition System...")
         
-        self.detector = MTCNN()
+        self.metrics = metrics if metrics is not None else NULL_METRICS
+        self.detector_name = detector
+        self.detector_path = detector_path
+        self.adaptive_detection = adaptive_detection
+        self.max_detection_interval = max_detection_interval
+        self.frame_rate = frame_rate
+        self._detector = None
+        self.detection_cache = DetectionCache(maxsize=detection_cache_size, key=detection_cache_key)
+        self.metrics.register(self.__collectMetrics)
         
+        self.embedding_model = embedding_model
+        self.weights = weights
+        self.engine = engine
+        self.intra_op_threads = intra_op_threads
+        self.inter_op_threads = inter_op_threads
+        self.max_batch = max_batch
+        self.interpolation = interpolation
+        self._predictor = None
         if embedding_model is not None:
-            self.predictor, self.face_size = embeddingsPredictor(which=embedding_model, path=weights)
+            if embedding_model not in FACE_SIZES:
+                raise AttributeError("invalid attribute. Please use 'vggface' or 'facenet'.")
+            self.face_size = FACE_SIZES[embedding_model]
+            self.preprocessor = FacePreprocessor(self.face_size, interpolation=interpolation)
         
-        if "db_file" in kwargs:
-            self.connection = Database(**kwargs)
+        if "db_file" in kwargs or "store" in kwargs:
+            self.connection = Database(metrics=self.metrics, **kwargs)
             self.db = self.connection.db
             self.embeddings = self.connection.embeddings
+            self.connection.addListener(self.__embeddingsChanged)
             
-            if face_classifier is not None:
-                self.face_classifier = faceClassifier(embeddings_dict=self.embeddings, path=face_classifier)
+        self.face_classifier_path = face_classifier
+        self.incremental_classifier = incremental_classifier
+        self._face_classifier = None
+
+    @property
+    def detector(self):
+        """
+        Face detector, created on first use.
+        """
+        if self._detector is None:
+            detector = createDetector(self.detector_name, path=self.detector_path)
+            if self.adaptive_detection:
+                detector = AdaptiveDetector(detector, 
+                                            max_interval=self.max_detection_interval,
+                                            frame_period=1.0 / self.frame_rate if self.frame_rate else None)
+            self._detector = detector
+        return self._detector
+
+    @detector.setter
+    def detector(self, detector):
+        self._detector = detector
+
+    @property
+    def predictor(self):
+        """
+        Embedding model, loaded on first use.
+        """
+        if self._predictor is None:
+            if self.embedding_model is None:
+                raise AttributeError("No embedding model. Please pass 'embedding_model' and 'weights'.")
+            predictor, _ = embeddingsPredictor(which=self.embedding_model, 
+                                               path=self.weights, 
+                                               engine=self.engine,
+                                               intra_op_threads=self.intra_op_threads,
+                                               inter_op_threads=self.inter_op_threads)
+            # ONNX Runtime does not retrace on new batch sizes: padding would only add work
+            if self.max_batch and self.engine == "keras":
+                predictor = BucketedPredictor(predictor, self.face_size, max_batch=self.max_batch)
+            self._predictor = predictor
+        return self._predictor
+
+    @predictor.setter
+    def predictor(self, predictor):
+        self._predictor = predictor
+
+    @property
+    def face_classifier(self):
+        """
+        Face classifier, loaded (or trained on the database) on first use.
+        """
+        if self._face_classifier is None:
+            if self.face_classifier_path is None or not hasattr(self, "connection"):
+                raise AttributeError("No face classifier. Please pass 'face_classifier' and a database.")
+            self._face_classifier = faceClassifier(embeddings_dict=self.embeddings, 
+                                                   path=self.face_classifier_path,
+                                                   incremental=self.incremental_classifier)
+        return self._face_classifier
+
+    @face_classifier.setter
+    def face_classifier(self, face_classifier):
+        self._face_classifier = face_classifier
+
+    def __embeddingsChanged(self):
+        """
+        Called when new embeddings are committed to the database.
+        """
+        if self._face_classifier is None:
+            return
+        if isinstance(self._face_classifier, IncrementalFaceClassifier):
+            self._face_classifier.update(self.embeddings)
+        else:
+            # trained again on its next use
+            self._face_classifier = None
+
+    def warmup(self, image=None):
+        """
+        ### Description
+            Loads the detector, the embedding model and the face classifier now,
+            and runs each of them once, so that the first frame is not slowed down
+            by model loading and graph initialisation.
+
+        ### Args
+            image (nparray, optional): RGB image to warm up with. Defaults to a black 640x480 frame.
+
+        ### Returns
+            dict: seconds spent warming up each model.
+        """
+        if image is None:
+            image = np.zeros((480, 640, 3), dtype=np.uint8)
+        timings = {}
+
+        start = time.perf_counter()
+        self.detector.detect(image)
+        timings["detector"] = time.perf_counter() - start
+        # the warmup frame must not be tracked by an adaptive detector
+        if hasattr(self.detector, "reset"):
+            self.detector.reset()
+
+        if self.embedding_model is not None:
+            start = time.perf_counter()
+            if isinstance(self.predictor, BucketedPredictor):
+                # compiles and runs every batch size once
+                self.predictor.warmup()
+                print(self.predictor.summary())
+            faces = np.zeros((1, self.face_size, self.face_size, 3), dtype=np.float32)
+            embedding = np.array(self.predictor(faces))
+            timings["embedder"] = time.perf_counter() - start
+
+            if self.face_classifier_path is not None and hasattr(self, "connection"):
+                start = time.perf_counter()
+                self.face_classifier.predict_proba(embedding.reshape(1, -1))
+                timings["classifier"] = time.perf_counter() - start
+
+        print("Warmed up " + ", ".join("{} in {:.2f}s".format(name, t) for name, t in timings.items()))
+        return timings
         
     
     def alignCropFace(self, 
@@ -90,58 +261,15 @@ class FaceRecognitionSystem(object):
         else:
             (x1, y1, width, height) = face_location
 
-        left_eye_center = facial_features['left_eye']
-        right_eye_center = facial_features['right_eye']
-        left_eye_center = np.array(left_eye_center).astype("int")
-        right_eye_center = np.array(right_eye_center).astype("int")
-
-        # find angle of the line passing through eyes centers
-        dY = right_eye_center[1] - left_eye_center[1]
-        dX = right_eye_center[0] - left_eye_center[0]
-        angle = np.degrees(np.arctan2(dY, dX))
-
-        # to get the face at the center of the image
-        desired_left_eye=(0.35, 0.35) 
-        desired_right_eye_x = 1.0 - desired_left_eye[0] 
-
-        desired_face_width = face_size
-        desired_face_height = face_size
-
-        # determine the scale of the new resulting image by taking
-        # the ratio of the distance between eyes in the current
-        # image to the ratio of distance between eyes in the
-        # desired image
-        dist = np.sqrt((dX ** 2) + (dY ** 2))
-        desiredDist = (desired_right_eye_x - desired_left_eye[0])
-        desiredDist *= desired_face_width
-
-        if image.shape[1] >= 1000 or image.shape[0] >= 1000:
-            scale = (desiredDist / dist) + 0.1
-        elif (image.shape[1] > 300 or image.shape[0] > 300) and (image.shape[1] < 1000 or image.shape[0] < 1000):
-            scale = (desiredDist / dist) + 0.2
-        else:
-            scale = (desiredDist / dist) + 0.35
-
-        # compute center (x, y)-coordinates (i.e., the median point)
-        # between the two eyes in the input image
-        eyes_center = ((left_eye_center[0] + right_eye_center[0]) // 2,
-                       (left_eye_center[1] + right_eye_center[1]) // 2)
-
-        # grab the rotation matrix for rotating and scaling the face
-        M = cv2.getRotationMatrix2D(eyes_center, angle, scale)
-
-        # update the translation component of the matrix
-        tX = desired_face_width * 0.5
-        tY = desired_face_height * desired_left_eye[1]
-        M[0, 2] += (tX - eyes_center[0])
-        M[1, 2] += (tY - eyes_center[1])
-
-        # apply the affine transformation
-        (w, h) = (desired_face_width, desired_face_height)          
-        output = cv2.warpAffine(image, 
-                                M, 
-                                (w, h), 
-                                flags=cv2.INTER_CUBIC)
+        with self.metrics.timer("alignment"):
+            M = alignmentMatrices(image.shape, [facial_features], face_size)[0]
+
+            # apply the affine transformation
+            (w, h) = (face_size, face_size)
+            output = cv2.warpAffine(image, 
+                                    M, 
+                                    (w, h), 
+                                    flags=INTERPOLATIONS.get(self.interpolation, self.interpolation))
     
         return output
     
@@ -168,34 +296,40 @@ class FaceRecognitionSystem(object):
         if face_locations is None or facial_features is None:
             face_locations, facial_features = self.detectFaces(image)
         
-        def preprocess(img):
-            img_gray = cv2.cvtColor(img, cv2.COLOR_RGB2GRAY)
-            img_rgb = np.repeat(img_gray[..., np.newaxis], 3, -1)
-            
-            if self.face_size == 160:
-                mean, std = img_rgb.mean(), img_rgb.std()
-                img_rgb = (img_rgb - mean) / std
-            elif self.face_size == 224:
-                img_rgb = preprocess_input(img_rgb)
-            else:
-                raise ValueError("Inappropriate value for face_size, please choose 160 or 224.")
-            
-            return img_rgb
-        
-        aligned_list = []
-        for i, face_loc in enumerate(face_locations):
-            aligned_face = self.alignCropFace(image, 
-                                              face_location=face_loc, 
-                                              facial_features=facial_features[i])
-            preprocessed = preprocess(aligned_face)
-            aligned_list.append(preprocessed)
-
-        aligned_list = np.array(aligned_list)
-        embeddings = np.array(self.predictor(aligned_list))
+        # aligned and normalised faces in a reused float32 batch
+        with self.metrics.timer("preprocessing"):
+            aligned_list = self.preprocessor(image, facial_features)
+        with self.metrics.timer("inference"):
+            embeddings = np.array(self.predictor(aligned_list))
+        self.metrics.increment("faces_embedded", len(aligned_list))
         
         return embeddings
+
+    def faceEmbeddingsBatch(self, images, facial_features_list):
+        """
+        ### Description
+            Embeds the faces of several images (e.g. frames of several cameras) 
+            with a single call to the embedding model.
+
+        ### Args:
+            images (list): list of images containing faces
+            facial_features_list (list): list of facial features coordinates of every image
+
+        ### Returns:
+            list: one array of face embeddings per image
+        """
+        with self.metrics.timer("preprocessing"):
+            aligned = self.preprocessor.batch(images, facial_features_list)
+        if aligned.shape[0] == 0:
+            return [np.empty((0, 0), dtype=np.float32) for _ in images]
+
+        with self.metrics.timer("inference"):
+            embeddings = np.array(self.predictor(aligned))
+        self.metrics.increment("faces_embedded", aligned.shape[0])
+        splits = np.cumsum([len(facial_features) for facial_features in facial_features_list])[:-1]
+        return np.split(embeddings, splits)
         
-    def detectFaces(self, image):
+    def detectFaces(self, image, timestamp=None):
         
         """
         ### Description
@@ -205,6 +339,7 @@ class FaceRecognitionSystem(object):
         
         ### Args
             image (ndarray) : image containing faces
+            timestamp (float, optional) : capture time of a video frame in seconds, see detect. Defaults to None.
 
         ### Returns
             (list): list of face location bounding box coordinates
@@ -225,28 +360,69 @@ class FaceRecognitionSystem(object):
                    ]
         ```
         """
-        faces = self.detector.detect_faces(image)
-        bboxes = [] # face locations coordinates
-        features = [] # facial features coordinates
+        detections = self.detect(image, timestamp=timestamp)
+        return list(detections.boxes), detections.features
 
-        for face in faces:
-            bboxes.append(face["box"])
-            features.append({ "left_eye": face["keypoints"]["left_eye"],
-                            "right_eye": face["keypoints"]["right_eye"],
-                            "nose": face["keypoints"]["nose"] })
+    def detect(self, image, timestamp=None):
+        """
+        ### Description
+            Runs the face detector once per image and returns boxes, keypoints and confidences. 
+            Results are kept in a small LRU cache, so calling detectFaces, faceLocations, 
+            facialFeatures or alignCropFace on the same image does not detect faces again.
+
+        ### Args
+            image (ndarray) : image containing faces
+            timestamp (float, optional) : capture time of a video frame in seconds, e.g. Frame.timestamp
+                                          of pipeline.py. With adaptive detection, the frame period of the
+                                          source is measured from it. Defaults to None.
+
+        ### Returns
+            Detections: detections of the image (see detection.py)
+        """
+        return self.detection_cache.get(image, lambda image: self.__timedDetect(image, timestamp))
 
-        return bboxes, features
+    def __timedDetect(self, image, timestamp=None):
+        with self.metrics.timer("detection"):
+            if timestamp is not None and isinstance(self.detector, AdaptiveDetector):
+                detections = self.detector.detect(image, timestamp=timestamp)
+            else:
+                detections = self.detector.detect(image)
+        # once per detected frame, not per cache hit
+        self.metrics.observe("faces_per_frame", len(detections))
+        return detections
+
+    def __timedDetectBatch(self, images):
+        with self.metrics.timer("detection_batch"):
+            detections = self.detector.detectBatch(images)
+        for frame_detections in detections:
+            self.metrics.observe("faces_per_frame", len(frame_detections))
+        return detections
+
+    def __collectMetrics(self, metrics):
+        cache = self.detection_cache
+        lookups = cache.hits + cache.misses
+        metrics.gauge("detection_cache_hit_ratio", cache.hits / lookups if lookups else 0.0)
+        metrics.gauge("detection_cache_size", len(cache))
+
+    def detectBatch(self, images):
+        """
+        ### Description
+            Same as detect for several images, e.g. the frames of several cameras.
+            Detectors supporting it (ultralight) process all the images in one batched call.
+
+        ### Args
+            images (list) : list of images containing faces
+
+        ### Returns
+            list: detections of every image
+        """
+        return self.detection_cache.getBatch(images, self.__timedDetectBatch)
 
     def faceLocations(self, image):
-        faces = self.detector.detect_faces(image)
-        return [face["box"] for face in faces]
+        return list(self.detect(image).boxes)
 
     def facialFeatures(self, image):
-        faces = self.detector.detect_faces(image)
-
-        return [{ "left_eye": face["keypoints"]["left_eye"],
-                "right_eye": face["keypoints"]["right_eye"],
-                "nose": face["keypoints"]["nose"] } for face in faces]
+        return self.detect(image).features
     
     @staticmethod    
     def faceDistance(face_to_compare, 
@@ -267,23 +443,41 @@ class FaceRecognitionSystem(object):
             A numpy ndarray with the distance for each face in the same order as the 'face_embeddings' array.
         
         """
-
-        # Computes cosine distance between two face embeddings
-        def findCosineScore(source_representation, test_representation):
-            a = np.matmul(np.transpose(source_representation), test_representation)
-            b = np.sum(np.multiply(source_representation, source_representation))
-            c = np.sum(np.multiply(test_representation, test_representation))
-            return 1 - (a / (np.sqrt(b) * np.sqrt(c)))
-        
         if len(face_embeddings) == 0:
             return np.empty((0))
 
-        if distance == "euclidian":
-            return np.linalg.norm(face_embeddings - face_to_compare, axis=1)
-        elif distance == "cosine":
-            return np.array([findCosineScore(face_embedding, face_to_compare) for face_embedding in face_embeddings])
-        else:
+        if distance not in ("euclidian", "cosine"):
             raise AttributeError("wrong distance attribute. Choose 'euc' or 'cosine'")
+
+        return pairwiseDistances(face_to_compare, face_embeddings, distance=distance)[0]
+    
+    @staticmethod    
+    def faceDistances(faces_to_compare, 
+                      face_embeddings, 
+                      distance="euclidian", 
+                      norms=None, 
+                      chunk_size=None):
+        """
+        ### Description
+            Many-to-many version of faceDistance. Compares a batch of unknown face embeddings 
+            against a batch of known face embeddings and returns the full distance matrix.
+
+        ### Args:
+            'faces_to_compare' (nparray): array of shape (n_queries, dim) containing unknown face embeddings.
+            'face_embeddings' (nparray): array of shape (n_known, dim) containing known face embeddings.
+            distance (str, optional): options: 'cosine', 'euclidian'. Defaults to "euclidian".
+            norms (nparray, optional): cached L2 norms of 'face_embeddings'. Defaults to None.
+            chunk_size (int, optional): number of known embeddings compared at once, 
+                                        bounds memory for large galleries. Defaults to None.
+            
+        ### Returns
+            A numpy ndarray of shape (n_queries, n_known).
+        """
+        return pairwiseDistances(faces_to_compare, 
+                                 face_embeddings, 
+                                 distance=distance, 
+                                 norms=norms, 
+                                 chunk_size=chunk_size)
     
     @staticmethod
     def compareFaces(face_embedding_to_check, 
@@ -298,7 +492,8 @@ class FaceRecognitionSystem(object):
         ### Args:
             'face_embedding_to_check' (nparray): array containing unknown face embedding 
             'known_face_embeddings' (nparray, optional): array containing known face embeddings. Defaults to None.
-            distances (nparray, optional): list of known face distances if computed with faceDistance function. Defaults to None.
+            distances (nparray, optional): list of known face distances if computed with faceDistance function 
+                                           or returned by the search method of GalleryIndex / IVFIndex. Defaults to None.
             threshold (int, optional): threshold of matching person. Defaults to 9.
 
         ### Returns:
@@ -310,20 +505,72 @@ class FaceRecognitionSystem(object):
         else:
             return list(distances <= threshold)
      
+    def identifyPeople(self, image, detections, threshold=0.5):
+        """
+        ### Description
+            Identifies several faces of an image with the face classifier: 
+            all faces are embedded in one call to the embedding model and 
+            classified with one predict_proba on the stacked embeddings.
+
+        ### Args:
+            image (nparray): RGB image containing the faces.
+            detections (Detections or tuple): faces to identify, as returned by detect(image), 
+                                              or the (face_locations, facial_features) of detectFaces(image).
+                                              Pass only the faces to identify, e.g. the faces without a mask.
+            threshold (float, optional): minimal probability of an identification. Defaults to 0.5.
+
+        ### Returns:
+            list: one dictionary per face with the 'id' (None if unknown), the 'name' ("Unknown" if unknown)
+                  and the 'probability' of the most likely known person.
+        """
+        if isinstance(detections, tuple):
+            face_locations, facial_features = detections
+        else:
+            face_locations, facial_features = detections.boxes, detections.features
+        if len(facial_features) == 0:
+            return []
+
+        embeddings = self.faceEmbeddings(image, 
+                                         face_locations=face_locations, 
+                                         facial_features=facial_features)
+    
+        classifier = self.face_classifier
+        X = np.asarray(embeddings).reshape(len(facial_features), -1)
+        with self.metrics.timer("matching"):
+            if isinstance(classifier, IncrementalFaceClassifier):
+                # columns and ids of the same classifier state
+                classes, predictions = classifier.predictWithClasses(X)
+            else:
+                classes, predictions = classifier.classes_, classifier.predict_proba(X)
+        best = np.argmax(predictions, axis=1)
+        probabilities = predictions[np.arange(len(best)), best]
+        ids = np.asarray(classes)[best]
+
+        people = []
+        for ref_id, probability in zip(ids, probabilities):
+            if probability >= threshold:
+                people.append({"id": int(ref_id), "name": self.db[int(ref_id)], "probability": float(probability)})
+            else:
+                people.append({"id": None, "name": "Unknown", "probability": float(probability)})
+        return people
+
     def identifyPerson(self,
                        face, 
                        box, 
                        facial_features):
-   
-        embedding = self.faceEmbeddings(face, 
-                                        face_locations=box, 
-                                        facial_features=facial_features)[0]
-    
-        prediction = self.face_classifier.predict_proba(embedding.reshape(1,-1))
-        probability = prediction.max()
+        """
+        ### Description
+            Identifies the first face of 'facial_features', see identifyPeople.
+
+        ### Returns:
+            str: "<name> <probability>%" or "Unknown" (also when no face is given).
+        """
+        if len(box) == 0 or len(facial_features) == 0:
+            return "Unknown"
+        person =self.identifyPeople(face, ([box[0]], [facial_features[0]]))[0]
     
-        if probability >= 0.5:
-            name = str(self.db[np.argmax(prediction) + 1]) + " {:.2f}%".format(probability * 100)
+        if person["id"] is not None:
+            name = str(person["name"]) + " {:.2f}%".format(person["probability"] * 100)
         else:
             name = "Unknown"
     
@@ -340,7 +587,10 @@ class FaceRecognitionSystem(object):
             name (str): name of person on image.
         """
 
-        image = cv2.cvtColor(cv2.imread(filename), cv2.COLOR_BGR2RGB)
+        image = cv2.imread(filename)
+        if image is None:
+            raise IOError("Could not read image {}.".format(filename))
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
         face_locations, facial_features = self.detectFaces(image)
 
         if facial_features:
@@ -440,18 +690,47 @@ class FaceRecognitionSystem(object):
             
             self.__addEmbeddingsFromFile(filename, name)        
     
-    def addFacesUsingLoop(self, base):
-        
-        import os
-        for folder in os.listdir(base):
-            if folder[0] == ".":
-                continue
-
-            path = os.path.join(base, folder)
-            for image in os.listdir(path):
-                if image[0] == ".":
-                    continue
-                self.__addEmbeddingsFromFile(os.path.join(path, image), folder)
+    def addFacesUsingLoop(self, base, workers=None, checkpoint=None, commit_every=100):
+        """
+        ### Description
+            Adds faces of all images in a directory laid out as base/<person name>/<image> to the database.
+            An image that fails (e.g. an unreadable file) is reported and skipped.
+
+        ### Args:
+            base (str): path to the directory of images.
+            workers (int, optional): number of worker processes. If greater than 1, images are 
+                                     enrolled in parallel (see enroll.py). Defaults to None.
+            checkpoint (str, optional): checkpoint file used to resume a parallel enrollment. Defaults to None.
+            commit_every (int, optional): number of people written per database commit, 
+                                          number of images when enrolled in parallel. Defaults to 100.
+
+        ### Returns:
+            list: list of (path, error) tuples for images that failed.
+        """
+        if workers is not None and workers > 1:
+            from .enroll import enrollParallel
+            return enrollParallel(self, base, workers=workers, checkpoint=checkpoint, commit_every=commit_every)
+        
+        folders = [folder for folder in sorted(os.listdir(base)) if folder[0] != "."]
+        errors = []
+        # enrolled faces are written to the database once every 'commit_every' people
+        for begin in range(0, len(folders), commit_every):
+            with self.connection.batch():
+                for folder in folders[begin:begin + commit_every]:
+                    path = os.path.join(base, folder)
+                    for image in sorted(os.listdir(path)):
+                        if image[0] == ".":
+                            continue
+                        filename = os.path.join(path, image)
+                        try:
+                            self.__addEmbeddingsFromFile(filename, folder)
+                        except Exception as e:
+                            print("Skipping {}: {}".format(filename, e))
+                            errors.append((filename, "{}: {}".format(type(e).__name__, e)))
+        if errors:
+            print("{} images could not be enrolled.".format(len(errors)))
+        return errors
+
 class Database(object):
     """
     ### Description 
@@ -460,39 +739,158 @@ class Database(object):
         2. Unique id generation for known faces.
         3. Safe dumping of dictionary data into pickle files.
         
+        Alternatively the database can be backed by an append-only, memory-mapped 
+        EmbeddingStore (see store.py) by passing 'store'. Existing pickle files given 
+        as 'db_file' and 'embeddings_file' are then migrated into the new store once.
+        
+        Writes made inside "with database.batch():" are deferred and committed once 
+        when the block exits. Pickle files are always written to a temporary file 
+        and renamed, so a crash never leaves a truncated file behind.
+        
         The class is a helper class to the FaceRecognitionSystem class.
     """
         
     def __init__(self, 
                  db_file=None, 
-                 embeddings_file=None):
+                 embeddings_file=None,
+                 store=None,
+                 metrics=None):
         
+        self.metrics = metrics if metrics is not None else NULL_METRICS
         self.db_file = db_file
         self.embeddings_file = embeddings_file
-        try:
-            with open(self.db_file, "rb") as f:
-                self.db = pickle.load(f)
-                
-            with open(self.embeddings_file, "rb") as f2:
-                self.embeddings = pickle.load(f2)  
-        except:
-            print("No db file exists. Creating new one")
-            self.db = {}
-            self.embeddings = {}
-            with open(self.db_file, "wb") as f:
-                pickle.dump(self.db, f)
+        self.store = None
+        
+        self._batch_depth = 0
+        self._listeners = []
+        self._snapshot = None
+        self._dirty_db = False
+        self._dirty_embeddings = False
+        
+        if store is not None:
+            self.__openStore(store)
+        else:
+            try:
+                with open(self.db_file, "rb") as f:
+                    self.db = pickle.load(f)
+                    
+                with open(self.embeddings_file, "rb") as f2:
+                    self.embeddings = pickle.load(f2)  
+            except:
+                print("No db file exists. Creating new one")
+                self.db = {}
+                self.embeddings = {}
+                atomicPickleDump(self.db, self.db_file)
+                atomicPickleDump(self.embeddings, self.embeddings_file)
+        
+        # reverse index name : id for constant time lookups
+        self._ids_by_name = {name: known_id for known_id, name in self.db.items()}
+        
+    def __openStore(self, path):
+        if not os.path.exists(path + ".log") and self.db_file and self.embeddings_file \
+                and os.path.exists(self.db_file) and os.path.exists(self.embeddings_file):
+            print("Migrating pickled database to embedding store...")
+            self.store = EmbeddingStore.fromPickle(self.db_file, self.embeddings_file, path)
+        else:
+            self.store = EmbeddingStore(path)
+        
+        self.db = self.store.names
+        self.embeddings = EmbeddingsView(self.store)
+    
+    @contextmanager
+    def batch(self):
+        """
+        ### Description
+            Context manager that defers all database writes made inside it 
+            and commits them at once when the block exits. 
+            If the block raises, the changes are rolled back instead. Batches can be nested, 
+            only the outermost one commits.
             
-            with open(self.embeddings_file, "wb") as f2:
-                pickle.dump(self.embeddings, f2)
+        ```python
+            with frs.connection.batch():
+                for filename in filenames:
+                    ...
+        ```
+        """
+        if self._batch_depth == 0:
+            self.__begin()
+        self._batch_depth += 1
+        
+        try:
+            yield self
+        except BaseException:
+            self._batch_depth -= 1
+            if self._batch_depth == 0:
+                self.__rollback()
+            raise
+        else:
+            self._batch_depth -= 1
+            if self._batch_depth == 0:
+                self.commit()
+    
+    def __begin(self):
+        if self.store is not None:
+            self.store.begin()
+        else:
+            self._snapshot = (dict(self.db), 
+                              {ref_id: list(embed_list) for ref_id, embed_list in self.embeddings.items()})
+    
+    def __rollback(self):
+        if self.store is not None:
+            self.store.rollback()
+        else:
+            # restore in place, FaceRecognitionSystem keeps references to these dictionaries
+            db, embeddings = self._snapshot
+            self.db.clear()
+            self.db.update(db)
+            self.embeddings.clear()
+            self.embeddings.update(embeddings)
+        
+        self._snapshot = None
+        self._dirty_db = self._dirty_embeddings = False
+        self._ids_by_name = {name: known_id for known_id, name in self.db.items()}
+    
+    def commit(self):
+        """
+        ### Description
+            Writes all pending changes to disk.
+        """
+        with self.metrics.timer("database_write"):
+            if self.store is not None:
+                self.store.commit()
+                self.store.flush()
+            else:
+                # names first: an id without embeddings is harmless, embeddings without a name are not
+                if self._dirty_db:
+                    atomicPickleDump(self.db, self.db_file)
+                if self._dirty_embeddings:
+                    atomicPickleDump(self.embeddings, self.embeddings_file)
+        self.metrics.increment("database_commits")
+        
+        changed = self._dirty_embeddings
+        if changed:
+            print("Embeddings added to database.")
+        self._snapshot = None
+        self._dirty_db = self._dirty_embeddings = False
+        if changed:
+            for listener in self._listeners:
+                listener()
+    
+    def addListener(self, listener):
+        """
+        ### Description
+            Registers a function called without arguments after new embeddings are committed.
+        """
+        self._listeners.append(listener)
         
     def dumpEmbeddings(self):
         """
         ### Description
             updates database with new embeddings.
         """
-        with open(self.embeddings_file, "wb") as f:
-            pickle.dump(self.embeddings, f)
-        print("Embeddings added to database.")
+        self._dirty_embeddings = True
+        if self._batch_depth == 0:
+            self.commit()
 
     def generateFaceID(self, name):
         """
@@ -507,20 +905,19 @@ class Database(object):
         ### Returns:
             int: unique id belonging to given person's name
         """
-     
-        for known_id, known_name in self.db.items():
-            if name == known_name:
-                ref_id = known_id
-                break
+        ref_id = self._ids_by_name.get(name)
+        if ref_id is not None:
+            return ref_id
+        
+        ref_id = max(self.db.keys()) + 1 if self.db else 1
+        if self.store is not None:
+            self.store.addName(ref_id, name)
         else:
-            if not self.db:
-                ref_id = 1
-            else:
-                ref_id = max(self.db.keys()) + 1
             self.db[ref_id] = name
+        self._ids_by_name[name] = ref_id
         
-        
-        with open(self.db_file, "wb") as f:
-            pickle.dump(self.db, f)
+        self._dirty_db = True
+        if self._batch_depth == 0:
+            self.commit()
 
-        return ref_id
\ No newline at end of file
+        return ref_id
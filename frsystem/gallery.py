@@ -0,0 +1,130 @@
+import numpy as np
+from .helper import pairwiseDistances
+
+
+class GalleryIndex(object):
+    """
+    ### Description
+        In-memory index over the known face embeddings of a database.
+        The gallery is stored as one contiguous float32 matrix with a parallel
+        array of ids and precomputed norms, so that every face found on a
+        frame can be matched against the whole gallery with a single matrix product.
+
+        The index is built once (e.g. from a "Database" object) and reused for every frame.
+    """
+
+    def __init__(self, embeddings_dict=None, distance="euclidian", chunk_size=None):
+        """
+        ### Args
+            'embeddings_dict' (dict, optional): dictionary {id : listOfEmbeddings} of known faces. Defaults to None.
+            distance (str, optional): options: 'cosine', 'euclidian'. Defaults to "euclidian".
+            chunk_size (int, optional): number of gallery rows scored at once. Defaults to None.
+        """
+        if distance not in ("euclidian", "cosine"):
+            raise AttributeError("wrong distance attribute. Choose 'euclidian' or 'cosine'")
+
+        self.distance = distance
+        self.chunk_size = chunk_size
+        self.matrix = np.empty((0, 0), dtype=np.float32)
+        self.ids = np.empty((0,), dtype=np.int64)
+        self.norms = np.empty((0,), dtype=np.float32)
+
+        if embeddings_dict:
+            self.build(embeddings_dict)
+
+    @classmethod
+    def fromDatabase(cls, connection, distance="euclidian", chunk_size=None):
+        """
+        ### Description
+            Builds an index from a "Database" object.
+
+        ### Args
+            connection (Database): connection to the database of known faces.
+            distance (str, optional): options: 'cosine', 'euclidian'. Defaults to "euclidian".
+            chunk_size (int, optional): number of gallery rows scored at once. Defaults to None.
+
+        ### Returns
+            GalleryIndex: index over all embeddings of the database.
+        """
+        index = cls(distance=distance, chunk_size=chunk_size)
+        if getattr(connection, "store", None) is not None:
+            # use the memory-mapped matrix of the store without copying it
+            index.setMatrix(connection.store.matrix, connection.store.ids)
+        else:
+            index.build(connection.embeddings)
+        return index
+
+    def build(self, embeddings_dict):
+        """
+        ### Description
+            (Re)builds the gallery matrix from a dictionary of embeddings.
+
+        ### Args
+            embeddings_dict (dict): dictionary {id : listOfEmbeddings} of known faces.
+        """
+        id_list = []
+        rows = []
+        for ref_id, embed_list in embeddings_dict.items():
+            for e in embed_list:
+                rows.append(np.asarray(e, dtype=np.float32).ravel())
+                id_list.append(ref_id)
+
+        if not rows:
+            self.setMatrix(np.empty((0, 0), dtype=np.float32), np.empty((0,), dtype=np.int64))
+        else:
+            self.setMatrix(np.vstack(rows), id_list)
+
+    def setMatrix(self, matrix, ids):
+        """
+        ### Description
+            Uses an existing (n, dim) embedding matrix as the gallery. 
+            A C-contiguous float32 matrix (e.g. a memory map) is used without copying.
+
+        ### Args
+            matrix (nparray): array of shape (n, dim) with known face embeddings.
+            ids (nparray): array of shape (n,) with ids of known faces.
+        """
+        self.matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.norms = np.sqrt(np.einsum("ij,ij->i", self.matrix, self.matrix))
+
+    def __len__(self):
+        return self.ids.shape[0]
+
+    def search(self, queries, k=1):
+        """
+        ### Description
+            Finds the k closest gallery embeddings for every query embedding.
+
+        ### Args
+            queries (nparray): array of shape (n_queries, dim) or (dim,) with unknown face embeddings.
+            k (int, optional): number of neighbours to return per query. Defaults to 1.
+
+        ### Returns
+            (nparray): ids of shape (n_queries, k) of the closest known faces, best match first.
+            (nparray): distances of shape (n_queries, k) in the same order.
+        """
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        n_queries = queries.shape[0]
+
+        if len(self) == 0 or n_queries == 0:
+            return (np.empty((n_queries, 0), dtype=np.int64),
+                    np.empty((n_queries, 0), dtype=np.float32))
+
+        k = min(k, len(self))
+        dist = pairwiseDistances(queries, 
+                                 self.matrix, 
+                                 distance=self.distance, 
+                                 norms=self.norms, 
+                                 chunk_size=self.chunk_size)
+
+        # partial selection of the k best, then sort only those k
+        if k < dist.shape[1]:
+            top = np.argpartition(dist, k - 1, axis=1)[:, :k]
+        else:
+            top = np.broadcast_to(np.arange(dist.shape[1]), dist.shape).copy()
+        top_dist = np.take_along_axis(dist, top, axis=1)
+        order = np.argsort(top_dist, axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+
+        return self.ids[top], np.take_along_axis(top_dist, order, axis=1)
@@ -1,3 +1,8 @@
+import os
+import pickle
+import tempfile
+import numpy as np
+
 def getEmbeddingsList(embeddings_dict):
     """
     ### Decription: 
@@ -36,4 +41,93 @@ def getEmbeddingsList(embeddings_dict):
             embeddings_list.append(embed_list[0])
             id_list.append(ref_id)
     
-    return embeddings_list, id_list
\ No newline at end of file
+    return embeddings_list, id_list
+
+def pairwiseDistances(queries, 
+                      embeddings, 
+                      distance="euclidian", 
+                      norms=None, 
+                      chunk_size=None):
+    """
+    ### Description
+        Computes the full distance matrix between a batch of query embeddings 
+        and a batch of known embeddings in a single vectorized pass.
+        
+    ### Args
+        queries (nparray): array of shape (n_queries, dim) or (dim,) with unknown face embeddings.
+        embeddings (nparray): array of shape (n_known, dim) with known face embeddings.
+        distance (str, optional): options: 'cosine', 'euclidian'. Defaults to "euclidian".
+        norms (nparray, optional): cached L2 norms of 'embeddings' with shape (n_known,). Defaults to None.
+        chunk_size (int, optional): number of known embeddings processed at once to bound 
+                                    the size of temporaries. Defaults to None (no chunking).
+
+    ### Returns
+        nparray: distances of shape (n_queries, n_known).
+    """
+    queries = np.atleast_2d(_asFloatArray(queries))
+    embeddings = np.atleast_2d(_asFloatArray(embeddings))
+    dtype = np.result_type(queries.dtype, embeddings.dtype)
+    
+    if distance not in ("euclidian", "cosine"):
+        raise AttributeError("wrong distance attribute. Choose 'euclidian' or 'cosine'")
+
+    n_known = embeddings.shape[0] if embeddings.size else 0
+    out = np.empty((queries.shape[0], n_known), dtype=dtype)
+    if n_known == 0 or queries.shape[0] == 0:
+        return out
+
+    if norms is None:
+        norms = np.sqrt(np.einsum("ij,ij->i", embeddings, embeddings))
+    q_norms = np.sqrt(np.einsum("ij,ij->i", queries, queries))
+
+    if chunk_size is None or chunk_size <= 0:
+        chunk_size = n_known
+
+    tiny = np.finfo(dtype).tiny
+    for start in range(0, n_known, chunk_size):
+        stop = min(start + chunk_size, n_known)
+        dist = out[:, start:stop]
+        np.matmul(queries, embeddings[start:stop].T, out=dist)
+        chunk_norms = norms[start:stop]
+        
+        if distance == "euclidian":
+            # ||q - e||^2 = ||q||^2 + ||e||^2 - 2 q.e
+            dist *= -2
+            dist += q_norms[:, np.newaxis] ** 2
+            dist += chunk_norms[np.newaxis, :] ** 2
+            np.maximum(dist, 0, out=dist)
+            np.sqrt(dist, out=dist)
+        else:
+            dist /= np.maximum(q_norms[:, np.newaxis] * chunk_norms[np.newaxis, :], tiny)
+            np.subtract(1, dist, out=dist)
+
+    return out
+
+def _asFloatArray(array):
+    array = np.asarray(array)
+    if not np.issubdtype(array.dtype, np.floating):
+        array = array.astype(np.float32)
+    return array
+
+def atomicPickleDump(obj, path):
+    """
+    ### Description
+        Pickles an object to a temporary file next to 'path' and renames it over 'path', 
+        so readers and crashes only ever see the old or the new complete file.
+
+    ### Args
+        obj (object): object to pickle.
+        path (str): destination file.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=".pkl")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(obj, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
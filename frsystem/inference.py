@@ -0,0 +1,176 @@
+import time
+from collections import deque
+
+import numpy as np
+
+
+def batchBuckets(max_batch):
+    """
+    ### Returns
+        list: powers of two from 1 up to 'max_batch' (rounded up to a power of two).
+    """
+    buckets = [1]
+    while buckets[-1] < max_batch:
+        buckets.append(2 * buckets[-1])
+    return buckets
+
+
+class BucketedPredictor(object):
+    """
+    ### Description
+        Wraps the embedding model returned by embeddingsPredictor so that it always
+        runs on a few fixed input shapes.
+
+        The number of faces changes every frame (1, 2, 3... faces), and every new batch
+        size costs a graph trace or new kernels and buffers in the runtime. Batches are
+        instead padded to the next power of two (1, 2, 4, ... 'max_batch') in preallocated
+        buffers, and larger batches are split in chunks of 'max_batch' faces.
+
+        Keras models are compiled once per bucket into a tf.function with a fixed input
+        signature, which also removes the eager-mode overhead of calling the model.
+        Other callables are called with the padded batch directly; ONNX Runtime models
+        gain nothing from it and are used without this wrapper.
+
+        warmup() runs every bucket once at start-up; stats() reports the latency of
+        the first call of every bucket against its steady-state latency.
+    """
+
+    def __init__(self, model, face_size, max_batch=32, compile=True, history=256):
+        """
+        ### Args
+            model (callable): embedding model, Keras model or any callable taking a batch of faces.
+            face_size (int): face size expected by the model, 160 or 224.
+            max_batch (int, optional): largest bucket, bigger batches are split. Defaults to 32.
+            compile (bool, optional): compile Keras models with tf.function. Defaults to True.
+            history (int, optional): number of latency samples kept per bucket. Defaults to 256.
+        """
+        self.model = model
+        self.face_size = face_size
+        self.buckets = batchBuckets(max_batch)
+        self.max_batch = self.buckets[-1]
+        self._buffers = {}
+        self._functions = {}
+        self.first_call = {}
+        self.latencies = {bucket: deque(maxlen=history) for bucket in self.buckets}
+        self.calls = 0
+        self.padded = 0
+
+        self._compile = compile and self._isKeras(model)
+        if self._compile:
+            import tensorflow as tf
+            self._tf = tf
+            self._function = tf.function(lambda faces: model(faces, training=False))
+
+    @staticmethod
+    def _isKeras(model):
+        return type(model).__module__.split(".")[0] in ("tensorflow", "keras") and hasattr(model, "layers")
+
+    def bucket(self, n):
+        """
+        ### Returns
+            int: smallest bucket holding 'n' faces.
+        """
+        for bucket in self.buckets:
+            if bucket >= n:
+                return bucket
+        return self.max_batch
+
+    def _buffer(self, bucket):
+        buffer = self._buffers.get(bucket)
+        if buffer is None:
+            buffer = np.zeros((bucket, self.face_size, self.face_size, 3), dtype=np.float32)
+            self._buffers[bucket] = buffer
+        return buffer
+
+    def _functionFor(self, bucket):
+        function = self._functions.get(bucket)
+        if function is None:
+            spec = self._tf.TensorSpec((bucket, self.face_size, self.face_size, 3), self._tf.float32)
+            function = self._functions[bucket] = self._function.get_concrete_function(spec)
+        return function
+
+    def _run(self, bucket, batch):
+        start = time.perf_counter()
+        if self._compile:
+            embeddings = self._functionFor(bucket)(self._tf.constant(batch)).numpy()
+        else:
+            embeddings = np.asarray(self.model(batch))
+        elapsed = time.perf_counter() - start
+
+        if bucket in self.first_call:
+            self.latencies[bucket].append(elapsed)
+        else:
+            self.first_call[bucket] = elapsed
+        return embeddings
+
+    def __call__(self, faces):
+        """
+        ### Args
+            faces (nparray): batch of preprocessed faces (n, face_size, face_size, 3).
+
+        ### Returns
+            nparray: embeddings of the n faces.
+        """
+        faces = np.asarray(faces, dtype=np.float32)
+        n = faces.shape[0]
+        if n == 0:
+            return np.empty((0, 0), dtype=np.float32)
+
+        self.calls += 1
+        embeddings = []
+        for begin in range(0, n, self.max_batch):
+            chunk = faces[begin:begin + self.max_batch]
+            bucket = self.bucket(len(chunk))
+            buffer = self._buffer(bucket)
+            buffer[:len(chunk)] = chunk
+            # padding rows keep the values of previous calls, their embeddings are dropped
+            self.padded += bucket - len(chunk)
+            embeddings.append(self._run(bucket, buffer)[:len(chunk)])
+        return embeddings[0] if len(embeddings) == 1 else np.concatenate(embeddings)
+
+    predict = __call__
+
+    def warmup(self, buckets=None, repeat=2):
+        """
+        ### Description
+            Compiles and runs every bucket, so that no frame pays for it.
+            The calls after the first one give the steady-state latency.
+
+        ### Args
+            buckets (list, optional): buckets to warm up. Defaults to all of them.
+            repeat (int, optional): calls per bucket. Defaults to 2.
+
+        ### Returns
+            dict: latency in seconds of the first call of every bucket warmed up.
+        """
+        timings = {}
+        for bucket in (buckets or self.buckets):
+            for _ in range(repeat):
+                self._run(bucket, self._buffer(bucket))
+            timings[bucket] = self.first_call[bucket]
+        return timings
+
+    def stats(self):
+        """
+        ### Returns
+            dict: per bucket, first call and steady-state (p50, p95) latencies in milliseconds
+                  and number of steady-state calls.
+        """
+        stats = {}
+        for bucket in self.buckets:
+            if bucket not in self.first_call:
+                continue
+            latencies = 1000 * np.asarray(self.latencies[bucket])
+            stats[bucket] = {"first_ms": 1000 * self.first_call[bucket],
+                             "p50_ms": float(np.percentile(latencies, 50)) if latencies.size else None,
+                             "p95_ms": float(np.percentile(latencies, 95)) if latencies.size else None,
+                             "calls": int(latencies.size)}
+        return stats
+
+    def summary(self):
+        lines = ["embedding model: {} calls, {} padded faces".format(self.calls, self.padded)]
+        for bucket, s in self.stats().items():
+            lines.append("  batch {:>3}: first {:8.1f} ms, steady {}".format(
+                bucket, s["first_ms"],
+                "p50 {:.1f} ms, p95 {:.1f} ms ({} calls)".format(s["p50_ms"], s["p95_ms"], s["calls"]) if s["calls"] else "n/a"))
+        return "\n".join(lines)
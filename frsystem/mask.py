@@ -0,0 +1,145 @@
+import cv2
+import numpy as np
+from .inference import BucketedPredictor
+
+
+def clampBox(box, shape):
+    """
+    ### Description
+        Converts a face box (x, y, width, height) to corners (startX, startY, endX, endY)
+        that fall within an image of the given shape.
+    """
+    x, y, w, h = [int(v) for v in box]
+    return (max(0, x), max(0, y), min(shape[1] - 1, x + w), min(shape[0] - 1, y + h))
+
+def cropFace(image, box, margin=20):
+    """
+    ### Returns
+        nparray: the face of 'box' (x, y, width, height) with a margin, clamped to the image.
+    """
+    x, y, w, h = [int(v) for v in box]
+    x1, y1 = max(0, x - margin), max(0, y - margin)
+    x2, y2 = min(image.shape[1], x + w + margin), min(image.shape[0], y + h + margin)
+    return image[y1:y2, x1:x2]
+
+
+class MaskClassifier(object):
+    """
+    ### Description
+        Face mask classifier (Xception, 299x299 inputs) running all the faces of one
+        or several frames in a single model call.
+
+        The faces are cropped with a margin clamped to the frame, resized into a
+        preallocated buffer and scaled to [-1, 1] (Xception preprocessing) in place.
+        The Keras model (.h5 or SavedModel directory) runs compiled on power-of-two
+        batch sizes (see inference.BucketedPredictor). Its ONNX conversion
+        (frsapp/keras_to_onnx.py, frsystem/quantize.py) runs on the exact batch, as
+        ONNX Runtime does not retrace and padding would only add work.
+
+    ### Example
+        ```python
+        mask_classifier = MaskClassifier(os.path.join("frsapp", "models", "xception.h5"))
+        scores = mask_classifier.predict(image, face_locations)  # (n_faces, 2): mask, no mask
+        ```
+    """
+
+    def __init__(self, path, engine=None, input_size=299, margin=20, max_batch=32, intra_op_threads=None):
+        """
+        ### Args
+            path (str): path to the Keras model or to the .onnx model.
+            engine (str, optional): 'keras' or 'onnx'. Defaults to None ('onnx' for .onnx files, else 'keras').
+            input_size (int, optional): input size of the model. Defaults to 299.
+            margin (int, optional): pixels added around the face box before cropping. Defaults to 20.
+            max_batch (int, optional): largest batch size of a Keras model call. Defaults to 32.
+            intra_op_threads (int, optional): ONNX Runtime threads inside an operator. Defaults to None.
+        """
+        if engine is None:
+            engine = "onnx" if path.endswith(".onnx") else "keras"
+        if engine == "onnx":
+            from .onnx_backend import OnnxPredictor
+            self.predictor = OnnxPredictor(path, intra_op_threads=intra_op_threads)
+        elif engine == "keras":
+            from .models import importTensorflow
+            importTensorflow()
+            from tensorflow.keras.models import load_model
+            self.predictor = BucketedPredictor(load_model(path), input_size, max_batch=max_batch)
+        else:
+            raise AttributeError("invalid engine. Please use 'keras' or 'onnx'.")
+
+        self.path = path
+        self.engine = engine
+        self.input_size = input_size
+        self.margin = margin
+        self._batch = np.empty((0, input_size, input_size, 3), dtype=np.float32)
+        self._resized = np.empty((input_size, input_size, 3), dtype=np.uint8)
+
+    def _reserve(self, n):
+        if self._batch.shape[0] < n:
+            size = max(n, 2 * self._batch.shape[0])
+            self._batch = np.empty((size, self.input_size, self.input_size, 3), dtype=np.float32)
+        return self._batch[:n]
+
+    def preprocess(self, images, boxes_list):
+        """
+        ### Returns
+            nparray: crops of every box of every image, resized and scaled to [-1, 1].
+        """
+        batch = self._reserve(sum(len(boxes) for boxes in boxes_list))
+        i = 0
+        size = (self.input_size, self.input_size)
+        for image, boxes in zip(images, boxes_list):
+            for box in boxes:
+                face = cropFace(image, box, self.margin)
+                if face.size == 0:
+                    # box outside of the image
+                    batch[i] = 0.0
+                else:
+                    cv2.resize(face, size, dst=self._resized)
+                    batch[i] = self._resized
+                i += 1
+        # Xception preprocessing, x / 127.5 - 1
+        batch *= 1.0 / 127.5
+        batch -= 1.0
+        return batch
+
+    def predictBatch(self, images, boxes_list):
+        """
+        ### Description
+            Classifies the faces of several images in one model call.
+
+        ### Args
+            images (list): RGB images.
+            boxes_list (list): face boxes (x, y, width, height) of every image.
+
+        ### Returns
+            list: one (n_faces, 2) array of (mask, no mask) probabilities per image.
+        """
+        batch = self.preprocess(images, boxes_list)
+        if batch.shape[0] == 0:
+            return [np.empty((0, 2), dtype=np.float32) for _ in images]
+
+        scores = np.asarray(self.predictor(batch))
+        splits = np.cumsum([len(boxes) for boxes in boxes_list])[:-1]
+        return np.split(scores, splits)
+
+    def predict(self, image, boxes):
+        """
+        ### Args
+            image (nparray): RGB image.
+            boxes (list): face boxes (x, y, width, height).
+
+        ### Returns
+            nparray: (n_faces, 2) array of (mask, no mask) probabilities.
+        """
+        return self.predictBatch([image], [boxes])[0]
+
+    def warmup(self):
+        """
+        ### Description
+            Runs the model once per batch size (Keras) or once (ONNX), so that no frame pays for it.
+        """
+        if isinstance(self.predictor, BucketedPredictor):
+            return self.predictor.warmup()
+        batch = self._reserve(1)
+        batch[:] = 0.0
+        return self.predictor(batch)
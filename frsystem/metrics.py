@@ -0,0 +1,323 @@
+import time
+import threading
+from collections import deque
+
+import numpy as np
+
+# latency buckets in seconds
+TIME_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+# buckets of counts, e.g. faces per frame
+COUNT_BUCKETS = (0, 1, 2, 4, 8, 16, 32, 64)
+
+
+class _NullTimer(object):
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class NullMetrics(object):
+    """
+    ### Description
+        Default metrics of FaceRecognitionSystem: every call does nothing,
+        so instrumented code costs a method call when metrics are off.
+    """
+    enabled = False
+    _timer = _NullTimer()
+
+    def timer(self, name):
+        return self._timer
+
+    def observe(self, name, value, buckets=None):
+        pass
+
+    def increment(self, name, value=1):
+        pass
+
+    def gauge(self, name, value):
+        pass
+
+    def total(self, name, value):
+        pass
+
+    def register(self, collector):
+        pass
+
+NULL_METRICS = NullMetrics()
+
+
+class _Timer(object):
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.name + "_seconds", time.perf_counter() - self.start)
+        return False
+
+
+class Histogram(object):
+    """
+    ### Description
+        Prometheus-style histogram (cumulative bucket counts, sum and count)
+        that also keeps the latest samples to compute percentiles.
+    """
+
+    def __init__(self, buckets, history=1024):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.samples = deque(maxlen=history)
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        self.samples.append(value)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+    def percentile(self, q):
+        if not self.samples:
+            return None
+        return float(np.percentile(self.samples, q))
+
+
+class Metrics(object):
+    """
+    ### Description
+        Timers, counters, gauges and histograms collected in memory and exported
+        by sinks (PrometheusExporter, LogSummary, or any object with start() and stop()).
+
+        Collectors registered with register(collector) are called before every export
+        to refresh gauges that are cheaper to read than to track, e.g. cache hit rates
+        or queue depths.
+
+    ### Example
+        ```python
+        metrics = Metrics()
+        metrics.addSink(PrometheusExporter(metrics, port=9100))
+        metrics.addSink(LogSummary(metrics, interval=60))
+        frs = FaceRecognitionSystem(..., metrics=metrics)
+        ```
+    """
+    enabled = True
+
+    def __init__(self, prefix="frs", history=1024):
+        """
+        ### Args
+            prefix (str, optional): prefix of the exported metric names. Defaults to "frs".
+            history (int, optional): number of samples kept per histogram for percentiles. Defaults to 1024.
+        """
+        self.prefix = prefix
+        self.history = history
+        self.histograms = {}
+        self.counters = {}
+        self.gauges = {}
+        self.collectors = []
+        self.sinks = []
+        self.started = time.time()
+        self._lock = threading.Lock()
+
+    def timer(self, name):
+        """
+        ### Returns
+            context manager observing its duration in the '<name>_seconds' histogram.
+        """
+        return _Timer(self, name)
+
+    def observe(self, name, value, buckets=None):
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                if buckets is None:
+                    buckets = TIME_BUCKETS if name.endswith("_seconds") else COUNT_BUCKETS
+                histogram = self.histograms[name] = Histogram(buckets, self.history)
+            histogram.observe(value)
+
+    def increment(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def gauge(self, name, value):
+        with self._lock:
+            self.gauges[name] = value
+
+    def total(self, name, value):
+        """
+        ### Description
+            Sets the counter 'name' to a running total counted elsewhere, e.g. the frames
+            read by a capture thread, from a collector. Exported as a counter, like increment().
+        """
+        with self._lock:
+            self.counters[name] = value
+
+    def register(self, collector):
+        """
+        ### Args
+            collector (callable): collector(metrics), called before every export.
+        """
+        self.collectors.append(collector)
+
+    def collect(self):
+        for collector in self.collectors:
+            collector(self)
+
+    def addSink(self, sink, start=True):
+        self.sinks.append(sink)
+        if start:
+            sink.start()
+        return sink
+
+    def close(self):
+        for sink in self.sinks:
+            sink.stop()
+
+    def snapshot(self):
+        """
+        ### Returns
+            dict: counters, gauges and, for every histogram, count, sum, mean and p50/p95/p99.
+        """
+        self.collect()
+        with self._lock:
+            histograms = {name: {"count": h.count,
+                                 "sum": h.sum,
+                                 "mean": h.sum / h.count if h.count else None,
+                                 "p50": h.percentile(50),
+                                 "p95": h.percentile(95),
+                                 "p99": h.percentile(99)} for name, h in self.histograms.items()}
+            return {"uptime": time.time() - self.started,
+                    "counters": dict(self.counters),
+                    "gauges": dict(self.gauges),
+                    "histograms": histograms}
+
+    def prometheus(self):
+        """
+        ### Returns
+            str: all metrics in the Prometheus text exposition format.
+        """
+        self.collect()
+        lines = []
+        with self._lock:
+            for name, value in sorted(self.counters.items()):
+                metric = "{}_{}_total".format(self.prefix, name)
+                lines += ["# TYPE {} counter".format(metric), "{} {}".format(metric, value)]
+            for name, value in sorted(self.gauges.items()):
+                metric = "{}_{}".format(self.prefix, name)
+                lines += ["# TYPE {} gauge".format(metric), "{} {}".format(metric, value)]
+            for name, histogram in sorted(self.histograms.items()):
+                metric = "{}_{}".format(self.prefix, name)
+                lines.append("# TYPE {} histogram".format(metric))
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    lines.append('{}_bucket{{le="{}"}} {}'.format(metric, bound, count))
+                lines.append('{}_bucket{{le="+Inf"}} {}'.format(metric, histogram.count))
+                lines.append("{}_sum {}".format(metric, histogram.sum))
+                lines.append("{}_count {}".format(metric, histogram.count))
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        """
+        ### Returns
+            str: human readable summary of the metrics.
+        """
+        snapshot = self.snapshot()
+        lines = ["metrics after {:.0f}s:".format(snapshot["uptime"])]
+        for name, h in sorted(snapshot["histograms"].items()):
+            if name.endswith("_seconds"):
+                lines.append("  {}: {} calls, p50 {:.1f} ms, p95 {:.1f} ms, p99 {:.1f} ms".format(
+                    name[:-len("_seconds")], h["count"], 1000 * h["p50"], 1000 * h["p95"], 1000 * h["p99"]))
+            else:
+                lines.append("  {}: {} samples, mean {:.2f}, p95 {:.2f}".format(name, h["count"], h["mean"], h["p95"]))
+        for name, value in sorted(snapshot["counters"].items()):
+            lines.append("  {}: {}".format(name, value))
+        for name, value in sorted(snapshot["gauges"].items()):
+            lines.append("  {}: {:.3g}".format(name, value))
+        return "\n".join(lines)
+
+
+class PrometheusExporter(object):
+    """
+    ### Description
+        Serves the metrics in the Prometheus text format on http://host:port/metrics
+        from a background HTTP server.
+    """
+
+    def __init__(self, metrics, port=9100, host="127.0.0.1"):
+        self.metrics = metrics
+        self.port = port
+        self.host = host
+        self.server = None
+
+    def start(self):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        metrics = self.metrics
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = metrics.prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self.port = self.server.server_address[1]
+        threading.Thread(target=self.server.serve_forever, name="metrics-http", daemon=True).start()
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+
+class LogSummary(object):
+    """
+    ### Description
+        Writes a summary of the metrics every 'interval' seconds from a background thread.
+    """
+
+    def __init__(self, metrics, interval=60, write=print):
+        """
+        ### Args
+            metrics (Metrics): metrics to summarize.
+            interval (float, optional): seconds between summaries. Defaults to 60.
+            write (callable, optional): function receiving the summary text, e.g. logging.info. Defaults to print.
+        """
+        self.metrics = metrics
+        self.interval = interval
+        self.write = write
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self.write(self.metrics.summary())
+
+    def start(self):
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="metrics-log", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
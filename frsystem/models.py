@@ -1,52 +1,138 @@
+import os
 import pickle
 import numpy as np
-from .vggface import VGGFace
-from .helper import getEmbeddingsList
-from tensorflow.keras import Model
-from tensorflow.keras.layers import Flatten, Input
-from tensorflow.keras.models import Sequential
-from tensorflow.keras.models import load_model
-from sklearn.linear_model import LogisticRegression
+from .helper import getEmbeddingsList, atomicPickleDump
 
+# face size expected by each embedding model
+FACE_SIZES = {"facenet": 160, "vggface": 224}
 
 
-def embeddingsPredictor(which=None, path=None): 
+def importTensorflow():
+    """
+    ### Description
+        Imports TensorFlow quietly. TensorFlow and Keras are only imported
+        when a Keras model is actually loaded, so that importing frsystem stays fast.
+    """
+    os.environ.setdefault('TF_CPP_MIN_LOG_LEVEL', '3')
+    import tensorflow as tf
+    tf.get_logger().setLevel("ERROR")
+    return tf
+
+
+def embeddingsPredictor(which=None, 
+                        path=None, 
+                        engine="keras", 
+                        intra_op_threads=None, 
+                        inter_op_threads=None): 
+    """
+    ### Description 
+        Loads the FaceNet or VGGFace embedding model.
+
+    ### Args
+        which (str): 'facenet' or 'vggface'.
+        path (str): path to the Keras weights, or to the .onnx model when engine is 'onnx'.
+        engine (str, optional): 'keras' or 'onnx' (ONNX Runtime, see onnx_backend.py). Defaults to "keras".
+        intra_op_threads (int, optional): ONNX Runtime threads inside an operator. Defaults to None.
+        inter_op_threads (int, optional): ONNX Runtime threads across operators. Defaults to None.
+
+    ### Returns:
+        model: callable mapping a batch of faces to embeddings
+        int: face size expected by the model
+    """
+    if which not in ("vggface", "facenet"):
+        raise AttributeError("invalid attribute. Please use 'vggface' or 'facenet'.")    
     
-    if which is "vggface":
+    if engine == "onnx":
+        from .onnx_backend import OnnxPredictor
+        model = OnnxPredictor(path, 
+                              intra_op_threads=intra_op_threads, 
+                              inter_op_threads=inter_op_threads)
+        return model, FACE_SIZES[which]
+    elif engine != "keras":
+        raise AttributeError("invalid engine. Please use 'keras' or 'onnx'.")
+    
+    importTensorflow()
+    from tensorflow.keras import Model
+    from tensorflow.keras.models import load_model
+
+    if which == "vggface":
+        from .vggface import VGGFace
         face_size = 224
         model = VGGFace(path)
         model = Model(model.layers[0].input, model.layers[-2].output)
-    elif which is "facenet":
+    else:
         face_size = 160
         model = load_model(path)
-    else:
-        raise AttributeError("invalid attribute. Please use 'vggface' or 'facenet'.")    
     
     return model, face_size
 
-def faceClassifier(embeddings_dict=None, path=None):
+def faceClassifier(embeddings_dict=None, path=None, incremental=False):
         
     """
     ### Description 
-        Loads face classifier if serialized model file exists, 
-        else trains a face classifier and returns it.
+        Loads face classifier if serialized model file exists and was trained 
+        on the current embeddings, else trains a face classifier and returns it.
+
+        The classifier records the version of the embeddings it was trained on 
+        (see classifier.embeddingsVersion), so a classifier saved before new people
+        were enrolled is trained again instead of silently ignoring them. A classifier
+        saved without a version is stamped with the current one when it knows exactly
+        the enrolled people, and trained again otherwise.
+
+    ### Args
+        embeddings_dict (dict, optional): {id : list of embeddings} of the known people. Defaults to None.
+        path (str, optional): path to the serialized classifier. Defaults to None.
+        incremental (bool, optional): use an IncrementalFaceClassifier (see classifier.py), updated in place 
+                                      when embeddings are added, instead of a LogisticRegression. Defaults to False.
 
     ### Returns:
-        clf: sklearn model object
+        clf: sklearn model object or IncrementalFaceClassifier
     """
+    from .classifier import IncrementalFaceClassifier, embeddingsVersion
             
     try:
         with open(path, 'rb') as f:
             clf = pickle.load(f)
     except:
-        if embeddings_dict is not None:  
-            X, y = getEmbeddingsList(embeddings_dict)
-            X = np.array(X)
-            print("Training face classifier...")
-            clf = LogisticRegression().fit(X, y)  
-            with open(path, 'wb') as f:
-                pickle.dump(clf, f)
-        else:
+        clf = None
+
+    if incremental:
+        if isinstance(clf, IncrementalFaceClassifier):
+            clf.path = path
+            if embeddings_dict is not None:
+                # learns the people enrolled since it was saved
+                clf.update(embeddings_dict)
+            return clf
+        if embeddings_dict is None:
             raise AttributeError("Invalid embeddings_dict argument.")
+        print("Training incremental face classifier...")
+        clf = IncrementalFaceClassifier(path=path).fit(embeddings_dict)
+        clf.save()
+        return clf
+
+    if clf is not None and not isinstance(clf, IncrementalFaceClassifier):
+        if embeddings_dict is None:
+            return clf
+        version = embeddingsVersion(embeddings_dict)
+        if not hasattr(clf, "embeddings_version_") and \
+                set(np.asarray(clf.classes_).tolist()) == set(int(ref_id) for ref_id in embeddings_dict):
+            # saved before classifiers were versioned, but knows every enrolled person:
+            # stamped with the current version instead of retrained
+            clf.embeddings_version_ = version
+            atomicPickleDump(clf, path)
+        if getattr(clf, "embeddings_version_", None) == version:
+            return clf
+        print("Face classifier is out of date.")
+
+    if embeddings_dict is not None:  
+        X, y = getEmbeddingsList(embeddings_dict)
+        X = np.array(X)
+        from sklearn.linear_model import LogisticRegression
+        print("Training face classifier...")
+        clf = LogisticRegression().fit(X, y)  
+        clf.embeddings_version_ = embeddingsVersion(embeddings_dict)
+        atomicPickleDump(clf, path)
+    else:
+        raise AttributeError("Invalid embeddings_dict argument.")
     
     return clf
\ No newline at end of file
@@ -0,0 +1,108 @@
+import os
+import numpy as np
+
+from .models import FACE_SIZES, embeddingsPredictor
+
+
+class OnnxPredictor(object):
+    """
+    ### Description
+        ONNX Runtime version of the FaceNet / VGGFace embedding model.
+        Called like the Keras model: takes a batch of preprocessed faces
+        and returns a numpy array of embeddings.
+    """
+
+    def __init__(self, path, intra_op_threads=None, inter_op_threads=None):
+        """
+        ### Args
+            path (str): path to the .onnx model.
+            intra_op_threads (int, optional): threads used inside an operator. Defaults to None (ONNX Runtime default).
+            inter_op_threads (int, optional): threads used across operators. Defaults to None (ONNX Runtime default).
+        """
+        os.environ['KMP_DUPLICATE_LIB_OK'] = 'True'
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if intra_op_threads:
+            options.intra_op_num_threads = intra_op_threads
+        if inter_op_threads:
+            options.inter_op_num_threads = inter_op_threads
+            options.execution_mode = ort.ExecutionMode.ORT_PARALLEL
+
+        self.path = path
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def __call__(self, faces):
+        faces = np.ascontiguousarray(faces, dtype=np.float32)
+        return self.session.run(None, {self.input_name: faces})[0]
+
+    predict = __call__
+
+
+def convertEmbeddingsModel(which, weights, output):
+    """
+    ### Description
+        Converts the Keras FaceNet (h5) or VGGFace model to ONNX.
+
+    ### Args
+        which (str): 'facenet' or 'vggface'.
+        weights (str): path to the weights of the Keras model.
+        output (str): path of the .onnx file to write.
+    """
+    os.environ['TF_KERAS'] = '1'
+    import onnx
+    import keras2onnx
+
+    model, _ = embeddingsPredictor(which=which, path=weights)
+    onnx_model = keras2onnx.convert_keras(model, model.name)
+    onnx.save_model(onnx_model, output)
+    print("Saved {} ONNX model to {}".format(which, output))
+
+def checkParity(which, weights, onnx_path, n_faces=8, atol=1e-3, seed=0):
+    """
+    ### Description
+        Compares the embeddings of the Keras model and its ONNX conversion
+        on random preprocessed faces.
+
+    ### Args
+        which (str): 'facenet' or 'vggface'.
+        weights (str): path to the weights of the Keras model.
+        onnx_path (str): path to the .onnx model.
+        n_faces (int, optional): number of random faces compared. Defaults to 8.
+        atol (float, optional): maximal absolute difference accepted. Defaults to 1e-3.
+        seed (int, optional): random seed. Defaults to 0.
+
+    ### Returns
+        dict: maximal absolute difference, minimal cosine similarity and whether the check passed.
+    """
+    keras_model, face_size = embeddingsPredictor(which=which, path=weights)
+    onnx_model = OnnxPredictor(onnx_path)
+
+    rng = np.random.RandomState(seed)
+    faces = rng.randn(n_faces, face_size, face_size, 3).astype(np.float32)
+    expected = np.array(keras_model(faces))
+    actual = onnx_model(faces)
+
+    max_diff = float(np.abs(expected - actual).max())
+    cosine = np.sum(expected * actual, axis=1) / (np.linalg.norm(expected, axis=1) * np.linalg.norm(actual, axis=1))
+    report = {"max_abs_diff": max_diff, "min_cosine": float(cosine.min()), "passed": max_diff <= atol}
+    print("Keras vs ONNX: max abs diff {:.2e}, min cosine {:.6f} -> {}".format(
+        report["max_abs_diff"], report["min_cosine"], "OK" if report["passed"] else "FAILED"))
+    return report
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Convert the FaceNet / VGGFace embedding model to ONNX.")
+    parser.add_argument("which", choices=sorted(FACE_SIZES))
+    parser.add_argument("weights", help="path to the Keras weights")
+    parser.add_argument("output", help="path of the .onnx file to write")
+    parser.add_argument("--check", action="store_true", help="compare ONNX and Keras outputs after conversion")
+    parser.add_argument("--atol", type=float, default=1e-3)
+    args = parser.parse_args()
+
+    convertEmbeddingsModel(args.which, args.weights, args.output)
+    if args.check and not checkParity(args.which, args.weights, args.output, atol=args.atol)["passed"]:
+        raise SystemExit(1)
@@ -0,0 +1,314 @@
+import os
+import time
+import threading
+from collections import deque
+
+import cv2
+import numpy as np
+from .metrics import NULL_METRICS
+
+
+class LatestQueue(object):
+    """
+    ### Description
+        Bounded queue with a latest-frame-wins policy: putting into a full queue
+        drops the oldest item instead of blocking the producer.
+    """
+
+    def __init__(self, maxsize=1):
+        self.maxsize = maxsize
+        self.dropped = 0
+        self._items = deque()
+        self._condition = threading.Condition()
+        self._closed = False
+
+    def put(self, item):
+        with self._condition:
+            if len(self._items) >= self.maxsize:
+                self._items.popleft()
+                self.dropped += 1
+            self._items.append(item)
+            self._condition.notify()
+
+    def get(self, timeout=None):
+        """
+        ### Returns
+            the oldest item, or None if the queue was closed or the timeout expired.
+        """
+        with self._condition:
+            if not self._items and not self._closed:
+                self._condition.wait(timeout)
+            if not self._items:
+                return None
+            return self._items.popleft()
+
+    def __len__(self):
+        return len(self._items)
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+
+class Frame(object):
+    """
+    ### Description
+        A captured frame travelling through the pipeline.
+
+        - index: capture number of the frame.
+        - image: BGR image as read from the source.
+        - captured: time.perf_counter() when the frame was read.
+        - timestamp: capture time of the frame in seconds, the position of the frame
+          in a video file, else 'captured'. Its differences give the frame period of the
+          source, e.g. for FaceRecognitionSystem.detect(image, timestamp).
+    """
+
+    def __init__(self, index, image, captured, timestamp=None):
+        self.index = index
+        self.image = image
+        self.captured = captured
+        self.timestamp = timestamp if timestamp is not None else captured
+
+
+class Pipeline(object):
+    """
+    ### Description
+        Runs a video application as three stages connected by bounded queues:
+
+        - capture (thread): reads the source as fast as it delivers frames,
+          so the camera buffer never backs up.
+        - inference (thread): 'process(image)' on the latest captured frame, or
+          'process(image, timestamp)' with 'timestamps=True' (see Frame);
+          frames arriving while it is busy are dropped.
+        - render (main thread, as required by cv2.imshow): 'render(image, results)'
+          then display.
+
+        By default the render stage draws the latest available results on the newest
+        captured frame, so display latency stays bounded by the capture and drawing
+        time even when inference runs at a few frames per second. With
+        'draw_on_latest=False' only processed frames are displayed, each with its
+        own results.
+
+        End-to-end latency (capture to display) and inference latency (capture to
+        results) are measured for every frame, see stats().
+    """
+
+    def __init__(self,
+                 process,
+                 render,
+                 source=0,
+                 window_name="frsystem",
+                 draw_on_latest=True,
+                 queue_size=1,
+                 exit_key=27,
+                 history=1000,
+                 timestamps=False,
+                 metrics=None):
+        """
+        ### Args
+            process (callable): process(image) -> results, run on the inference thread.
+            render (callable): render(image, results) -> image to display, run on the main thread.
+                               results is None until the first frame is processed.
+            source (int, str or cv2.VideoCapture, optional): camera index, video path or capture. Defaults to 0.
+            window_name (str, optional): title of the window. Defaults to "frsystem".
+            draw_on_latest (bool, optional): draw the latest results on the newest frame. Defaults to True.
+            queue_size (int, optional): number of frames each queue holds before dropping. Defaults to 1.
+            exit_key (int, optional): key code stopping the pipeline. Defaults to 27 (ESC).
+            history (int, optional): number of latency samples kept for stats. Defaults to 1000.
+            timestamps (bool, optional): also pass the capture time of the frame to 'process', 
+                                         e.g. for adaptive detection. Defaults to False.
+            metrics (Metrics, optional): also exports latencies, queue depths and drops (see metrics.py). Defaults to None.
+        """
+        self.process = process
+        self.render = render
+        self.source = source
+        self.window_name = window_name
+        self.draw_on_latest = draw_on_latest
+        self.exit_key = exit_key
+        self.timestamps = timestamps
+        self._video_file = False
+
+        self.inference_queue = LatestQueue(queue_size)
+        self.display_queue = LatestQueue(queue_size)
+        self.stopped = threading.Event()
+        self.error = None
+
+        self._results = None
+        self._results_lock = threading.Lock()
+        self.captured = 0
+        self.processed = 0
+        self.displayed = 0
+        self.display_latencies = deque(maxlen=history)
+        self.inference_latencies = deque(maxlen=history)
+        self.result_ages = deque(maxlen=history)
+
+        self.metrics = metrics if metrics is not None else NULL_METRICS
+        self.metrics.register(self._collectMetrics)
+
+    def _open(self):
+        self._video_file = isinstance(self.source, str) and os.path.isfile(self.source)
+        if isinstance(self.source, cv2.VideoCapture):
+            return self.source
+        capture = cv2.VideoCapture(self.source)
+        # keep the driver from queueing stale frames
+        capture.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        return capture
+
+    def _capture(self, capture):
+        try:
+            while not self.stopped.is_set() and capture.isOpened():
+                ok, image = capture.read()
+                if not ok or image is None:
+                    break
+                captured = time.perf_counter()
+                # frames of a video file are read faster than their rate: use their position
+                timestamp = capture.get(cv2.CAP_PROP_POS_MSEC) / 1000.0 if self._video_file else None
+                frame = Frame(self.captured, image, captured, timestamp)
+                self.captured += 1
+                self.inference_queue.put(frame)
+                if self.draw_on_latest:
+                    self.display_queue.put(frame)
+        finally:
+            self.stop()
+            capture.release()
+
+    def _infer(self):
+        try:
+            while not self.stopped.is_set():
+                frame = self.inference_queue.get(timeout=0.1)
+                if frame is None:
+                    continue
+                results = self.process(frame.image, frame.timestamp) if self.timestamps else self.process(frame.image)
+                latency = time.perf_counter() - frame.captured
+                self.inference_latencies.append(latency)
+                self.metrics.observe("inference_latency_seconds", latency)
+                self.processed += 1
+                with self._results_lock:
+                    self._results = (frame, results)
+                if not self.draw_on_latest:
+                    self.display_queue.put(frame)
+        except Exception as e:
+            self.error = e
+            self.stop()
+
+    def _collectMetrics(self, metrics):
+        metrics.gauge("inference_queue_depth", len(self.inference_queue))
+        metrics.gauge("display_queue_depth", len(self.display_queue))
+        metrics.total("frames_captured", self.captured)
+        metrics.total("frames_dropped", self.inference_queue.dropped + self.display_queue.dropped)
+
+    def latestResults(self):
+        """
+        ### Returns
+            tuple: (frame, results) of the last processed frame, or None.
+        """
+        with self._results_lock:
+            return self._results
+
+    def stop(self):
+        self.stopped.set()
+        self.inference_queue.close()
+        self.display_queue.close()
+
+    def run(self):
+        """
+        ### Description
+            Starts the capture and inference threads and renders on the calling thread
+            until the source ends or the exit key is pressed.
+
+        ### Returns
+            dict: stats of the run.
+        """
+        capture = self._open()
+        threads = [threading.Thread(target=self._capture, args=(capture,), name="capture", daemon=True),
+                   threading.Thread(target=self._infer, name="inference", daemon=True)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+
+        try:
+            while not self.stopped.is_set():
+                frame = self.display_queue.get(timeout=0.1)
+                if frame is None:
+                    continue
+
+                latest = self.latestResults()
+                if self.draw_on_latest:
+                    results = latest[1] if latest is not None else None
+                else:
+                    results = latest[1] if latest is not None and latest[0] is frame else None
+
+                # the newest frame may still be read by the inference thread: draw on a copy
+                image = self.render(frame.image.copy() if self.draw_on_latest else frame.image, results)
+                cv2.imshow(self.window_name, image if image is not None else frame.image)
+
+                now = time.perf_counter()
+                self.display_latencies.append(now - frame.captured)
+                self.metrics.observe("display_latency_seconds", now - frame.captured)
+                if latest is not None:
+                    self.result_ages.append(now - latest[0].captured)
+                self.displayed += 1
+
+                if cv2.waitKey(1) & 0xFF == self.exit_key:
+                    break
+        finally:
+            self.stop()
+            for thread in threads:
+                thread.join()
+            cv2.destroyAllWindows()
+
+        if self.error is not None:
+            raise self.error
+
+        stats = self.stats(time.perf_counter() - start)
+        print(self.summary(stats))
+        return stats
+
+    def stats(self, elapsed=None):
+        """
+        ### Args
+            elapsed (float, optional): duration of the run in seconds, to compute rates. Defaults to None.
+
+        ### Returns
+            dict: frame counts, dropped frames, rates and latency percentiles (milliseconds).
+        """
+        def percentiles(samples):
+            if not samples:
+                return {"p50": None, "p95": None, "max": None}
+            samples = 1000 * np.asarray(samples)
+            return {"p50": float(np.percentile(samples, 50)),
+                    "p95": float(np.percentile(samples, 95)),
+                    "max": float(samples.max())}
+
+        stats = {"captured": self.captured,
+                 "processed": self.processed,
+                 "displayed": self.displayed,
+                 "dropped_inference": self.inference_queue.dropped,
+                 "dropped_display": self.display_queue.dropped,
+                 "display_latency_ms": percentiles(self.display_latencies),
+                 "inference_latency_ms": percentiles(self.inference_latencies),
+                 "result_age_ms": percentiles(self.result_ages)}
+        if elapsed:
+            stats["capture_fps"] = self.captured / elapsed
+            stats["inference_fps"] = self.processed / elapsed
+            stats["display_fps"] = self.displayed / elapsed
+        return stats
+
+    @staticmethod
+    def summary(stats):
+        def fmt(latency):
+            if latency["p50"] is None:
+                return "n/a"
+            return "p50 {:.1f} ms, p95 {:.1f} ms".format(latency["p50"], latency["p95"])
+
+        lines = ["frames: {} captured, {} processed, {} displayed ({} + {} dropped)".format(
+                    stats["captured"], stats["processed"], stats["displayed"],
+                    stats["dropped_inference"], stats["dropped_display"]),
+                 "display latency: " + fmt(stats["display_latency_ms"]),
+                 "inference latency: " + fmt(stats["inference_latency_ms"]),
+                 "age of displayed results: " + fmt(stats["result_age_ms"])]
+        if "display_fps" in stats:
+            lines.append("fps: capture {:.1f}, inference {:.1f}, display {:.1f}".format(
+                stats["capture_fps"], stats["inference_fps"], stats["display_fps"]))
+        return "\n".join(lines)
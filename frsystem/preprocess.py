@@ -0,0 +1,173 @@
+import cv2
+import numpy as np
+
+INTERPOLATIONS = {
+    "nearest": cv2.INTER_NEAREST,
+    "linear": cv2.INTER_LINEAR,
+    "cubic": cv2.INTER_CUBIC,
+    "area": cv2.INTER_AREA,
+}
+
+# mean pixel of the VGG 'caffe' preprocessing in BGR order
+VGG_MEAN_BGR = np.array([103.939, 116.779, 123.68], dtype=np.float32)
+
+
+def alignmentMatrices(image_shape, facial_features, face_size):
+    """
+    ### Description
+        Computes at once the affine matrices that align every face of an image
+        so that the eyes are horizontal and crop it to face_size x face_size.
+        Same geometry as FaceRecognitionSystem.alignCropFace.
+
+    ### Args
+        image_shape (tuple): shape of the image (h, w, ...).
+        facial_features (list): list of facial features dictionaries with 'left_eye' and 'right_eye'.
+        face_size (int): face size in terms of pixels e.g. 160
+
+    ### Returns
+        nparray: array of shape (n_faces, 2, 3) of affine matrices.
+    """
+    n = len(facial_features)
+    if n == 0:
+        return np.empty((0, 2, 3))
+
+    left_eye = np.array([f["left_eye"] for f in facial_features]).astype("int")
+    right_eye = np.array([f["right_eye"] for f in facial_features]).astype("int")
+
+    # find angle of the line passing through eyes centers
+    dY = right_eye[:, 1] - left_eye[:, 1]
+    dX = right_eye[:, 0] - left_eye[:, 0]
+    angle = np.arctan2(dY, dX)
+
+    # to get the face at the center of the image
+    desired_left_eye = (0.35, 0.35)
+    desired_right_eye_x = 1.0 - desired_left_eye[0]
+
+    dist = np.sqrt((dX ** 2) + (dY ** 2))
+    desired_dist = (desired_right_eye_x - desired_left_eye[0]) * face_size
+
+    height, width = image_shape[0], image_shape[1]
+    if width >= 1000 or height >= 1000:
+        margin = 0.1
+    elif (width > 300 or height > 300) and (width < 1000 or height < 1000):
+        margin = 0.2
+    else:
+        margin = 0.35
+    scale = desired_dist / np.maximum(dist, 1e-6) + margin
+
+    # center between the two eyes in the input image
+    center_x = (left_eye[:, 0] + right_eye[:, 0]) // 2
+    center_y = (left_eye[:, 1] + right_eye[:, 1]) // 2
+
+    # rotation matrix around the eyes center (as cv2.getRotationMatrix2D)
+    alpha = scale * np.cos(angle)
+    beta = scale * np.sin(angle)
+    M = np.empty((n, 2, 3))
+    M[:, 0, 0] = alpha
+    M[:, 0, 1] = beta
+    M[:, 0, 2] = (1 - alpha) * center_x - beta * center_y
+    M[:, 1, 0] = -beta
+    M[:, 1, 1] = alpha
+    M[:, 1, 2] = beta * center_x + (1 - alpha) * center_y
+
+    # move the eyes center to its desired position in the output
+    M[:, 0, 2] += face_size * 0.5 - center_x
+    M[:, 1, 2] += face_size * desired_left_eye[1] - center_y
+
+    return M
+
+
+class FacePreprocessor(object):
+    """
+    ### Description
+        Aligns, crops and normalises all faces of a frame into one float32 batch
+        ready for the embedding model.
+
+        The batch tensor and the scratch buffers are allocated once and reused:
+        every call overwrites the batch returned by the previous call.
+        The frame is converted to grayscale once, each face is warped straight
+        into a uint8 scratch buffer, and normalisation writes the result
+        into the batch in float32.
+    """
+
+    def __init__(self, face_size, interpolation="cubic", max_faces=8):
+        """
+        ### Args
+            face_size (int): 160 (FaceNet) or 224 (VGGFace).
+            interpolation (str or int, optional): 'nearest', 'linear', 'cubic', 'area' or an OpenCV flag. Defaults to "cubic".
+            max_faces (int, optional): initial capacity of the batch, grown when needed. Defaults to 8.
+
+        ### Raises:
+            ValueError: if a face size is not 160 or 224
+        """
+        if face_size not in (160, 224):
+            raise ValueError("Inappropriate value for face_size, please choose 160 or 224.")
+
+        self.face_size = face_size
+        self.interpolation = INTERPOLATIONS.get(interpolation, interpolation)
+        self._batch = np.empty((max_faces, face_size, face_size, 3), dtype=np.float32)
+        self._crop = np.empty((face_size, face_size), dtype=np.uint8)
+        self._face = np.empty((face_size, face_size), dtype=np.float32)
+
+    def _reserve(self, n):
+        if n > self._batch.shape[0]:
+            self._batch = np.empty((max(n, 2 * self._batch.shape[0]),) + self._batch.shape[1:], dtype=np.float32)
+
+    def _fill(self, image, facial_features, offset):
+        gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+        matrices = alignmentMatrices(image.shape, facial_features, self.face_size)
+        size = (self.face_size, self.face_size)
+        face = self._face
+
+        for i, M in enumerate(matrices, offset):
+            cv2.warpAffine(gray, M, size, dst=self._crop, flags=self.interpolation)
+            face[...] = self._crop
+
+            if self.face_size == 160:
+                # per-face standardisation
+                mean, std = face.mean(), face.std()
+                face -= mean
+                face /= std if std > 0 else 1.0
+                self._batch[i] = face[..., np.newaxis]
+            else:
+                # VGG 'caffe' preprocessing: BGR channel order, mean pixel subtracted
+                np.subtract(face[..., np.newaxis], VGG_MEAN_BGR, out=self._batch[i])
+
+    def __call__(self, image, facial_features):
+        """
+        ### Args
+            image (nparray): RGB image containing faces.
+            facial_features (list): list of facial features dictionaries, one per face.
+
+        ### Returns
+            nparray: float32 view of shape (n_faces, face_size, face_size, 3),
+                     valid until the next call.
+        """
+        n = len(facial_features)
+        self._reserve(n)
+        if n > 0:
+            self._fill(image, facial_features, 0)
+        return self._batch[:n]
+
+    def batch(self, images, facial_features_list):
+        """
+        ### Description
+            Same as calling the preprocessor on several images, but all the faces
+            end up in one batch, e.g. to embed the faces of several cameras at once.
+
+        ### Args
+            images (list): list of RGB images.
+            facial_features_list (list): list of facial features of every image.
+
+        ### Returns
+            nparray: float32 view of shape (total_faces, face_size, face_size, 3), faces
+                     ordered by image, valid until the next call.
+        """
+        n = sum(len(facial_features) for facial_features in facial_features_list)
+        self._reserve(n)
+        offset = 0
+        for image, facial_features in zip(images, facial_features_list):
+            if len(facial_features) > 0:
+                self._fill(image, facial_features, offset)
+                offset += len(facial_features)
+        return self._batch[:n]
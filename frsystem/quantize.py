@@ -0,0 +1,359 @@
+"""
+Quantized ONNX variants of the embedding models (FaceNet, VGGFace) and of the
+Xception mask classifier, with an accuracy gate against the FP32 model.
+
+Models are first converted to ONNX (python -m frsystem.onnx_backend for the
+embedding models, frsapp/keras_to_onnx.py for the mask classifier), then:
+
+    python -m frsystem.quantize facenet util/facenet.onnx util/facenet_int8.onnx --mode static --images images
+    python -m frsystem.quantize mask frsapp/models/mask-xception-onnx.onnx frsapp/models/mask-int8.onnx --images images
+
+Static quantization is calibrated on face crops of the enrolled people (base/<name>/<image>),
+and the accuracy gate runs on other faces of the same people (--holdout), never seen by the
+calibration. The quantized model is kept only if the gate passes; the command exits with 1 otherwise.
+"""
+import os
+import time
+import numpy as np
+
+from .helper import getEmbeddingsList, pairwiseDistances
+
+MODES = ("dynamic", "static", "fp16")
+MASK_SIZE = 299
+
+
+def calibrationReader(input_name, inputs, batch_size=8):
+    """
+    ### Description
+        ONNX Runtime calibration data reader feeding 'inputs' in batches.
+
+    ### Args
+        input_name (str): name of the model input.
+        inputs (nparray): preprocessed model inputs, e.g. aligned faces.
+        batch_size (int, optional): inputs per calibration batch. Defaults to 8.
+    """
+    from onnxruntime.quantization import CalibrationDataReader
+
+    class Reader(CalibrationDataReader):
+
+        def __init__(self):
+            self.batches = iter([{input_name: np.ascontiguousarray(inputs[i:i + batch_size], dtype=np.float32)}
+                                 for i in range(0, len(inputs), batch_size)])
+
+        def get_next(self):
+            return next(self.batches, None)
+
+    return Reader()
+
+def quantizeModel(model_path, output, mode="dynamic", calibration=None, per_channel=True, method="minmax"):
+    """
+    ### Description
+        Writes a quantized version of an ONNX model.
+
+        - 'dynamic': INT8 weights of the fully connected layers, activations quantized at run time. 
+          No calibration needed, but convolutions stay in FP32.
+        - 'static': INT8 weights and activations (QDQ format), activation ranges calibrated
+          on 'calibration'. Usually the fastest for convolutional networks.
+        - 'fp16': FP16 weights and activations (needs onnxconverter-common, installed with keras2onnx).
+
+    ### Args
+        model_path (str): path to the FP32 .onnx model.
+        output (str): path of the quantized model.
+        mode (str, optional): 'dynamic', 'static' or 'fp16'. Defaults to "dynamic".
+        calibration (nparray, optional): preprocessed inputs used to calibrate 'static' mode. Defaults to None.
+        per_channel (bool, optional): one scale per output channel of the weights. Defaults to True.
+        method (str, optional): calibration method 'minmax', 'entropy' or 'percentile'. Defaults to "minmax".
+
+    ### Returns
+        str: path of the quantized model.
+    """
+    if mode not in MODES:
+        raise AttributeError("invalid mode. Please use 'dynamic', 'static' or 'fp16'.")
+
+    import onnx
+    if mode == "fp16":
+        from onnxconverter_common import float16
+        model = float16.convert_float_to_float16(onnx.load(model_path), keep_io_types=True)
+        onnx.save_model(model, output)
+        return output
+
+    from onnxruntime.quantization import quantize_dynamic, quantize_static, QuantFormat, QuantType, CalibrationMethod
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+
+    # shape inference and graph optimisations give better quantized graphs
+    prepared = output + ".prep.onnx"
+    try:
+        try:
+            quant_pre_process(model_path, prepared)
+        except ImportError:
+            # symbolic shape inference needs sympy
+            quant_pre_process(model_path, prepared, skip_symbolic_shape=True)
+    except Exception:
+        prepared = model_path
+
+    try:
+        if mode == "dynamic":
+            # integer convolutions quantized at run time are slower than FP32 ones on CPU,
+            # so only the fully connected layers are quantized
+            quantize_dynamic(prepared, output, per_channel=per_channel, weight_type=QuantType.QInt8,
+                             op_types_to_quantize=["MatMul", "Gemm"])
+        else:
+            if calibration is None or len(calibration) == 0:
+                raise AttributeError("Static quantization needs calibration inputs.")
+            input_name = onnx.load(prepared).graph.input[0].name
+            methods = {"minmax": CalibrationMethod.MinMax,
+                       "entropy": CalibrationMethod.Entropy,
+                       "percentile": CalibrationMethod.Percentile}
+            quantize_static(prepared, output,
+                            calibrationReader(input_name, calibration),
+                            quant_format=QuantFormat.QDQ,
+                            per_channel=per_channel,
+                            activation_type=QuantType.QUInt8,
+                            weight_type=QuantType.QInt8,
+                            calibrate_method=methods[method])
+    finally:
+        if prepared != model_path and os.path.exists(prepared):
+            os.remove(prepared)
+    return output
+
+def enrolledFaces(frs, base, per_person=None):
+    """
+    ### Description
+        Detects the first face of every enrolled image (base/<name>/<image>).
+
+    ### Args
+        frs (FaceRecognitionSystem): system used to detect (and align) the faces.
+        base (str): directory containing one folder of images per person.
+        per_person (int, optional): maximal number of images per person. Defaults to None (all).
+
+    ### Returns
+        list: list of (image, box, facial_features, name) tuples.
+    """
+    import cv2
+    from .enroll import listImages
+
+    faces = []
+    count = {}
+    for path, name in listImages(base):
+        if per_person is not None and count.get(name, 0) >= per_person:
+            continue
+        image = cv2.imread(path)
+        if image is None:
+            continue
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        face_locations, facial_features = frs.detectFaces(image)
+        if facial_features:
+            faces.append((image, face_locations[0], facial_features[0], name))
+            count[name] = count.get(name, 0) + 1
+    return faces
+
+def splitFaces(faces, holdout=0.5):
+    """
+    ### Description
+        Splits the faces of enrolledFaces() into a calibration set and a held-out
+        evaluation set, person by person, so that the accuracy gate does not run on the
+        faces the activation ranges were calibrated on. People with a single face
+        only go to the calibration set.
+
+    ### Args
+        faces (list): (image, box, facial_features, name) tuples.
+        holdout (float, optional): fraction of the faces of every person held out, below 1. Defaults to 0.5.
+
+    ### Returns
+        tuple: (calibration faces, evaluation faces).
+    """
+    by_name = {}
+    for face in faces:
+        by_name.setdefault(face[3], []).append(face)
+
+    calibration, evaluation = [], []
+    for name in sorted(by_name):
+        for i, face in enumerate(by_name[name]):
+            # faces are held out evenly along the folder, the first one always calibrates
+            held = int((i + 1) * holdout) > int(i * holdout)
+            (evaluation if held else calibration).append(face)
+    return calibration, evaluation
+
+def embeddingInputs(frs, faces):
+    """
+    ### Returns
+        nparray: aligned and normalised faces of enrolledFaces(), as fed to the embedding model.
+    """
+    batch = frs.preprocessor.batch([image for image, _, _, _ in faces],
+                                   [[features] for _, _, features, _ in faces])
+    return batch.copy()
+
+def maskInputs(faces, size=MASK_SIZE, margin=20):
+    """
+    ### Returns
+        nparray: face crops of enrolledFaces(), resized and scaled to [-1, 1] as fed to the mask classifier.
+    """
+    import cv2
+    from .mask import cropFace
+    inputs = np.empty((len(faces), size, size, 3), dtype=np.float32)
+    for i, (image, box, _, _) in enumerate(faces):
+        inputs[i] = cv2.resize(cropFace(image, box, margin), (size, size))
+    return inputs / 127.5 - 1.0
+
+def throughput(predictor, inputs, batch_size=8, repeat=5):
+    """
+    ### Returns
+        float: inputs processed per second, best of 'repeat' passes over 'inputs'.
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for i in range(0, len(inputs), batch_size):
+            predictor(inputs[i:i + batch_size])
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return len(inputs) / best
+
+def embeddingGate(reference, quantized, faces, embeddings_dict, ids=None,
+                  min_agreement=0.99, max_accuracy_drop=0.0, max_distance_change=0.05):
+    """
+    ### Description
+        Compares a quantized embedding model with its FP32 reference.
+
+        Every face is identified as the nearest enrolled identity of 'embeddings_dict'
+        (e.g. data/embeddings.pkl) with both models, and the gate passes when:
+        - the identities agree for at least 'min_agreement' of the faces,
+        - the accuracy on the true 'ids' (when given) drops by at most 'max_accuracy_drop',
+        - the distances to the enrolled embeddings change by at most 'max_distance_change'
+          (relative, 95th percentile).
+
+    ### Args
+        reference (callable): FP32 model.
+        quantized (callable): quantized model.
+        faces (nparray): preprocessed faces.
+        embeddings_dict (dict): {id : list of embeddings} of the enrolled people.
+        ids (list, optional): true id of every face, None for faces of people missing from
+                              'embeddings_dict'; these are left out of the accuracy and counted
+                              in the report. Defaults to None.
+
+    ### Returns
+        dict: report of the comparison, 'passed' tells whether the gate passed.
+    """
+    known, known_ids = getEmbeddingsList(embeddings_dict)
+    known, known_ids = np.asarray(known, dtype=np.float32), np.asarray(known_ids)
+
+    expected = np.asarray(reference(faces), dtype=np.float32)
+    actual = np.asarray(quantized(faces), dtype=np.float32)
+    cosine = np.sum(expected * actual, axis=1) / (np.linalg.norm(expected, axis=1) * np.linalg.norm(actual, axis=1))
+
+    expected_distances = pairwiseDistances(expected, known)
+    actual_distances = pairwiseDistances(actual, known)
+    # relative to the typical distance of every face, as near-zero distances would blow up ratios
+    scale = np.maximum(expected_distances.mean(axis=1, keepdims=True), 1e-6)
+    change = np.abs(actual_distances - expected_distances) / scale
+
+    expected_ids = known_ids[np.argmin(expected_distances, axis=1)]
+    actual_ids = known_ids[np.argmin(actual_distances, axis=1)]
+
+    report = {"faces": len(faces),
+              "min_cosine": float(cosine.min()),
+              "mean_cosine": float(cosine.mean()),
+              "distance_change_p95": float(np.percentile(change, 95)),
+              "agreement": float(np.mean(expected_ids == actual_ids))}
+    passed = report["agreement"] >= min_agreement and report["distance_change_p95"] <= max_distance_change
+    if ids is not None:
+        labelled = np.array([ref_id is not None for ref_id in ids], dtype=bool)
+        if not labelled.any():
+            raise AttributeError("None of the faces belongs to an enrolled person.")
+        ids = np.array([ref_id for ref_id in ids if ref_id is not None])
+        report["unknown_faces"] = int(np.sum(~labelled))
+        report["accuracy_fp32"] = float(np.mean(expected_ids[labelled] == ids))
+        report["accuracy_quantized"] = float(np.mean(actual_ids[labelled] == ids))
+        passed = passed and report["accuracy_fp32"] - report["accuracy_quantized"] <= max_accuracy_drop
+    report["passed"] = bool(passed)
+    return report
+
+def classifierGate(reference, quantized, inputs, min_agreement=0.99, max_probability_change=0.05):
+    """
+    ### Description
+        Compares a quantized classifier (e.g. the mask classifier) with its FP32 reference:
+        the predicted classes must agree for at least 'min_agreement' of the inputs and
+        the probabilities change by at most 'max_probability_change' (95th percentile).
+
+    ### Returns
+        dict: report of the comparison, 'passed' tells whether the gate passed.
+    """
+    expected = np.asarray(reference(inputs), dtype=np.float32)
+    actual = np.asarray(quantized(inputs), dtype=np.float32)
+    change = np.abs(expected - actual).max(axis=1)
+    report = {"inputs": len(inputs),
+              "agreement": float(np.mean(expected.argmax(axis=1) == actual.argmax(axis=1))),
+              "probability_change_p95": float(np.percentile(change, 95))}
+    report["passed"] = bool(report["agreement"] >= min_agreement and
+                            report["probability_change_p95"] <= max_probability_change)
+    return report
+
+if __name__ == "__main__":
+    import sys
+    import pickle
+    import argparse
+    from .frs import FaceRecognitionSystem
+    from .models import FACE_SIZES
+    from .onnx_backend import OnnxPredictor
+
+    parser = argparse.ArgumentParser(description="Quantize an ONNX embedding or mask model and check its accuracy.")
+    parser.add_argument("which", choices=sorted(FACE_SIZES) + ["mask"])
+    parser.add_argument("model", help="path to the FP32 .onnx model")
+    parser.add_argument("output", help="path of the quantized .onnx model")
+    parser.add_argument("--mode", default="static", choices=MODES)
+    parser.add_argument("--method", default="minmax", choices=["minmax", "entropy", "percentile"])
+    parser.add_argument("--images", required=True, help="enrolled images, one folder per person")
+    parser.add_argument("--per-person", type=int, default=None, help="images per person used")
+    parser.add_argument("--holdout", type=float, default=0.5, help="fraction of the faces of every person kept for the accuracy gate")
+    parser.add_argument("--db", default=os.path.join("data", "db.pkl"))
+    parser.add_argument("--embeddings", default=os.path.join("data", "embeddings.pkl"))
+    parser.add_argument("--detector", default="ultralight", choices=["mtcnn", "ultralight"])
+    parser.add_argument("--detector-path", default=None)
+    parser.add_argument("--min-agreement", type=float, default=0.99)
+    parser.add_argument("--max-change", type=float, default=0.05, help="maximal relative distance (or probability) change")
+    args = parser.parse_args()
+
+    # only the detector and the preprocessor are used, no embedding model is loaded
+    frs = FaceRecognitionSystem(embedding_model=args.which if args.which != "mask" else None,
+                                detector=args.detector,
+                                detector_path=args.detector_path)
+    faces = enrolledFaces(frs, args.images, per_person=args.per_person)
+    if not faces:
+        raise SystemExit("No face found in {}".format(args.images))
+    calibration_faces, evaluation_faces = splitFaces(faces, holdout=args.holdout)
+    if not evaluation_faces:
+        raise SystemExit("No face left for the accuracy gate, enroll at least 2 images per person")
+    prepare = (lambda faces: embeddingInputs(frs, faces)) if args.which != "mask" else maskInputs
+    calibration, inputs = prepare(calibration_faces), prepare(evaluation_faces)
+    print("Calibrating on {} faces, checking on {} other faces of {} people".format(
+        len(calibration_faces), len(evaluation_faces), len(set(f[3] for f in faces))))
+
+    quantizeModel(args.model, args.output, mode=args.mode, calibration=calibration, method=args.method)
+    reference, quantized = OnnxPredictor(args.model), OnnxPredictor(args.output)
+
+    if args.which == "mask":
+        report = classifierGate(reference, quantized, inputs,
+                                min_agreement=args.min_agreement, max_probability_change=args.max_change)
+    else:
+        with open(args.db, "rb") as f:
+            ids = {name: ref_id for ref_id, name in pickle.load(f).items()}
+        with open(args.embeddings, "rb") as f:
+            embeddings_dict = pickle.load(f)
+        report = embeddingGate(reference, quantized, inputs, embeddings_dict,
+                               ids=[ids.get(name) for _, _, _, name in evaluation_faces],
+                               min_agreement=args.min_agreement, max_distance_change=args.max_change)
+
+    report["throughput_fp32"] = throughput(reference, inputs)
+    report["throughput_quantized"] = throughput(quantized, inputs)
+    report["speedup"] = report["throughput_quantized"] / report["throughput_fp32"]
+    report["size_mb"] = os.path.getsize(args.output) / 1e6
+    if report.get("unknown_faces"):
+        print("  {} faces of people missing from {} left out of the accuracy".format(report["unknown_faces"], args.db))
+    for name, value in report.items():
+        print("  {}: {}".format(name, "{:.4f}".format(value) if isinstance(value, float) else value))
+
+    if not report["passed"]:
+        os.remove(args.output)
+        print("Accuracy gate FAILED, {} removed".format(args.output))
+        sys.exit(1)
+    print("Accuracy gate passed, {:.2f}x faster".format(report["speedup"]))
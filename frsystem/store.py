@@ -0,0 +1,352 @@
+import os
+import json
+import pickle
+import numpy as np
+from collections.abc import Mapping
+
+
+class EmbeddingStore(object):
+    """
+    ### Description
+        Append-only, memory-mapped storage for face embeddings.
+        A store at 'path' consists of three files:
+        1. 'path.f32'  - raw float32 matrix, one embedding per row.
+        2. 'path.ids'  - raw int64 array, the id of every row.
+        3. 'path.log'  - append-only log of JSON records (header and id : name records).
+
+        Enrolling a face only appends bytes to these files. Readers map the files
+        instead of unpickling them, so several processes share one copy of the
+        embeddings through the page cache. A store has a single writer.
+    """
+
+    def __init__(self, path, dim=None, readonly=False):
+        """
+        ### Args
+            path (str): base path of the store files.
+            dim (int, optional): embedding size, required when creating a new store. Defaults to None.
+            readonly (bool, optional): open the store for reading only. Defaults to False.
+        """
+        self.path = path
+        self.readonly = readonly
+        self.matrix_file = path + ".f32"
+        self.ids_file = path + ".ids"
+        self.log_file = path + ".log"
+
+        self.dim = None
+        self.names = {}
+        self._matrix = None
+        self._ids = None
+        self._rows_by_id = None
+        self._size = 0
+        self._log_offset = 0 # bytes of the log already replayed
+
+        self._in_transaction = False
+        self._pending_names = []
+        self._pending_rows = {} # id : list of embeddings not yet written
+
+        if os.path.exists(self.log_file):
+            self._replayLog()
+        elif readonly:
+            raise FileNotFoundError("No embedding store found at {}".format(path))
+
+        if not readonly:
+            self._repair()
+
+        if self.dim is None and dim is not None and not readonly:
+            self._appendLog({"op": "init", "dim": int(dim)})
+            self.dim = int(dim)
+        self.refresh()
+
+    def _replayLog(self):
+        """
+        Applies the log records appended since the last call.
+
+        Returns True if any record was read.
+        """
+        if not os.path.exists(self.log_file):
+            return False
+        with open(self.log_file, "rb") as f:
+            f.seek(self._log_offset)
+            data = f.read()
+
+        offset = self._log_offset
+        for line in data.splitlines(True):
+            if not line.endswith(b"\n"):
+                break # record still being written, or torn by a crash
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break
+            if record["op"] == "init":
+                self.dim = record["dim"]
+            elif record["op"] == "name":
+                self.names[record["id"]] = record["name"]
+            offset += len(line)
+        changed = offset != self._log_offset
+        self._log_offset = offset
+        return changed
+
+    def _appendLog(self, record):
+        self._writeLog([record])
+
+    def _writeLog(self, records):
+        with open(self.log_file, "a") as f:
+            f.write("".join(json.dumps(record) + "\n" for record in records))
+        # the writer's own records are already applied
+        self._log_offset = os.path.getsize(self.log_file)
+
+    def _committedRows(self):
+        if self.dim is None:
+            return 0
+        n_vectors = os.path.getsize(self.matrix_file) // (4 * self.dim) if os.path.exists(self.matrix_file) else 0
+        n_ids = os.path.getsize(self.ids_file) // 8 if os.path.exists(self.ids_file) else 0
+        return min(n_vectors, n_ids)
+
+    def _repair(self):
+        """
+        Drops a partially written last row, and last log record, left behind by a crash.
+        """
+        if os.path.exists(self.log_file) and os.path.getsize(self.log_file) != self._log_offset:
+            with open(self.log_file, "r+b") as f:
+                f.truncate(self._log_offset)
+        n = self._committedRows()
+        for filename, row_bytes in ((self.matrix_file, 4 * (self.dim or 0)), (self.ids_file, 8)):
+            if os.path.exists(filename) and os.path.getsize(filename) != n * row_bytes:
+                with open(filename, "r+b") as f:
+                    f.truncate(n * row_bytes)
+
+    def refresh(self):
+        """
+        ### Description
+            Reads the names and re-maps the rows that another process appended
+            since the last call. Rows are counted before the log is read: the writer
+            logs names before their rows, so every visible row has its name.
+
+        ### Returns
+            bool: True if new rows or names became visible.
+        """
+        n = self._committedRows()
+        names_changed = self._replayLog()
+        if n == self._size and self._matrix is not None and self._matrix.shape[1] == (self.dim or 0):
+            return names_changed
+
+        self._size = n
+        self._rows_by_id = None
+        if n == 0:
+            self._matrix = np.empty((0, self.dim or 0), dtype=np.float32)
+            self._ids = np.empty((0,), dtype=np.int64)
+        else:
+            self._matrix = np.memmap(self.matrix_file, dtype=np.float32, mode="r", shape=(n, self.dim))
+            self._ids = np.memmap(self.ids_file, dtype=np.int64, mode="r", shape=(n,))
+        return True
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def matrix(self):
+        """
+        Read-only float32 matrix of shape (n, dim) mapped from disk.
+        """
+        return self._matrix
+
+    @property
+    def ids(self):
+        """
+        Read-only int64 array of shape (n,) with the id of every row.
+        """
+        return self._ids
+
+    def rowsById(self):
+        """
+        ### Returns
+            dict: {id : array of row indexes}
+        """
+        if self._rows_by_id is None:
+            order = np.argsort(self._ids, kind="stable")
+            unique, starts = np.unique(self._ids[order], return_index=True)
+            self._rows_by_id = {int(i): rows for i, rows in zip(unique, np.split(order, starts[1:]))}
+        return self._rows_by_id
+
+    def addName(self, ref_id, name):
+        """
+        ### Description
+            Records the name of a known face id.
+        """
+        self._checkWritable()
+        record = {"op": "name", "id": int(ref_id), "name": name}
+        if self._in_transaction:
+            self._pending_names.append(record)
+        else:
+            self._appendLog(record)
+        self.names[int(ref_id)] = name
+
+    def append(self, ref_ids, embeddings):
+        """
+        ### Description
+            Appends embeddings to the store. Only the new bytes are written.
+
+        ### Args
+            ref_ids (int or list): id of the known face, or one id per embedding.
+            embeddings (nparray): embedding of shape (dim,) or embeddings of shape (n, dim).
+        """
+        self._checkWritable()
+        embeddings = np.ascontiguousarray(np.atleast_2d(embeddings), dtype=np.float32)
+        ref_ids = np.broadcast_to(np.asarray(ref_ids, dtype=np.int64), (embeddings.shape[0],))
+
+        if self.dim is None:
+            self._appendLog({"op": "init", "dim": int(embeddings.shape[1])})
+            self.dim = int(embeddings.shape[1])
+        elif embeddings.shape[1] != self.dim:
+            raise ValueError("Embedding size {} does not match store size {}.".format(embeddings.shape[1], self.dim))
+
+        if self._in_transaction:
+            for ref_id, embedding in zip(ref_ids, embeddings):
+                self._pending_rows.setdefault(int(ref_id), []).append(embedding)
+            return
+
+        self._write(ref_ids, embeddings)
+
+    def _write(self, ref_ids, embeddings):
+        # vectors first, ids last: a row only becomes visible once its id is written
+        with open(self.matrix_file, "ab") as f:
+            f.write(embeddings.tobytes())
+        with open(self.ids_file, "ab") as f:
+            f.write(np.ascontiguousarray(ref_ids).tobytes())
+        self.refresh()
+
+    def pending(self, ref_id):
+        """
+        ### Returns
+            list: embeddings of 'ref_id' appended in the current transaction and not yet committed.
+        """
+        return self._pending_rows.get(int(ref_id), [])
+
+    def pendingIds(self):
+        return list(self._pending_rows)
+
+    def begin(self):
+        """
+        ### Description
+            Starts buffering appended names and embeddings in memory until commit.
+        """
+        self._checkWritable()
+        self._in_transaction = True
+
+    def commit(self):
+        """
+        ### Description
+            Writes all buffered names and embeddings with one append per file.
+        """
+        if self._pending_names:
+            self._writeLog(self._pending_names)
+
+        if self._pending_rows:
+            ref_ids = [ref_id for ref_id, rows in self._pending_rows.items() for _ in rows]
+            embeddings = np.vstack([row for rows in self._pending_rows.values() for row in rows])
+            self._write(np.asarray(ref_ids, dtype=np.int64), embeddings)
+
+        self._in_transaction = False
+        self._pending_names = []
+        self._pending_rows = {}
+
+    def rollback(self):
+        """
+        ### Description
+            Discards all buffered names and embeddings.
+        """
+        for record in self._pending_names:
+            self.names.pop(record["id"], None)
+        self._in_transaction = False
+        self._pending_names = []
+        self._pending_rows = {}
+
+    def flush(self):
+        """
+        ### Description
+            Forces appended data to disk.
+        """
+        for filename in (self.matrix_file, self.ids_file, self.log_file):
+            if os.path.exists(filename):
+                fd = os.open(filename, os.O_RDONLY)
+                try:
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
+
+    def _checkWritable(self):
+        if self.readonly:
+            raise PermissionError("Embedding store {} is opened read-only.".format(self.path))
+
+    @classmethod
+    def fromPickle(cls, db_file, embeddings_file, path):
+        """
+        ### Description
+            Migrates the pickled {id : name} and {id : listOfEmbeddings} dictionaries
+            of a "Database" into a new store.
+
+        ### Args
+            db_file (str): path to pickle file containing dictionary {id : name} of known faces.
+            embeddings_file (str): path to pickle file containing dictionary {id : listOfEmbeddings} of known faces.
+            path (str): base path of the new store.
+
+        ### Returns
+            EmbeddingStore: the new store.
+        """
+        if os.path.exists(path + ".log"):
+            raise FileExistsError("An embedding store already exists at {}".format(path))
+
+        with open(db_file, "rb") as f:
+            db = pickle.load(f)
+        with open(embeddings_file, "rb") as f:
+            embeddings = pickle.load(f)
+
+        store = cls(path)
+        for ref_id, name in db.items():
+            store.addName(ref_id, name)
+        for ref_id, embed_list in embeddings.items():
+            if len(embed_list):
+                store.append(ref_id, np.vstack(embed_list))
+        store.flush()
+        return store
+
+
+class EmbeddingsView(Mapping):
+    """
+    ### Description
+        Dict-like {id : listOfEmbeddings} view over an EmbeddingStore, so that
+        code written for the pickled dictionaries keeps working.
+        Assigning a longer list to an id appends the new embeddings to the store:
+
+        ```python
+        embeddings[ref_id] += [face_embedding]
+        ```
+    """
+
+    def __init__(self, store):
+        self.store = store
+
+    def __getitem__(self, ref_id):
+        rows = self.store.rowsById().get(int(ref_id), ())
+        pending = self.store.pending(ref_id)
+        if len(rows) == 0 and not pending:
+            raise KeyError(ref_id)
+        return [self.store.matrix[r] for r in rows] + list(pending)
+
+    def __setitem__(self, ref_id, embed_list):
+        known = len(self.store.rowsById().get(int(ref_id), ())) + len(self.store.pending(ref_id))
+        if len(embed_list) < known:
+            raise ValueError("Embeddings can only be appended to an embedding store.")
+        new = embed_list[known:]
+        if len(new):
+            self.store.append(ref_id, np.vstack(new))
+
+    def _keys(self):
+        keys = list(self.store.rowsById())
+        return keys + [ref_id for ref_id in self.store.pendingIds() if ref_id not in self.store.rowsById()]
+
+    def __iter__(self):
+        return iter(self._keys())
+
+    def __len__(self):
+        return len(self._keys())
@@ -0,0 +1,265 @@
+import time
+import threading
+from collections import deque
+
+import cv2
+import numpy as np
+from .pipeline import LatestQueue, Frame
+from .metrics import NULL_METRICS
+
+
+class Stream(object):
+    """
+    ### Description
+        One video source of a MultiStreamRunner and its statistics.
+    """
+
+    def __init__(self, index, source, name=None, history=1000):
+        self.index = index
+        self.source = source
+        if name is None:
+            name = "stream {}".format(index) if isinstance(source, cv2.VideoCapture) else str(source)
+        self.name = name
+        self.queue = LatestQueue(1)
+        self.finished = False
+        self.captured = 0
+        self.processed = 0
+        self.latencies = deque(maxlen=history)
+        self.last = None
+
+
+class MultiStreamRunner(object):
+    """
+    ### Description
+        Processes many video sources (device indices, files, stream URLs) in one process,
+        so that a single FaceRecognitionSystem and mask model serve all cameras.
+
+        Every source has its own capture thread feeding a one-frame latest-frame-wins
+        queue. A single inference thread repeatedly collects the newest frame of every
+        stream that has one and hands them all to 'process_batch', which can then run
+        the detector, the embedding model and the mask classifier once for the faces of
+        all streams.
+
+        Fairness: a batch takes at most one frame per stream and streams are visited
+        in a rotating order, so when 'max_batch_frames' is smaller than the number of
+        streams every stream is served in turn and none can starve the others.
+        A fast camera only replaces its own pending frame.
+    """
+
+    def __init__(self,
+                 sources,
+                 process_batch,
+                 render=None,
+                 names=None,
+                 max_batch_frames=None,
+                 history=1000,
+                 metrics=None):
+        """
+        ### Args
+            sources (list): video sources, anything cv2.VideoCapture accepts.
+            process_batch (callable): process_batch(frames) -> list of results, one per frame.
+                                      Each frame has 'stream' (index of its source), 'index', 'image' (BGR) and 'captured'.
+            render (callable, optional): render(image, results) -> image to display. Defaults to None.
+            names (list, optional): names of the streams (window titles, stats). Defaults to the sources.
+            max_batch_frames (int, optional): maximal number of frames per batch. Defaults to None (one per stream).
+            history (int, optional): number of latency samples kept per stream. Defaults to 1000.
+            metrics (Metrics, optional): also exports latencies, batch sizes, queue depths and drops (see metrics.py). Defaults to None.
+        """
+        names = names if names is not None else [None] * len(sources)
+        self.streams = [Stream(i, source, name, history) for i, (source, name) in enumerate(zip(sources, names))]
+        self.process_batch = process_batch
+        self.render = render
+        self.max_batch_frames = max_batch_frames or len(self.streams)
+
+        self.stopped = threading.Event()
+        self._ready = threading.Event()
+        self._results_lock = threading.Lock()
+        self._next = 0
+        self.error = None
+        self.batches = 0
+        self.batch_frames = 0
+        self.batch_times = deque(maxlen=history)
+        self._start = time.perf_counter()
+
+        self.metrics = metrics if metrics is not None else NULL_METRICS
+        self.metrics.register(self._collectMetrics)
+
+    def _collectMetrics(self, metrics):
+        metrics.gauge("queued_frames", sum(len(stream.queue) for stream in self.streams))
+        metrics.total("frames_dropped", sum(stream.queue.dropped for stream in self.streams))
+        metrics.gauge("active_streams", sum(not stream.finished for stream in self.streams))
+
+    def _capture(self, stream):
+        capture = stream.source if isinstance(stream.source, cv2.VideoCapture) else cv2.VideoCapture(stream.source)
+        capture.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        try:
+            while not self.stopped.is_set() and capture.isOpened():
+                ok, image = capture.read()
+                if not ok or image is None:
+                    break
+                frame = Frame(stream.captured, image, time.perf_counter())
+                frame.stream = stream.index
+                stream.captured += 1
+                stream.queue.put(frame)
+                self._ready.set()
+        finally:
+            capture.release()
+            stream.finished = True
+            self._ready.set()
+
+    def _collect(self):
+        """
+        Newest frame of every stream having one, visiting streams in a rotating order.
+        """
+        frames = []
+        n = len(self.streams)
+        for offset in range(n):
+            stream = self.streams[(self._next + offset) % n]
+            frame = stream.queue.get(timeout=0)
+            if frame is not None:
+                frames.append(frame)
+                if len(frames) == self.max_batch_frames:
+                    self._next = (stream.index + 1) % n
+                    return frames
+        self._next = (self._next + 1) % n
+        return frames
+
+    def _pending(self):
+        return any(len(stream.queue) > 0 for stream in self.streams)
+
+    def _infer(self):
+        try:
+            while not self.stopped.is_set():
+                self._ready.wait(0.1)
+                self._ready.clear()
+                frames = self._collect()
+                if not frames:
+                    if all(stream.finished for stream in self.streams) and not self._pending():
+                        break
+                    continue
+
+                start = time.perf_counter()
+                results = self.process_batch(frames)
+                done = time.perf_counter()
+                self.batches += 1
+                self.batch_frames += len(frames)
+                self.batch_times.append(done - start)
+                self.metrics.observe("batch_frames", len(frames))
+
+                with self._results_lock:
+                    for frame, result in zip(frames, results):
+                        stream = self.streams[frame.stream]
+                        stream.processed += 1
+                        stream.latencies.append(done - frame.captured)
+                        self.metrics.observe("stream_latency_seconds", done - frame.captured)
+                        stream.last = (frame, result)
+                # frames still waiting are processed right away
+                if self._pending():
+                    self._ready.set()
+        except Exception as e:
+            self.error = e
+        finally:
+            self.stopped.set()
+
+    def stop(self):
+        self.stopped.set()
+        self._ready.set()
+
+    def run(self, display=False, duration=None, report_every=None):
+        """
+        ### Description
+            Starts capture and inference and waits until every source ended,
+            'duration' seconds elapsed, the ESC key is pressed (display) or Ctrl+C.
+
+        ### Args
+            display (bool, optional): show every stream in its own window (needs 'render'). Defaults to False.
+            duration (float, optional): maximal duration of the run in seconds. Defaults to None.
+            report_every (float, optional): print stats every so many seconds. Defaults to None.
+
+        ### Returns
+            dict: stats of the run, see stats().
+        """
+        threads = [threading.Thread(target=self._capture, args=(stream,), name="capture-{}".format(stream.index), daemon=True)
+                   for stream in self.streams]
+        threads.append(threading.Thread(target=self._infer, name="inference", daemon=True))
+        self._start = time.perf_counter()
+        last_report = self._start
+        for thread in threads:
+            thread.start()
+
+        shown = {}
+        try:
+            while not self.stopped.is_set():
+                now = time.perf_counter()
+                if duration is not None and now - self._start >= duration:
+                    break
+                if report_every is not None and now - last_report >= report_every:
+                    print(self.summary(self.stats()))
+                    last_report = now
+
+                if not display:
+                    time.sleep(0.05)
+                    continue
+
+                for stream in self.streams:
+                    with self._results_lock:
+                        last = stream.last
+                    if last is None or shown.get(stream.index) is last[0]:
+                        continue
+                    shown[stream.index] = last[0]
+                    image = last[0].image
+                    if self.render is not None:
+                        image = self.render(image, last[1])
+                    cv2.imshow(stream.name, image)
+                if cv2.waitKey(1) & 0xFF == 27:
+                    break
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+            for thread in threads:
+                thread.join()
+            if display:
+                cv2.destroyAllWindows()
+
+        if self.error is not None:
+            raise self.error
+
+        stats = self.stats()
+        print(self.summary(stats))
+        return stats
+
+    def stats(self):
+        """
+        ### Returns
+            dict: per stream frame counts, dropped frames, processed fps and
+                  capture-to-result latency percentiles (milliseconds), and batch stats.
+        """
+        elapsed = max(time.perf_counter() - self._start, 1e-9)
+        streams = []
+        for stream in self.streams:
+            latencies = 1000 * np.asarray(stream.latencies)
+            streams.append({"name": stream.name,
+                            "captured": stream.captured,
+                            "processed": stream.processed,
+                            "dropped": stream.queue.dropped,
+                            "fps": stream.processed / elapsed,
+                            "latency_ms": {"p50": float(np.percentile(latencies, 50)) if latencies.size else None,
+                                           "p95": float(np.percentile(latencies, 95)) if latencies.size else None}})
+        return {"elapsed": elapsed,
+                "batches": self.batches,
+                "frames_per_batch": self.batch_frames / self.batches if self.batches else 0.0,
+                "batch_ms": float(1000 * np.mean(self.batch_times)) if self.batch_times else None,
+                "streams": streams}
+
+    @staticmethod
+    def summary(stats):
+        lines = ["{} batches in {:.1f}s, {:.1f} frames per batch{}".format(
+            stats["batches"], stats["elapsed"], stats["frames_per_batch"],
+            ", {:.1f} ms per batch".format(stats["batch_ms"]) if stats["batch_ms"] is not None else "")]
+        for stream in stats["streams"]:
+            latency = stream["latency_ms"]
+            lines.append("  {}: {} captured, {} processed ({:.1f} fps), {} dropped, latency {}".format(
+                stream["name"], stream["captured"], stream["processed"], stream["fps"], stream["dropped"],
+                "p50 {:.1f} ms, p95 {:.1f} ms".format(latency["p50"], latency["p95"]) if latency["p50"] is not None else "n/a"))
+        return "\n".join(lines)
@@ -0,0 +1,179 @@
+import numpy as np
+from .box_utils import iou_of
+
+
+def cornerBoxes(boxes):
+    """
+    ### Description
+        Converts (x, y, width, height) boxes to corner form (x1, y1, x2, y2).
+    """
+    boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+    return np.concatenate([boxes[:, :2], boxes[:, :2] + boxes[:, 2:]], axis=1)
+
+
+class Track(object):
+    """
+    ### Description
+        A face followed across frames.
+
+        - track_id: persistent id of the track.
+        - box: last box (x, y, width, height).
+        - velocity: estimated motion of the box per frame (dx, dy).
+        - identity: cached identity of the face (e.g. a database id, a name or "Unknown"), None until identified.
+        - confidence: confidence (or distance) of the cached identity.
+        - hits: number of frames the face was detected in.
+        - missed: number of consecutive frames without a matching detection.
+    """
+
+    def __init__(self, track_id, box, frame_index):
+        self.track_id = track_id
+        self.box = np.asarray(box, dtype=np.float32)
+        self.velocity = np.zeros(2, dtype=np.float32)
+        self.identity = None
+        self.confidence = None
+        self.hits = 1
+        self.missed = 0
+        self.identified_box = None
+        self.identified_at = None
+        self.last_seen = frame_index
+
+    def predictedBox(self, frame_index):
+        box = self.box.copy()
+        box[:2] += self.velocity * (frame_index - self.last_seen)
+        return box
+
+    def update(self, box, frame_index, smoothing=0.5):
+        box = np.asarray(box, dtype=np.float32)
+        steps = max(1, frame_index - self.last_seen)
+        velocity = (box[:2] - self.box[:2]) / steps
+        self.velocity = smoothing * velocity + (1 - smoothing) * self.velocity
+        self.box = box
+        self.hits += 1
+        self.missed = 0
+        self.last_seen = frame_index
+
+
+class FaceTracker(object):
+    """
+    ### Description
+        Assigns persistent track ids to the faces returned by detectFaces, frame after
+        frame, by associating each detection with the track whose motion-predicted box
+        overlaps it the most (IoU).
+
+        Each track caches the identity of its face, so that faces only need to be
+        embedded and matched again when the track is new, when its box changed a lot
+        since it was identified, or every 'refresh_interval' frames.
+
+    ### Example
+        ```python
+        tracks = tracker.update(face_locations)
+        for track in tracker.needIdentity(tracks):
+            tracker.setIdentity(track, identity, confidence)
+        ```
+    """
+
+    def __init__(self,
+                 iou_threshold=0.3,
+                 max_missed=10,
+                 refresh_interval=30,
+                 reidentify_iou=0.5,
+                 smoothing=0.5):
+        """
+        ### Args
+            iou_threshold (float, optional): minimal IoU between a predicted track box and a detection to match them. Defaults to 0.3.
+            max_missed (int, optional): frames a track survives without detection. Defaults to 10.
+            refresh_interval (int, optional): frames after which an identity is computed again, 0 to never refresh. Defaults to 30.
+            reidentify_iou (float, optional): the identity is computed again when the IoU between the current box and
+                                              the box at identification falls below this value. Defaults to 0.5.
+            smoothing (float, optional): weight of the last motion in the velocity estimate. Defaults to 0.5.
+        """
+        self.iou_threshold = iou_threshold
+        self.max_missed = max_missed
+        self.refresh_interval = refresh_interval
+        self.reidentify_iou = reidentify_iou
+        self.smoothing = smoothing
+
+        self.tracks = []
+        self.frame_index = -1
+        self._next_id = 0
+        self.identifications = 0
+        self.reuses = 0
+
+    def update(self, boxes):
+        """
+        ### Description
+            Associates the detections of a new frame with the current tracks.
+            Unmatched detections start new tracks, tracks unmatched for more than
+            'max_missed' frames are removed.
+
+        ### Args
+            boxes (list): face boxes (x, y, width, height) of the frame.
+
+        ### Returns
+            list: the track of every box, in the same order.
+        """
+        self.frame_index += 1
+        boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        assigned = [None] * len(boxes)
+
+        if len(self.tracks) > 0 and len(boxes) > 0:
+            predicted = cornerBoxes([track.predictedBox(self.frame_index) for track in self.tracks])
+            detected = cornerBoxes(boxes)
+            iou = iou_of(predicted[:, np.newaxis, :], detected[np.newaxis, :, :])
+
+            # greedy association, best overlaps first
+            for flat in np.argsort(-iou, axis=None):
+                t, d = np.unravel_index(flat, iou.shape)
+                if iou[t, d] < self.iou_threshold:
+                    break
+                if assigned[d] is not None or self.tracks[t].last_seen == self.frame_index:
+                    continue
+                self.tracks[t].update(boxes[d], self.frame_index, self.smoothing)
+                assigned[d] = self.tracks[t]
+
+        for track in self.tracks:
+            if track.last_seen != self.frame_index:
+                track.missed += 1
+        self.tracks = [track for track in self.tracks if track.missed <= self.max_missed]
+
+        for d, box in enumerate(boxes):
+            if assigned[d] is None:
+                track = Track(self._next_id, box, self.frame_index)
+                self._next_id += 1
+                self.tracks.append(track)
+                assigned[d] = track
+
+        return assigned
+
+    def needsIdentity(self, track):
+        """
+        ### Returns
+            bool: True if the identity of the track must be computed (again).
+        """
+        if track.identity is None:
+            return True
+        if self.refresh_interval and self.frame_index - track.identified_at >= self.refresh_interval:
+            return True
+        iou = iou_of(cornerBoxes(track.box), cornerBoxes(track.identified_box))[0]
+        return iou < self.reidentify_iou
+
+    def needIdentity(self, tracks):
+        """
+        ### Returns
+            list: the tracks among 'tracks' whose identity must be computed.
+                  The other ones are counted as reused.
+        """
+        stale = [track for track in tracks if self.needsIdentity(track)]
+        self.reuses += len(tracks) - len(stale)
+        return stale
+
+    def setIdentity(self, track, identity, confidence=None):
+        track.identity = identity
+        track.confidence = confidence
+        track.identified_box = track.box.copy()
+        track.identified_at = self.frame_index
+        self.identifications += 1
+
+    def reset(self):
+        self.tracks = []
+        self.frame_index = -1
@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+
+
+def writeLinearModel(path, size, n_outputs, softmax=False, seed=0):
+    """
+    Writes a tiny ONNX model taking NHWC float32 images (N, size, size, 3):
+    per-channel mean of the image times a random (3, n_outputs) matrix,
+    optionally followed by a softmax. Returns the reference numpy function.
+    """
+    onnx = pytest.importorskip("onnx")
+    from onnx import helper, numpy_helper, TensorProto
+
+    weights = np.random.RandomState(seed).randn(3, n_outputs).astype(np.float32)
+    nodes = [helper.make_node("Transpose", ["x"], ["t"], perm=[0, 3, 1, 2]),
+             helper.make_node("GlobalAveragePool", ["t"], ["g"]),
+             helper.make_node("Flatten", ["g"], ["f"]),
+             helper.make_node("MatMul", ["f", "W"], ["y" if not softmax else "z"])]
+    if softmax:
+        nodes.append(helper.make_node("Softmax", ["z"], ["y"], axis=1))
+    graph = helper.make_graph(nodes, "linear",
+                              [helper.make_tensor_value_info("x", TensorProto.FLOAT, ["N", size, size, 3])],
+                              [helper.make_tensor_value_info("y", TensorProto.FLOAT, ["N", n_outputs])],
+                              [numpy_helper.from_array(weights, "W")])
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 13)])
+    model.ir_version = 8
+    onnx.save(model, path)
+
+    def reference(images):
+        logits = np.asarray(images, dtype=np.float64).mean(axis=(1, 2)) @ weights
+        if not softmax:
+            return logits
+        probabilities = np.exp(logits - logits.max(axis=1, keepdims=True))
+        return probabilities / probabilities.sum(axis=1, keepdims=True)
+
+    return reference
+
+
+@pytest.fixture
+def embedding_model(tmp_path):
+    """
+    (path, reference) of a toy 160x160 -> 128 embedding model.
+    """
+    pytest.importorskip("onnxruntime")
+    path = str(tmp_path / "embedding.onnx")
+    return path, writeLinearModel(path, 160, 128)
+
+
+def writeConstantDetector(path, confidences, boxes, input_size=(64, 48), batch=1):
+    """
+    Writes a tiny ONNX detector with the UltraLight inputs and outputs: NCHW frames
+    of 'input_size' (width, height) in, the same (N, 2) confidences and (N, 4)
+    corner-form boxes out for every frame. 'batch' is the fixed first input
+    dimension, None for a dynamic one.
+    """
+    onnx = pytest.importorskip("onnx")
+    from onnx import helper, numpy_helper, TensorProto
+
+    confidences = np.asarray(confidences, dtype=np.float32)[np.newaxis]
+    boxes = np.asarray(boxes, dtype=np.float32)[np.newaxis]
+    nodes = [helper.make_node("ReduceMean", ["x"], ["m"], axes=[1, 2, 3], keepdims=1),
+             helper.make_node("Reshape", ["m", "shape"], ["r"]),
+             helper.make_node("Mul", ["r", "zero"], ["z"]),
+             helper.make_node("Add", ["z", "C"], ["scores"]),
+             helper.make_node("Add", ["z", "B"], ["boxes"])]
+    first = batch if batch is not None else "N"
+    n = boxes.shape[1]
+    graph = helper.make_graph(nodes, "detector",
+                              [helper.make_tensor_value_info("x", TensorProto.FLOAT, [first, 3, input_size[1], input_size[0]])],
+                              [helper.make_tensor_value_info("scores", TensorProto.FLOAT, [first, n, 2]),
+                               helper.make_tensor_value_info("boxes", TensorProto.FLOAT, [first, n, 4])],
+                              [numpy_helper.from_array(np.array([-1, 1, 1], dtype=np.int64), "shape"),
+                               numpy_helper.from_array(np.zeros((1, 1, 1), dtype=np.float32), "zero"),
+                               numpy_helper.from_array(confidences, "C"),
+                               numpy_helper.from_array(boxes, "B")])
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 13)])
+    model.ir_version = 8
+    onnx.save(model, path)
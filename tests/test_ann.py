@@ -0,0 +1,119 @@
+import numpy as np
+import pytest
+
+from frsystem.ann import IVFIndex, kMeans, assignClusters
+from frsystem.gallery import GalleryIndex
+
+
+def gallery(rng, n=300, dim=16):
+    return rng.randn(n, dim).astype(np.float32), np.arange(100, 100 + n)
+
+
+def test_all_lists_probed_matches_exact_search():
+    rng = np.random.RandomState(0)
+    matrix, ids = gallery(rng)
+    index = IVFIndex(nlist=12)
+    index.train(matrix)
+    index.add(matrix, ids)
+    exact = GalleryIndex()
+    exact.setMatrix(matrix, ids)
+    queries = rng.randn(25, 16).astype(np.float32)
+
+    found, dist = index.search(queries, k=5, nprobe=12)
+    expected, expected_dist = exact.search(queries, k=5)
+
+    np.testing.assert_array_equal(found, expected)
+    np.testing.assert_allclose(dist, expected_dist, rtol=1e-4, atol=1e-4)
+
+
+def test_batch_matches_one_query_at_a_time():
+    rng = np.random.RandomState(1)
+    matrix, ids = gallery(rng)
+    index = IVFIndex(nlist=20, nprobe=3)
+    index.train(matrix)
+    index.add(matrix, ids)
+    queries = rng.randn(30, 16).astype(np.float32)
+
+    found, dist = index.search(queries, k=4)
+    for q, query in enumerate(queries):
+        single_found, single_dist = index.search(query, k=4)
+        np.testing.assert_array_equal(single_found[0], found[q])
+        np.testing.assert_allclose(single_dist[0], dist[q], rtol=1e-5, atol=1e-5)
+
+
+def test_gallery_member_finds_itself():
+    rng = np.random.RandomState(2)
+    matrix, ids = gallery(rng)
+    index = IVFIndex(nlist=10, nprobe=1)
+    index.train(matrix)
+    index.add(matrix, ids)
+
+    found, dist = index.search(matrix[:50], k=1)
+
+    np.testing.assert_array_equal(found[:, 0], ids[:50])
+    np.testing.assert_allclose(dist[:, 0], 0.0, atol=1e-2)
+
+
+def test_missing_neighbours_are_padded():
+    rng = np.random.RandomState(3)
+    matrix, ids = gallery(rng, n=6)
+    index = IVFIndex(nlist=3)
+    index.train(matrix)
+    index.add(matrix, ids)
+
+    found, dist = index.search(matrix[0], k=10, nprobe=1)
+
+    assert found.shape == (1, 10)
+    n_found = int(np.sum(found[0] >= 0))
+    assert 1 <= n_found < 10
+    assert np.all(found[0, n_found:] == -1)
+    assert np.all(np.isinf(dist[0, n_found:]))
+    assert np.all(np.diff(dist[0, :n_found]) >= 0)
+
+
+def test_add_after_training_and_empty_index():
+    rng = np.random.RandomState(4)
+    matrix, ids = gallery(rng)
+    index = IVFIndex(nlist=8)
+    with pytest.raises(RuntimeError):
+        index.add(matrix, ids)
+    index.train(matrix)
+    assert index.search(matrix[:2], k=3)[0].shape == (2, 0)
+
+    index.add(matrix[:150], ids[:150])
+    index.add(matrix[150:], ids[150:])
+
+    assert len(index) == 300
+    found, _ = index.search(matrix[200], k=1, nprobe=8)
+    assert found[0, 0] == ids[200]
+
+
+def test_cosine_distance():
+    rng = np.random.RandomState(5)
+    matrix, ids = gallery(rng)
+    index = IVFIndex(nlist=6, nprobe=6, distance="cosine")
+    index.build({ref_id: [e] for ref_id, e in zip(ids, matrix)})
+    query = rng.randn(16).astype(np.float32)
+
+    found, dist = index.search(query, k=3)
+
+    cosine = 1 - matrix @ query / (np.linalg.norm(matrix, axis=1) * np.linalg.norm(query))
+    best = np.argsort(cosine)[:3]
+    np.testing.assert_array_equal(found[0], ids[best])
+    np.testing.assert_allclose(dist[0], cosine[best], atol=1e-4)
+
+
+def test_kmeans_assigns_to_closest_centroid():
+    rng = np.random.RandomState(6)
+    data = np.concatenate([rng.randn(50, 2) + 10, rng.randn(50, 2) - 10]).astype(np.float32)
+
+    centroids = kMeans(data, 2)
+    assign = assignClusters(data, centroids)
+
+    assert len(set(assign[:50])) == 1 and len(set(assign[50:])) == 1
+    assert assign[0] != assign[-1]
+
+
+def test_invalid_distance():
+    with pytest.raises(AttributeError):
+        IVFIndex(distance="manhattan")
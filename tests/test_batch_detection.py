@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+from frsystem import box_utils
+from frsystem.detectors import UltraLightDetector, makeBatchDynamic
+from conftest import writeConstantDetector
+
+CONFIDENCES = [[0.1, 0.9], [0.2, 0.8], [0.05, 0.95], [0.9, 0.1]]
+BOXES = [[0.10, 0.10, 0.40, 0.50], [0.12, 0.12, 0.42, 0.52], [0.60, 0.20, 0.90, 0.70], [0.0, 0.0, 1.0, 1.0]]
+
+
+def test_predict_batch_matches_predict_per_image():
+    rng = np.random.RandomState(0)
+    corners = rng.rand(3, 50, 2) * 0.7
+    boxes = np.concatenate([corners, corners + 0.05 + rng.rand(3, 50, 2) * 0.25], axis=2)
+    scores = rng.rand(3, 50)
+    confidences = np.stack([1 - scores, scores], axis=2)
+    widths, heights = [640, 320, 100], [480, 240, 80]
+
+    results = box_utils.predict_batch(widths, heights, confidences, boxes, 0.5, iou_threshold=0.3)
+
+    for b, (picked, labels, probs) in enumerate(results):
+        expected = box_utils.predict(widths[b], heights[b], confidences[b:b + 1], boxes[b:b + 1], 0.5, iou_threshold=0.3)
+        np.testing.assert_array_equal(picked, expected[0])
+        np.testing.assert_array_equal(labels, expected[1])
+        np.testing.assert_array_equal(probs, expected[2])
+
+
+def test_predict_batch_without_faces():
+    confidences = np.tile([[0.9, 0.1]], (2, 5, 1))
+    results = box_utils.predict_batch(100, 100, confidences, np.zeros((2, 5, 4)), 0.5)
+    assert [len(picked) for picked, _, _ in results] == [0, 0]
+    with pytest.raises(AttributeError):
+        box_utils.predict_batch(100, 100, confidences, np.zeros((2, 5, 4)), 0.5, nms_method="box")
+
+
+@pytest.fixture
+def fixed_detector(tmp_path):
+    pytest.importorskip("onnxruntime")
+    path = str(tmp_path / "fixed.onnx")
+    writeConstantDetector(path, CONFIDENCES, BOXES, batch=1)
+    return path
+
+
+def test_fixed_and_dynamic_batch_models_agree(fixed_detector, tmp_path):
+    dynamic = str(tmp_path / "dynamic.onnx")
+    makeBatchDynamic(fixed_detector, dynamic)
+    rng = np.random.RandomState(1)
+    images = [rng.randint(0, 256, (h, w, 3)).astype(np.uint8) for h, w in ((120, 160), (240, 320), (90, 90))]
+
+    fixed = UltraLightDetector(fixed_detector, input_size=(64, 48), max_batch=1)
+    batched = UltraLightDetector(dynamic, input_size=(64, 48), max_batch=1)
+    assert not fixed.batched and batched.batched
+
+    for detector in (fixed, batched):
+        results = detector.detectBatch(images)
+        for image, detections in zip(images, results):
+            single = detector.detect(image)
+            assert detections.boxes == single.boxes
+            assert detections.keypoints == single.keypoints
+            assert len(detections) == 2
+    assert [d.boxes for d in fixed.detectBatch(images)] == [d.boxes for d in batched.detectBatch(images)]
+    assert fixed.detectBatch([]) == []
@@ -0,0 +1,96 @@
+import numpy as np
+import pytest
+
+from frsystem import box_utils
+
+
+def greedyHardNMS(box_scores, iou_threshold, top_k=-1, candidate_size=200):
+    """
+    Reference loop implementation of hard NMS.
+    """
+    scores = box_scores[:, -1]
+    indexes = np.argsort(scores, kind="stable")[::-1][:candidate_size]
+    picked = []
+    while len(indexes) > 0:
+        current = indexes[0]
+        picked.append(current)
+        if 0 < top_k == len(picked):
+            break
+        rest = indexes[1:]
+        iou = box_utils.iou_of(box_scores[rest, :4], box_scores[current, np.newaxis, :4])
+        indexes = rest[iou <= iou_threshold]
+    return box_scores[picked, :]
+
+
+def randomBoxes(rng, n):
+    corners = rng.rand(n, 2) * 0.8
+    sizes = 0.05 + rng.rand(n, 2) * 0.3
+    # distinct scores: ties make the order of equal boxes implementation defined
+    scores = rng.permutation(n) / n + 0.01
+    return np.concatenate([corners, corners + sizes, scores[:, np.newaxis]], axis=1)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_hard_nms_matches_greedy_loop(seed):
+    rng = np.random.RandomState(seed)
+    box_scores = randomBoxes(rng, rng.randint(1, 300))
+    for iou_threshold in (0.1, 0.3, 0.5):
+        for top_k, candidate_size in ((-1, 200), (5, 200), (-1, 20)):
+            np.testing.assert_array_equal(
+                box_utils.hard_nms(box_scores, iou_threshold, top_k=top_k, candidate_size=candidate_size),
+                greedyHardNMS(box_scores, iou_threshold, top_k=top_k, candidate_size=candidate_size))
+
+
+def test_hard_nms_chain_of_overlaps():
+    # box 1 is removed by box 0, so box 2, which only overlaps box 1, is kept
+    box_scores = np.array([[0.0, 0, 1, 1, 0.9], [0.5, 0, 1.5, 1, 0.8], [1.0, 0, 2, 1, 0.7]])
+
+    picked = box_utils.hard_nms(box_scores, iou_threshold=0.2)
+
+    np.testing.assert_array_equal(picked[:, -1], [0.9, 0.7])
+
+
+def test_hard_nms_empty():
+    assert box_utils.hard_nms(np.empty((0, 5)), 0.5).shape == (0, 5)
+
+
+def test_top_candidates_sorted_by_score():
+    scores = np.array([0.2, 0.9, 0.5, 0.7, 0.1])
+
+    np.testing.assert_array_equal(box_utils.top_candidates(scores, 3), [1, 3, 2])
+    np.testing.assert_array_equal(box_utils.top_candidates(scores, -1), [1, 3, 2, 0, 4])
+
+
+def test_iou_matrix_matches_iou_of():
+    boxes = randomBoxes(np.random.RandomState(0), 10)[:, :4]
+    expected = np.array([box_utils.iou_of(boxes, box[np.newaxis]) for box in boxes])
+
+    np.testing.assert_allclose(box_utils.iou_matrix(boxes), expected)
+
+
+def test_soft_nms_decays_overlapping_scores():
+    box_scores = np.array([[0.0, 0, 1, 1, 0.9], [0.1, 0, 1.1, 1, 0.8], [3.0, 3, 4, 4, 0.7]])
+
+    picked = box_utils.soft_nms(box_scores, sigma=0.5)
+
+    np.testing.assert_array_equal(picked[:2, :4], box_scores[[0, 2], :4])
+    assert picked[2, -1] < 0.8
+    with pytest.raises(AttributeError):
+        box_utils.soft_nms(box_scores, method="box")
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_nms_without_candidate_limit_does_not_build_iou_matrix(seed, monkeypatch):
+    rng = np.random.RandomState(seed)
+    box_scores = randomBoxes(rng, 500)
+    expected_hard = box_utils.hard_nms(box_scores, 0.3, candidate_size=-1)
+    expected_soft = box_utils.soft_nms(box_scores, candidate_size=-1)
+
+    monkeypatch.setattr(box_utils, "MAX_IOU_MATRIX", 100)
+    monkeypatch.setattr(box_utils, "iou_matrix", lambda *args, **kwargs: pytest.fail("N x N IoU matrix built"))
+
+    picked = box_utils.hard_nms(box_scores, 0.3, candidate_size=-1)
+    np.testing.assert_array_equal(picked, expected_hard)
+    np.testing.assert_array_equal(picked, greedyHardNMS(box_scores, 0.3, candidate_size=len(box_scores)))
+    np.testing.assert_array_equal(box_utils.hard_nms(box_scores, 0.3, top_k=3, candidate_size=-1), expected_hard[:3])
+    np.testing.assert_allclose(box_utils.soft_nms(box_scores, candidate_size=-1), expected_soft)
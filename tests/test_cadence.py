@@ -0,0 +1,129 @@
+import time
+
+import cv2
+import numpy as np
+import pytest
+
+from frsystem.cadence import AdaptiveDetector, KEYPOINT_NAMES
+from frsystem.detection import Detections
+
+TEXTURE = cv2.GaussianBlur(np.random.RandomState(0).randint(0, 256, (80, 80)).astype(np.uint8), (5, 5), 0)
+OFFSETS = {"left_eye": (25, 30), "right_eye": (55, 30), "nose": (40, 45), "mouth_left": (28, 60), "mouth_right": (52, 60)}
+
+
+def frame(x, y=40, background=128):
+    gray = np.full((240, 320), background, dtype=np.uint8)
+    gray[y:y + 80, x:x + 80] = TEXTURE
+    return cv2.cvtColor(gray, cv2.COLOR_GRAY2RGB)
+
+
+class FaceDetector(object):
+    """
+    Finds the textured square of frame() by template matching.
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = 0
+
+    def detect(self, image):
+        self.calls += 1
+        time.sleep(self.latency)
+        gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+        _, score, _, (x, y) = cv2.minMaxLoc(cv2.matchTemplate(gray, TEXTURE, cv2.TM_CCOEFF_NORMED))
+        if score < 0.9:
+            return Detections()
+        keypoints = {name: (x + dx, y + dy) for name, (dx, dy) in OFFSETS.items()}
+        return Detections(boxes=[[x, y, 80, 80]], keypoints=[keypoints], confidences=[0.99])
+
+
+def test_slow_detector_runs_every_few_frames_and_boxes_follow_the_face():
+    # the detector takes a frame period, 4 times its budget
+    detector = FaceDetector(latency=0.01)
+    adaptive = AdaptiveDetector(detector, max_interval=8, frame_period=0.01)
+
+    for i in range(30):
+        detections = adaptive.detect(frame(20 + 2 * i))
+        x, y, w, h = detections.boxes[0]
+        assert abs(x - (20 + 2 * i)) <= 2 and abs(y - 40) <= 2
+        assert abs(detections.keypoints[0]["left_eye"][0] - (45 + 2 * i)) <= 2
+
+    assert adaptive.interval >= 3
+    assert detector.calls < 20
+    assert adaptive.propagations + adaptive.full_detections == 30
+
+
+def test_frame_period_comes_from_timestamps_not_calls():
+    adaptive = AdaptiveDetector(FaceDetector())
+    for i in range(10):
+        adaptive.detect(frame(20), timestamp=i / 10.0)
+        time.sleep(0.002)
+
+    assert adaptive._frame_time == pytest.approx(0.1)
+
+
+def test_without_frame_period_interval_only_follows_motion():
+    adaptive = AdaptiveDetector(FaceDetector(), max_interval=6)
+    for _ in range(3):
+        adaptive.detect(frame(20))
+    assert adaptive.interval == 6
+
+    for i in range(10):
+        adaptive.detect(frame(20 + 15 * i))
+    assert adaptive.interval < 6
+
+
+def test_scene_change_runs_the_detector():
+    detector = FaceDetector()
+    adaptive = AdaptiveDetector(detector, max_interval=10)
+    adaptive.detect(frame(20))
+    adaptive.detect(frame(20))
+    calls = detector.calls
+
+    adaptive.detect(frame(20, background=10))
+
+    assert detector.calls == calls + 1
+
+
+def test_batch_of_streams_bypasses_adaptation():
+    detector = FaceDetector()
+    adaptive = AdaptiveDetector(detector, max_interval=10)
+    adaptive.detect(frame(20))
+    state = (adaptive._previous_gray, adaptive._detections, adaptive.full_detections)
+
+    results = adaptive.detectBatch([frame(100), frame(20), frame(100)])
+
+    assert detector.calls == 4
+    assert [d.boxes[0][0] for d in results] == [100, 20, 100]
+    assert (adaptive._previous_gray, adaptive._detections, adaptive.full_detections) == state
+
+
+def test_keypoint_names():
+    assert set(KEYPOINT_NAMES) == set(OFFSETS)
+
+
+def test_interval_grows_again_after_fast_motion():
+    detector = FaceDetector()
+    adaptive = AdaptiveDetector(detector, max_interval=6)
+    for i in range(10):
+        adaptive.detect(frame(20 + 20 * i))
+    assert adaptive.interval == 1
+
+    propagations = adaptive.propagations
+    for _ in range(15):
+        adaptive.detect(frame(200))
+
+    assert adaptive.propagations > propagations
+    assert adaptive.interval == 6
+
+
+def test_face_recognition_system_forwards_capture_timestamps():
+    from frsystem.frs import FaceRecognitionSystem
+
+    frs = FaceRecognitionSystem(detection_cache_size=0)
+    frs.detector = AdaptiveDetector(FaceDetector())
+    for i in range(5):
+        boxes, _ = frs.detectFaces(frame(20), timestamp=i / 25.0)
+        assert boxes[0][:2] == [20, 40]
+
+    assert frs.detector._frame_time == pytest.approx(0.04)
@@ -0,0 +1,178 @@
+import pickle
+import threading
+
+import numpy as np
+import pytest
+
+from frsystem.classifier import IncrementalFaceClassifier, embeddingsVersion
+from frsystem.models import faceClassifier
+
+
+def people(n_people=4, per_person=3, dim=16, seed=0):
+    rng = np.random.RandomState(seed)
+    centers = rng.randn(n_people, dim)
+    return {ref_id + 1: [centers[ref_id] + 0.05 * rng.randn(dim) for _ in range(per_person)]
+            for ref_id in range(n_people)}
+
+
+def test_update_matches_fit_on_everything():
+    embeddings = people()
+    clf = IncrementalFaceClassifier(scale=10.0, retrain_fraction=100.0).fit({1: embeddings[1][:1], 3: embeddings[3]})
+
+    # new embeddings of a known person and two new people, one before the known ones
+    assert clf.update(embeddings) == 12 - 4
+    expected = IncrementalFaceClassifier(scale=10.0).fit(embeddings)
+
+    np.testing.assert_array_equal(clf.classes_, [1, 2, 3, 4])
+    np.testing.assert_allclose(clf.sums, expected.sums)
+    np.testing.assert_allclose(clf._prototypes, expected._prototypes)
+    assert clf.counts == expected.counts
+    assert clf.version == embeddingsVersion(embeddings)
+    assert clf.update(embeddings) == 0
+
+
+def test_update_from_empty_classifier():
+    embeddings = people()
+    clf = IncrementalFaceClassifier(scale=10.0, retrain_fraction=100.0)
+    assert clf.update(embeddings) == 12
+    assert clf.retrains == 0
+    np.testing.assert_array_equal(clf.predict(np.array([embeddings[ref_id][0] for ref_id in (1, 2, 3, 4)])), [1, 2, 3, 4])
+
+
+def test_update_keeps_served_prototypes_intact():
+    embeddings = people()
+    clf = IncrementalFaceClassifier(scale=10.0).fit({ref_id: embeddings[ref_id][:2] for ref_id in embeddings})
+    served = clf._prototypes
+    before = served.copy()
+    clf.update(embeddings)
+    clf.wait(5)
+    np.testing.assert_array_equal(served, before)
+    assert clf._prototypes is not served
+
+
+def test_drifted():
+    embeddings = people()
+    clf = IncrementalFaceClassifier(retrain_fraction=0.25).fit(embeddings)
+    assert not clf.drifted(embeddings)
+
+    removed = dict(embeddings)
+    removed[2] = removed[2][:1]
+    assert clf.drifted(removed)
+
+    deleted = {ref_id: embed_list for ref_id, embed_list in embeddings.items() if ref_id != 4}
+    assert clf.drifted(deleted)
+
+    grown = dict(embeddings)
+    grown[5] = [np.ones(16)] * 3
+    assert not clf.drifted(grown)
+    grown[6] = [np.ones(16)] * 3
+    assert clf.drifted(grown)
+
+
+def test_update_retrains_when_drifted():
+    embeddings = people()
+    clf = IncrementalFaceClassifier(scale=10.0).fit(embeddings)
+    removed = dict(embeddings)
+    removed[2] = removed[2][:1]
+
+    clf.update(removed, background=False)
+    assert clf.retrains == 2
+    assert clf.counts[2] == 1
+    np.testing.assert_allclose(clf.sums, IncrementalFaceClassifier(scale=10.0).fit(removed).sums)
+
+
+def test_background_retraining_adds_embeddings_enrolled_meanwhile(monkeypatch):
+    embeddings = people(n_people=6)
+    clf = IncrementalFaceClassifier(scale=10.0).fit({ref_id: embeddings[ref_id] for ref_id in (1, 2)})
+
+    started, release = threading.Event(), threading.Event()
+    fit = IncrementalFaceClassifier.fit
+
+    def slowFit(self, embeddings_dict):
+        started.set()
+        release.wait(5)
+        return fit(self, embeddings_dict)
+
+    monkeypatch.setattr(IncrementalFaceClassifier, "fit", slowFit)
+    live = {ref_id: list(embeddings[ref_id]) for ref_id in (1, 2, 3, 4)}
+    clf.update(live)
+    assert started.wait(5)
+    # the current classifier keeps serving and learns incrementally
+    np.testing.assert_array_equal(clf.classes_, [1, 2, 3, 4])
+
+    live[5] = list(embeddings[5])
+    clf.update(live)
+    # the background thread must not read the live mapping
+    live[6] = list(embeddings[6])
+    release.set()
+    clf.wait(5)
+
+    assert clf._retraining is None
+    np.testing.assert_array_equal(clf.classes_, [1, 2, 3, 4, 5])
+    assert clf.retrains == 2
+    expected = fit(IncrementalFaceClassifier(scale=10.0), {ref_id: embeddings[ref_id] for ref_id in (1, 2, 3, 4, 5)})
+    np.testing.assert_allclose(clf.sums, expected.sums)
+
+
+def test_pickle_roundtrip(tmp_path):
+    path = str(tmp_path / "clf.pkl")
+    embeddings = people()
+    clf = IncrementalFaceClassifier(path=path).fit(embeddings)
+    clf.save()
+    with open(path, "rb") as f:
+        loaded = pickle.load(f)
+
+    X = np.array([embed_list[0] for embed_list in embeddings.values()])
+    np.testing.assert_allclose(loaded.predict_proba(X), clf.predict_proba(X))
+    assert loaded._retraining is None and loaded._pending is None
+
+
+def legacyClassifier(path, embeddings):
+    from sklearn.linear_model import LogisticRegression
+
+    X = np.array([e for embed_list in embeddings.values() for e in embed_list])
+    y = [ref_id for ref_id, embed_list in embeddings.items() for _ in embed_list]
+    legacy = LogisticRegression().fit(X, y)
+    legacy.marker = "legacy"
+    with open(path, "wb") as f:
+        pickle.dump(legacy, f)
+
+
+def test_unversioned_classifier_of_the_same_people_is_stamped(tmp_path):
+    pytest.importorskip("sklearn")
+    path = str(tmp_path / "clf.pkl")
+    embeddings = people()
+    legacyClassifier(path, embeddings)
+
+    clf = faceClassifier(embeddings_dict=embeddings, path=path)
+    assert clf.marker == "legacy"
+    assert clf.embeddings_version_ == embeddingsVersion(embeddings)
+    # stamped on disk
+    with open(path, "rb") as f:
+        assert pickle.load(f).embeddings_version_ == embeddingsVersion(embeddings)
+
+
+def test_unversioned_classifier_missing_people_is_retrained(tmp_path):
+    pytest.importorskip("sklearn")
+    path = str(tmp_path / "clf.pkl")
+    embeddings = people()
+    legacyClassifier(path, {ref_id: embeddings[ref_id] for ref_id in (1, 2, 3)})
+
+    clf = faceClassifier(embeddings_dict=embeddings, path=path)
+    assert not hasattr(clf, "marker")
+    np.testing.assert_array_equal(clf.classes_, [1, 2, 3, 4])
+    assert clf.embeddings_version_ == embeddingsVersion(embeddings)
+    assert faceClassifier(embeddings_dict=embeddings, path=path).embeddings_version_ == clf.embeddings_version_
+
+
+def test_predict_with_classes_is_one_snapshot():
+    embeddings = people()
+    clf = IncrementalFaceClassifier(scale=10.0, retrain_fraction=100.0).fit({ref_id: embeddings[ref_id] for ref_id in (2, 3, 4)})
+    X = np.array([embeddings[3][0]])
+    classes, probabilities = clf.predictWithClasses(X)
+
+    # a person inserted before the known ones shifts the columns of later calls only
+    clf.update(embeddings)
+    np.testing.assert_array_equal(classes, [2, 3, 4])
+    assert classes[np.argmax(probabilities)] == 3
+    assert clf.predict(X)[0] == 3
@@ -0,0 +1,93 @@
+import os
+import pickle
+
+import cv2
+import numpy as np
+import pytest
+
+from frsystem.frs import Database, FaceRecognitionSystem
+
+
+@pytest.fixture(params=["pickle", "store"])
+def database(request, tmp_path):
+    if request.param == "pickle":
+        return Database(db_file=str(tmp_path / "db.pkl"), embeddings_file=str(tmp_path / "embeddings.pkl"))
+    return Database(store=str(tmp_path / "faces"))
+
+
+def enroll(database, name, embedding):
+    ref_id = database.generateFaceID(name)
+    database.embeddings[ref_id] = list(database.embeddings.get(ref_id, [])) + [embedding]
+    database.dumpEmbeddings()
+    return ref_id
+
+
+def test_batch_commits_once_on_exit(database):
+    commits = []
+    database.addListener(lambda: commits.append(len(database.embeddings)))
+
+    with database.batch():
+        enroll(database, "alice", np.ones(4))
+        enroll(database, "bob", np.zeros(4))
+        assert commits == []
+
+    assert commits == [2]
+    assert sorted(database.db.values()) == ["alice", "bob"]
+
+
+def test_batch_rollback_on_error(database):
+    alice = enroll(database, "alice", np.ones(4))
+
+    with pytest.raises(RuntimeError):
+        with database.batch():
+            enroll(database, "alice", np.full(4, 2.0))
+            enroll(database, "bob", np.zeros(4))
+            raise RuntimeError("enrollment failed")
+
+    assert list(database.db.values()) == ["alice"]
+    assert len(database.embeddings[alice]) == 1
+    assert database.generateFaceID("bob") == alice + 1
+
+
+def test_nested_batch_rolls_back_everything(database):
+    with pytest.raises(ValueError):
+        with database.batch():
+            enroll(database, "alice", np.ones(4))
+            with database.batch():
+                enroll(database, "bob", np.zeros(4))
+            raise ValueError()
+
+    assert len(database.db) == 0
+    assert len(database.embeddings) == 0
+
+
+def test_pickle_files_written_on_commit(tmp_path):
+    db_file, embeddings_file = str(tmp_path / "db.pkl"), str(tmp_path / "embeddings.pkl")
+    database = Database(db_file=db_file, embeddings_file=embeddings_file)
+    with database.batch():
+        ref_id = enroll(database, "alice", np.ones(4))
+
+    with open(db_file, "rb") as f:
+        assert pickle.load(f) == {ref_id: "alice"}
+    reopened = Database(db_file=db_file, embeddings_file=embeddings_file)
+    np.testing.assert_array_equal(reopened.embeddings[ref_id][0], np.ones(4))
+
+
+def test_add_faces_skips_unreadable_images_and_commits_per_people(tmp_path, monkeypatch):
+    base = tmp_path / "faces"
+    for name in ("alice", "bob", "carol"):
+        (base / name).mkdir(parents=True)
+        cv2.imwrite(str(base / name / "1.png"), np.zeros((8, 8, 3), dtype=np.uint8))
+    (base / "bob" / "2.png").write_bytes(b"not an image")
+
+    frs = FaceRecognitionSystem(db_file=str(tmp_path / "db.pkl"), embeddings_file=str(tmp_path / "embeddings.pkl"))
+    monkeypatch.setattr(frs, "detectFaces", lambda image: ([[0, 0, 8, 8]], [{}]))
+    monkeypatch.setattr(frs, "faceEmbeddings", lambda image, **kwargs: [np.ones(4)])
+    commits = []
+    frs.connection.addListener(lambda: commits.append(sorted(frs.db.values())))
+
+    errors = frs.addFacesUsingLoop(str(base), commit_every=2)
+
+    assert [os.path.basename(path) for path, _ in errors] == ["2.png"]
+    assert commits == [["alice", "bob"], ["alice", "bob", "carol"]]
+    assert all(len(embed_list) == 1 for embed_list in frs.embeddings.values())
@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+
+from frsystem.detection import DetectionCache, Detections
+
+
+class CountingDetector(object):
+
+    def __init__(self):
+        self.images = 0
+
+    def __call__(self, image):
+        self.images += 1
+        return Detections(boxes=[[int(image[0, 0, 0]), 0, 4, 4]])
+
+    def batch(self, images):
+        return [self(image) for image in images]
+
+
+def image(value):
+    return np.full((8, 8, 3), value, dtype=np.uint8)
+
+
+def test_same_content_is_detected_once():
+    cache, detect = DetectionCache(maxsize=2), CountingDetector()
+
+    first = cache.get(image(1), detect)
+    second = cache.get(image(1), detect)
+
+    assert first is second
+    assert detect.images == 1
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache, detect = DetectionCache(maxsize=2), CountingDetector()
+    for value in (1, 2, 1, 3):
+        cache.get(image(value), detect)
+
+    cache.get(image(1), detect)
+    assert detect.images == 3
+    cache.get(image(2), detect)
+    assert detect.images == 4
+
+
+def test_identity_key_misses_modified_copies():
+    cache, detect = DetectionCache(key="identity"), CountingDetector()
+    frame = image(1)
+    cache.get(frame, detect)
+    cache.get(frame, detect)
+    cache.get(frame.copy(), detect)
+
+    assert detect.images == 2
+
+
+def test_batch_only_detects_missing_images():
+    cache, detect = DetectionCache(maxsize=4), CountingDetector()
+    cache.get(image(1), detect)
+
+    results = cache.getBatch([image(1), image(2), image(3)], detect.batch)
+
+    assert [d.boxes[0][0] for d in results] == [1, 2, 3]
+    assert detect.images == 3
+    assert cache.hits == 1
+
+
+def test_disabled_cache_and_invalid_key():
+    cache, detect = DetectionCache(maxsize=0), CountingDetector()
+    cache.get(image(1), detect)
+    cache.get(image(1), detect)
+    assert detect.images == 2
+
+    with pytest.raises(AttributeError):
+        DetectionCache(key="name")
+
+
+def test_detections_from_mtcnn():
+    keypoints = {"left_eye": (1, 2), "right_eye": (3, 2), "nose": (2, 3), "mouth_left": (1, 4), "mouth_right": (3, 4)}
+    detections = Detections.fromMTCNN([{"box": [0, 0, 5, 5], "keypoints": keypoints, "confidence": 0.99}])
+
+    assert len(detections) == 1
+    assert detections.features == [{"left_eye": (1, 2), "right_eye": (3, 2), "nose": (2, 3)}]
@@ -0,0 +1,57 @@
+import cv2
+import numpy as np
+import pytest
+
+from frsystem.detectors import createDetector, fivePointLandmarks, LANDMARK_TEMPLATE
+from conftest import writeConstantDetector
+
+# two overlapping faces, a separate one and a background box, in corner form relative to the frame
+CONFIDENCES = [[0.1, 0.9], [0.2, 0.8], [0.05, 0.95], [0.9, 0.1]]
+BOXES = [[0.10, 0.10, 0.40, 0.50], [0.12, 0.12, 0.42, 0.52], [0.60, 0.20, 0.90, 0.70], [0.0, 0.0, 1.0, 1.0]]
+
+
+@pytest.fixture
+def detector_path(tmp_path):
+    pytest.importorskip("onnxruntime")
+    path = str(tmp_path / "detector.onnx")
+    writeConstantDetector(path, CONFIDENCES, BOXES)
+    return path
+
+
+def test_ultralight_detector(detector_path):
+    detector = createDetector("ultralight", path=detector_path, input_size=(64, 48), refine_eyes=False)
+    image = np.zeros((200, 300, 3), dtype=np.uint8)
+
+    detections = detector.detect(image)
+
+    assert detections.boxes == [[180, 40, 90, 100], [30, 20, 90, 80]]
+    assert detections.confidences == pytest.approx([0.95, 0.9])
+    x, y, w, h = detections.boxes[0]
+    fx, fy = LANDMARK_TEMPLATE["left_eye"]
+    assert detections.keypoints[0]["left_eye"] == (int(x + fx * w), int(y + fy * h))
+
+    faces = detector.detect_faces(image)
+    assert [face["box"] for face in faces] == detections.boxes
+
+
+def test_eye_refinement_finds_dark_pupils():
+    gray = np.full((200, 200), 200, dtype=np.uint8)
+    box = (50, 50, 100, 100)
+    template = fivePointLandmarks(gray, box, refine_eyes=False)
+    pupils = {"left_eye": (template["left_eye"][0] + 4, template["left_eye"][1] - 3),
+              "right_eye": (template["right_eye"][0] - 5, template["right_eye"][1] + 2)}
+    for center in pupils.values():
+        cv2.circle(gray, center, 2, 0, -1)
+
+    keypoints = fivePointLandmarks(gray, box)
+
+    for name, (px, py) in pupils.items():
+        assert abs(keypoints[name][0] - px) <= 1 and abs(keypoints[name][1] - py) <= 1
+    assert keypoints["nose"] == template["nose"]
+    # no dark spot: the template is kept
+    assert fivePointLandmarks(np.full((200, 200), 200, dtype=np.uint8), box) == template
+
+
+def test_invalid_detector():
+    with pytest.raises(AttributeError):
+        createDetector("haar")
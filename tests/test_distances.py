@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+from frsystem.helper import pairwiseDistances, getEmbeddingsList
+from frsystem.frs import FaceRecognitionSystem
+
+
+@pytest.fixture
+def data():
+    rng = np.random.RandomState(0)
+    return rng.randn(5, 32), rng.randn(40, 32)
+
+
+def test_euclidian_matches_naive(data):
+    queries, known = data
+    expected = np.linalg.norm(queries[:, None, :] - known[None, :, :], axis=2)
+    np.testing.assert_allclose(pairwiseDistances(queries, known), expected, rtol=1e-6, atol=1e-6)
+
+
+def test_cosine_matches_naive(data):
+    queries, known = data
+    expected = 1 - (queries @ known.T) / np.outer(np.linalg.norm(queries, axis=1), np.linalg.norm(known, axis=1))
+    np.testing.assert_allclose(pairwiseDistances(queries, known, distance="cosine"), expected, rtol=1e-6, atol=1e-6)
+
+
+@pytest.mark.parametrize("distance", ["euclidian", "cosine"])
+def test_chunks_and_cached_norms_give_same_result(data, distance):
+    queries, known = data
+    full = pairwiseDistances(queries, known, distance=distance)
+    chunked = pairwiseDistances(queries, known, distance=distance,
+                                norms=np.linalg.norm(known, axis=1), chunk_size=7)
+    np.testing.assert_allclose(chunked, full, rtol=1e-6, atol=1e-6)
+
+
+def test_float32_inputs_stay_float32(data):
+    queries, known = data
+    assert pairwiseDistances(queries.astype(np.float32), known.astype(np.float32)).dtype == np.float32
+
+
+def test_empty_inputs():
+    assert pairwiseDistances(np.zeros((3, 8)), np.empty((0, 8))).shape == (3, 0)
+    assert FaceRecognitionSystem.faceDistance(np.zeros(8), []).shape == (0,)
+
+
+def test_invalid_distance(data):
+    with pytest.raises(AttributeError):
+        pairwiseDistances(*data, distance="manhattan")
+
+
+def test_face_distance_and_compare_faces(data):
+    queries, known = data
+    single = FaceRecognitionSystem.faceDistance(queries[0], known)
+    np.testing.assert_allclose(single, FaceRecognitionSystem.faceDistances(queries, known)[0])
+    matches = FaceRecognitionSystem.compareFaces(None, None, distances=single, threshold=float(np.median(single)))
+    assert sum(matches) == np.sum(single <= np.median(single))
+
+
+def test_embeddings_list_flattens_dictionary():
+    embeddings, ids = getEmbeddingsList({1: [np.zeros(2), np.ones(2)], 2: [np.ones(2)]})
+    assert ids == [1, 1, 2]
+    assert len(embeddings) == 3
@@ -0,0 +1,50 @@
+import json
+import sys
+
+from frsystem import enroll
+
+
+def test_list_images_skips_hidden_files(tmp_path):
+    for path in ("bob/1.jpg", "alice/2.jpg", "alice/1.jpg", "alice/.DS_Store", ".cache/1.jpg"):
+        (tmp_path / path).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / path).write_bytes(b"")
+
+    tasks = enroll.listImages(str(tmp_path))
+
+    assert [(path[len(str(tmp_path)) + 1:], name) for path, name in tasks] == \
+        [("alice/1.jpg", "alice"), ("alice/2.jpg", "alice"), ("bob/1.jpg", "bob")]
+
+
+def test_checkpoint_retries_errors_and_ignores_torn_record(tmp_path):
+    checkpoint = tmp_path / "checkpoint.jsonl"
+    records = [{"path": "a.jpg", "status": "ok"},
+               {"path": "b.jpg", "status": "no_face"},
+               {"path": "c.jpg", "status": "error"}]
+    checkpoint.write_text("".join(json.dumps(r) + "\n" for r in records) + '{"path": "d.j')
+
+    assert enroll._readCheckpoint(str(checkpoint)) == {"a.jpg", "b.jpg"}
+    assert enroll._readCheckpoint(str(tmp_path / "missing.jsonl")) == set()
+
+
+def test_onnx_worker_does_not_import_tensorflow(monkeypatch):
+    monkeypatch.setattr(enroll, "_worker_frs", None)
+    kwargs = {"embedding_model": "facenet", "weights": "model.onnx", "engine": "onnx",
+              "interpolation": "area", "max_batch": 0, "intra_op_threads": 1}
+
+    enroll._initWorker(kwargs, threads_per_worker=1)
+
+    assert "tensorflow" not in sys.modules
+    assert enroll._worker_frs.engine == "onnx"
+    assert enroll._worker_frs.interpolation == "area"
+    assert enroll._worker_frs.max_batch == 0
+
+
+def test_parallel_enrollment_keeps_commit_every(tmp_path, monkeypatch):
+    from frsystem.frs import FaceRecognitionSystem
+
+    calls = []
+    monkeypatch.setattr(enroll, "enrollParallel", lambda frs, base, **kwargs: calls.append(kwargs) or [])
+    frs = FaceRecognitionSystem(db_file=str(tmp_path / "db.pkl"), embeddings_file=str(tmp_path / "embeddings.pkl"))
+
+    assert frs.addFacesUsingLoop(str(tmp_path), workers=2, checkpoint="ckpt.jsonl", commit_every=7) == []
+    assert calls == [{"workers": 2, "checkpoint": "ckpt.jsonl", "commit_every": 7}]
@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+from frsystem.gallery import GalleryIndex
+
+
+def bruteForce(matrix, ids, queries, k):
+    dist = np.linalg.norm(queries[:, None, :] - matrix[None, :, :], axis=2)
+    order = np.argsort(dist, axis=1, kind="stable")[:, :k]
+    return ids[order], np.take_along_axis(dist, order, axis=1)
+
+
+def embeddingsDict(rng, n_people=20, per_person=3, dim=16):
+    return {ref_id: [rng.randn(dim).astype(np.float32) for _ in range(per_person)]
+            for ref_id in range(1, n_people + 1)}
+
+
+def test_search_matches_brute_force():
+    rng = np.random.RandomState(0)
+    index = GalleryIndex(embeddingsDict(rng))
+    queries = rng.randn(7, 16).astype(np.float32)
+
+    ids, dist = index.search(queries, k=5)
+    expected_ids, expected_dist = bruteForce(index.matrix, index.ids, queries, 5)
+
+    assert ids.shape == (7, 5)
+    np.testing.assert_array_equal(ids, expected_ids)
+    np.testing.assert_allclose(dist, expected_dist, rtol=1e-4, atol=1e-4)
+
+
+def test_single_query_and_k_larger_than_gallery():
+    rng = np.random.RandomState(1)
+    index = GalleryIndex(embeddingsDict(rng, n_people=2, per_person=1))
+
+    ids, dist = index.search(index.matrix[1], k=10)
+
+    assert ids.shape == (1, 2)
+    assert ids[0, 0] == index.ids[1]
+    assert dist[0, 0] == pytest.approx(0.0, abs=1e-3)
+    assert dist[0, 0] <= dist[0, 1]
+
+
+def test_empty_gallery():
+    index = GalleryIndex()
+    ids, dist = index.search(np.zeros((3, 16), dtype=np.float32), k=1)
+    assert len(index) == 0
+    assert ids.shape == (3, 0) and dist.shape == (3, 0)
+
+
+def test_cosine_distance():
+    index = GalleryIndex({1: [np.array([1.0, 0.0])], 2: [np.array([0.0, 1.0])]}, distance="cosine")
+    ids, dist = index.search(np.array([[2.0, 0.1]]), k=2)
+    assert ids[0].tolist() == [1, 2]
+    assert dist[0, 0] < dist[0, 1]
+
+
+def test_invalid_distance():
+    with pytest.raises(AttributeError):
+        GalleryIndex(distance="manhattan")
@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+
+from frsystem.frs import FaceRecognitionSystem
+
+
+class FixedClassifier(object):
+    """
+    Classifier returning the same probabilities for every face.
+    """
+
+    def __init__(self, probabilities, classes):
+        self.probabilities = np.asarray(probabilities, dtype=np.float64)
+        self.classes_ = np.asarray(classes)
+        self.calls = []
+
+    def predict_proba(self, X):
+        self.calls.append(len(X))
+        return np.tile(self.probabilities, (len(X), 1))
+
+
+@pytest.fixture
+def frs(tmp_path, monkeypatch):
+    frs = FaceRecognitionSystem(db_file=str(tmp_path / "db.pkl"), embeddings_file=str(tmp_path / "embeddings.pkl"))
+    frs.db = {3: "alice", 7: "bob"}
+    embedded = []
+    monkeypatch.setattr(frs, "faceEmbeddings",
+                        lambda image, face_locations, facial_features: embedded.append(len(facial_features))
+                        or [np.ones(4) for _ in facial_features])
+    frs.embedded = embedded
+    return frs
+
+
+def test_identify_people_in_one_call(frs):
+    frs.face_classifier = FixedClassifier([0.2, 0.8], [3, 7])
+    people = frs.identifyPeople(None, ([[0, 0, 8, 8]] * 3, [{}] * 3))
+
+    assert [person["name"] for person in people] == ["bob"] * 3
+    assert [person["id"] for person in people] == [7] * 3
+    assert frs.embedded == [3] and frs.face_classifier.calls == [3]
+
+
+def test_identify_people_below_threshold(frs):
+    frs.face_classifier = FixedClassifier([0.45, 0.55], [3, 7])
+    person = frs.identifyPeople(None, ([[0, 0, 8, 8]], [{}]), threshold=0.6)[0]
+    assert person["id"] is None and person["name"] == "Unknown"
+    assert person["probability"] == pytest.approx(0.55)
+
+
+def test_identify_person(frs):
+    frs.face_classifier = FixedClassifier([0.9, 0.1], [3, 7])
+    assert frs.identifyPerson(None, [[0, 0, 8, 8]], [{}]) == "alice 90.00%"
+
+    frs.face_classifier = FixedClassifier([0.4, 0.6], [3, 7])
+    assert frs.identifyPerson(None, [[0, 0, 8, 8]], [{}]) == "bob 60.00%"
+
+
+def test_identify_without_faces(frs):
+    frs.face_classifier = FixedClassifier([0.9, 0.1], [3, 7])
+    assert frs.identifyPeople(None, ([], [])) == []
+    assert frs.identifyPerson(None, [], []) == "Unknown"
+    assert frs.identifyPerson(None, np.empty((0, 4)), []) == "Unknown"
+    assert frs.embedded == [] and frs.face_classifier.calls == []
+
+
+def test_identify_people_with_classifier_updated_meanwhile(frs):
+    from frsystem.classifier import IncrementalFaceClassifier
+
+    clf = IncrementalFaceClassifier(scale=10.0, retrain_fraction=100.0).fit({7: [np.ones(4)], 9: [-np.ones(4)]})
+    predict = clf.predictWithClasses
+
+    def predictThenEnroll(X):
+        result = predict(X)
+        # another thread enrolls a person whose column comes first
+        clf.update({3: [np.array([1.0, -1.0, 1.0, -1.0])], 7: [np.ones(4)], 9: [-np.ones(4)]})
+        return result
+
+    clf.predictWithClasses = predictThenEnroll
+    frs.face_classifier = clf
+    person = frs.identifyPeople(None, ([[0, 0, 8, 8]], [{}]))[0]
+
+    assert person["id"] == 7 and person["name"] == "bob"
@@ -0,0 +1,38 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+HEAVY_MODULES = ("tensorflow", "keras", "mtcnn", "sklearn", "onnxruntime", "onnx", "keras2onnx")
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def loadedModules(statement):
+    code = "import sys, json\n{}\nprint(json.dumps(sorted(m for m in sys.modules if m.split('.')[0] in {!r})))".format(
+        statement, HEAVY_MODULES)
+    output = subprocess.run([sys.executable, "-c", code], cwd=ROOT, check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+@pytest.mark.parametrize("statement", [
+    "import frsystem",
+    "from frsystem.frs import FaceRecognitionSystem, Database",
+    "import frsystem.mask, frsystem.quantize, frsystem.enroll, frsystem.streams",
+])
+def test_import_loads_no_model_framework(statement):
+    assert loadedModules(statement) == []
+
+
+
+@pytest.mark.parametrize("app", ["face_recognizer", "mask_recognizer", "mask_face_recognizer"])
+def test_app_import_loads_no_model_framework(app):
+    # models, and TensorFlow with them, are loaded when the app starts using them
+    assert loadedModules("import frsapp.{}".format(app)) == []
+
+def test_system_without_models_loads_no_model_framework(tmp_path):
+    statement = ("from frsystem import FaceRecognitionSystem\n"
+                 "frs = FaceRecognitionSystem(embedding_model='facenet', db_file={!r}, embeddings_file={!r})\n"
+                 "frs.connection.generateFaceID('alice')").format(str(tmp_path / "db.pkl"), str(tmp_path / "embeddings.pkl"))
+    assert loadedModules(statement) == []
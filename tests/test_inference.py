@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+from frsystem.frs import FaceRecognitionSystem
+from frsystem.inference import BucketedPredictor, batchBuckets
+
+
+class RecordingModel(object):
+    """
+    Embedding model returning the mean of every face, recording the batch sizes it sees.
+    """
+
+    def __init__(self):
+        self.batch_sizes = []
+
+    def __call__(self, faces):
+        self.batch_sizes.append(faces.shape[0])
+        return faces.reshape(faces.shape[0], -1).mean(axis=1, keepdims=True)
+
+
+def faces(n, size=4, seed=0):
+    return np.random.RandomState(seed).randn(n, size, size, 3).astype(np.float32)
+
+
+def test_buckets():
+    assert batchBuckets(1) == [1]
+    assert batchBuckets(32) == [1, 2, 4, 8, 16, 32]
+    assert batchBuckets(20) == [1, 2, 4, 8, 16, 32]
+
+
+@pytest.mark.parametrize("n", [1, 2, 3, 5, 8, 9, 17, 40])
+def test_padding_does_not_change_embeddings(n):
+    model = RecordingModel()
+    predictor = BucketedPredictor(model, 4, max_batch=16)
+    # a previous bigger call leaves stale rows in the buffers
+    predictor(faces(16, seed=1))
+    batch = faces(n)
+
+    embeddings = predictor(batch)
+
+    np.testing.assert_allclose(embeddings, model(batch), rtol=1e-6)
+    assert all(size in predictor.buckets for size in model.batch_sizes[:-1])
+
+
+def test_batches_are_padded_to_buckets_and_split():
+    model = RecordingModel()
+    predictor = BucketedPredictor(model, 4, max_batch=8)
+
+    predictor(faces(3))
+    predictor(faces(19))
+
+    assert model.batch_sizes == [4, 8, 8, 4]
+    assert predictor.padded == 1 + 1
+    assert predictor.calls == 2
+    assert predictor(faces(0)).shape[0] == 0
+
+
+def test_warmup_and_stats():
+    predictor = BucketedPredictor(RecordingModel(), 4, max_batch=4)
+
+    timings = predictor.warmup(repeat=3)
+
+    assert sorted(timings) == [1, 2, 4]
+    stats = predictor.stats()
+    assert stats[4]["calls"] == 2 and stats[4]["p50_ms"] is not None
+    assert "batch   2" in predictor.summary()
+
+
+def test_onnx_engine_runs_exact_batches(embedding_model):
+    path, _ = embedding_model
+    frs = FaceRecognitionSystem(embedding_model="facenet", weights=path, engine="onnx", max_batch=32)
+
+    assert not isinstance(frs.predictor, BucketedPredictor)
+    assert frs.predictor(np.zeros((3, 160, 160, 3), dtype=np.float32)).shape == (3, 128)
@@ -0,0 +1,80 @@
+import cv2
+import numpy as np
+import pytest
+
+from conftest import writeLinearModel
+from frsystem.mask import clampBox, cropFace, MaskClassifier
+
+
+@pytest.fixture
+def mask_model(tmp_path):
+    pytest.importorskip("onnxruntime")
+    path = str(tmp_path / "mask.onnx")
+    return path, writeLinearModel(path, 299, 2, softmax=True)
+
+
+def frame(height=120, width=160, seed=0):
+    return np.random.RandomState(seed).randint(0, 256, (height, width, 3)).astype(np.uint8)
+
+
+def test_clamp_box():
+    assert clampBox((10, 20, 30, 40), (120, 160)) == (10, 20, 40, 60)
+    assert clampBox((-5, -8, 30, 40), (120, 160)) == (0, 0, 25, 32)
+    assert clampBox((150, 100, 30, 40), (120, 160)) == (150, 100, 159, 119)
+
+
+def test_crop_face_margin_clamped_to_image():
+    image = frame()
+    np.testing.assert_array_equal(cropFace(image, (40, 30, 20, 10), margin=5), image[25:45, 35:65])
+    np.testing.assert_array_equal(cropFace(image, (2, 3, 20, 10), margin=5), image[0:18, 0:27])
+    np.testing.assert_array_equal(cropFace(image, (150, 110, 20, 20), margin=5), image[105:120, 145:160])
+    assert cropFace(image, (200, 200, 10, 10), margin=5).size == 0
+
+
+def test_preprocess(mask_model):
+    image = frame()
+    classifier = MaskClassifier(mask_model[0])
+    batch = classifier.preprocess([image], [[(40, 30, 20, 10), (500, 500, 10, 10)]])
+
+    assert batch.shape == (2, 299, 299, 3) and batch.dtype == np.float32
+    expected = cv2.resize(cropFace(image, (40, 30, 20, 10), 20), (299, 299)) / 127.5 - 1.0
+    np.testing.assert_allclose(batch[0], expected, atol=1e-5)
+    # a box outside of the image gives a blank face
+    assert np.all(batch[1] == -1.0)
+
+
+def test_predict_batch_splits_per_image(mask_model):
+    path, reference = mask_model
+    images = [frame(seed=0), frame(seed=1), frame(seed=2)]
+    boxes_list = [[(10, 10, 40, 40), (80, 30, 50, 60)], [], [(0, 0, 160, 120)]]
+    classifier = MaskClassifier(path)
+
+    expected = reference(classifier.preprocess(images, boxes_list).copy())
+    scores = classifier.predictBatch(images, boxes_list)
+
+    assert [s.shape for s in scores] == [(2, 2), (0, 2), (1, 2)]
+    np.testing.assert_allclose(np.concatenate(scores), expected, atol=1e-5)
+    np.testing.assert_allclose(classifier.predict(images[2], boxes_list[2]), expected[2:], atol=1e-5)
+
+
+def test_predict_without_faces(mask_model):
+    classifier = MaskClassifier(mask_model[0])
+    scores = classifier.predictBatch([frame(), frame()], [[], []])
+
+    assert len(scores) == 2
+    assert all(s.shape == (0, 2) for s in scores)
+    assert classifier.predict(frame(), []).shape == (0, 2)
+
+
+def test_buffer_grows_and_is_reused(mask_model):
+    classifier = MaskClassifier(mask_model[0])
+    image = frame()
+    classifier.predict(image, [(10, 10, 40, 40)] * 3)
+    buffer = classifier._batch
+    classifier.predict(image, [(10, 10, 40, 40)] * 2)
+    assert classifier._batch is buffer and buffer.shape[0] == 3
+
+
+def test_invalid_engine(mask_model):
+    with pytest.raises(AttributeError):
+        MaskClassifier(mask_model[0], engine="torch")
@@ -0,0 +1,126 @@
+import threading
+from urllib.request import urlopen
+from urllib.error import HTTPError
+
+import pytest
+
+from frsystem.metrics import Metrics, NULL_METRICS, PrometheusExporter, LogSummary
+
+
+def test_prometheus_text_format():
+    metrics = Metrics(prefix="test")
+    metrics.increment("frames")
+    metrics.increment("frames", 2)
+    metrics.observe("faces_per_frame", 3)
+    for latency in (0.002, 0.02, 7.0):
+        metrics.observe("detection_seconds", latency)
+    metrics.register(lambda m: m.gauge("queue_depth", 4))
+
+    lines = metrics.prometheus().splitlines()
+
+    assert "# TYPE test_frames_total counter" in lines
+    assert "test_frames_total 3" in lines
+    assert "test_queue_depth 4" in lines
+    assert "# TYPE test_detection_seconds histogram" in lines
+    # cumulative buckets
+    assert 'test_detection_seconds_bucket{le="0.001"} 0' in lines
+    assert 'test_detection_seconds_bucket{le="0.0025"} 1' in lines
+    assert 'test_detection_seconds_bucket{le="0.025"} 2' in lines
+    assert 'test_detection_seconds_bucket{le="5.0"} 2' in lines
+    assert 'test_detection_seconds_bucket{le="+Inf"} 3' in lines
+    assert "test_detection_seconds_count 3" in lines
+    # count histograms get count buckets
+    assert 'test_faces_per_frame_bucket{le="4"} 1' in lines
+
+
+def test_timer_and_snapshot():
+    metrics = Metrics()
+    with metrics.timer("alignment"):
+        pass
+
+    snapshot = metrics.snapshot()
+
+    histogram = snapshot["histograms"]["alignment_seconds"]
+    assert histogram["count"] == 1
+    assert histogram["p50"] == pytest.approx(histogram["sum"])
+    assert "alignment: 1 calls" in metrics.summary()
+
+
+def test_null_metrics_do_nothing():
+    with NULL_METRICS.timer("detection"):
+        NULL_METRICS.observe("detection_seconds", 1.0)
+        NULL_METRICS.increment("frames")
+    assert not NULL_METRICS.enabled
+
+
+def test_exporter_serves_metrics():
+    metrics = Metrics()
+    metrics.increment("frames")
+    exporter = metrics.addSink(PrometheusExporter(metrics, port=0))
+    try:
+        body = urlopen("http://127.0.0.1:{}/metrics".format(exporter.port), timeout=5).read().decode("utf-8")
+        assert "frs_frames_total 1" in body
+        with pytest.raises(HTTPError):
+            urlopen("http://127.0.0.1:{}/other".format(exporter.port), timeout=5)
+    finally:
+        metrics.close()
+    assert exporter.server is None
+
+
+def test_log_summary_writes_periodically():
+    metrics = Metrics()
+    written = threading.Event()
+    summaries = []
+
+    def write(text):
+        summaries.append(text)
+        written.set()
+
+    metrics.addSink(LogSummary(metrics, interval=0.01, write=write))
+    assert written.wait(2)
+    metrics.close()
+
+    assert summaries[0].startswith("metrics after")
+
+
+def test_collected_totals_are_exported_as_counters():
+    import numpy as np
+    from frsystem.pipeline import Pipeline
+
+    metrics = Metrics(prefix="test")
+    pipeline = Pipeline(lambda image: None, render=lambda image, results: image, metrics=metrics)
+    pipeline.captured = 12
+    for _ in range(3):
+        pipeline.inference_queue.put(np.zeros(1))
+
+    lines = metrics.prometheus().splitlines()
+
+    assert "# TYPE test_frames_captured_total counter" in lines
+    assert "test_frames_captured_total 12" in lines
+    assert "test_frames_dropped_total 2" in lines
+    assert "# TYPE test_inference_queue_depth gauge" in lines
+    NULL_METRICS.total("frames_captured", 12)
+
+
+def test_faces_per_frame_counted_once_per_detected_frame():
+    import numpy as np
+    from frsystem.detection import Detections
+    from frsystem.frs import FaceRecognitionSystem
+
+    class Detector(object):
+        def detect(self, image):
+            keypoints = dict.fromkeys(("left_eye", "right_eye", "nose", "mouth_left", "mouth_right"), (2, 2))
+            return Detections(boxes=[[0, 0, 4, 4]], keypoints=[keypoints], confidences=[0.9])
+
+        def detectBatch(self, images):
+            return [self.detect(image) for image in images]
+
+    metrics = Metrics()
+    frs = FaceRecognitionSystem(metrics=metrics)
+    frs.detector = Detector()
+    image, other = np.zeros((8, 8, 3), dtype=np.uint8), np.ones((8, 8, 3), dtype=np.uint8)
+    frs.detectFaces(image)
+    frs.faceLocations(image)
+    frs.detectBatch([image, other])
+
+    assert metrics.histograms["faces_per_frame"].count == 2
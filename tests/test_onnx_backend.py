@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+
+from frsystem.frs import FaceRecognitionSystem
+
+FEATURES = [{"left_eye": (60, 80), "right_eye": (110, 76), "nose": (85, 105)},
+            {"left_eye": (190, 60), "right_eye": (230, 70), "nose": (210, 85)}]
+
+
+def test_predictor_matches_reference(embedding_model):
+    from frsystem.onnx_backend import OnnxPredictor
+    path, reference = embedding_model
+    faces = np.random.RandomState(0).randn(3, 160, 160, 3)
+
+    for predictor in (OnnxPredictor(path), OnnxPredictor(path, intra_op_threads=1, inter_op_threads=2)):
+        embeddings = predictor(faces)
+        assert embeddings.dtype == np.float32
+        np.testing.assert_allclose(embeddings, reference(faces), rtol=1e-4, atol=1e-4)
+
+
+def test_onnx_engine_embeds_faces(embedding_model):
+    path, reference = embedding_model
+    frs = FaceRecognitionSystem(embedding_model="facenet", weights=path, engine="onnx")
+    image = np.random.RandomState(1).randint(0, 256, (240, 320, 3)).astype(np.uint8)
+
+    embeddings = frs.faceEmbeddings(image, face_locations=[[0, 0, 1, 1]] * 2, facial_features=FEATURES)
+    batch = frs.faceEmbeddingsBatch([image, image], [FEATURES[:1], FEATURES])
+
+    expected = reference(frs.preprocessor(image, FEATURES))
+    np.testing.assert_allclose(embeddings, expected, rtol=1e-4, atol=1e-4)
+    np.testing.assert_allclose(batch[0], expected[:1], rtol=1e-4, atol=1e-4)
+    np.testing.assert_allclose(batch[1], expected, rtol=1e-4, atol=1e-4)
+
+
+def test_invalid_engine():
+    frs = FaceRecognitionSystem(embedding_model="facenet", weights="model.onnx", engine="tflite")
+    with pytest.raises(AttributeError):
+        frs.predictor
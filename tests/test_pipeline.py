@@ -0,0 +1,126 @@
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from frsystem.pipeline import LatestQueue, Pipeline
+
+
+class FakeCapture(object):
+
+    def __init__(self, n_frames, interval=0.0):
+        self.n_frames = n_frames
+        self.interval = interval
+        self.read_frames = 0
+        self.released = False
+
+    def isOpened(self):
+        return not self.released
+
+    def read(self):
+        if self.read_frames >= self.n_frames:
+            return False, None
+        time.sleep(self.interval)
+        self.read_frames += 1
+        return True, np.full((4, 4, 3), self.read_frames, dtype=np.uint8)
+
+    def release(self):
+        self.released = True
+
+
+def test_full_queue_drops_oldest():
+    queue = LatestQueue(maxsize=2)
+    for item in range(5):
+        queue.put(item)
+
+    assert queue.dropped == 3
+    assert [queue.get(), queue.get()] == [3, 4]
+    assert queue.get(timeout=0.01) is None
+
+
+def test_close_wakes_consumer():
+    queue = LatestQueue()
+    results = []
+    consumer = threading.Thread(target=lambda: results.append(queue.get()))
+    consumer.start()
+    time.sleep(0.05)
+
+    queue.close()
+    consumer.join(timeout=1)
+
+    assert not consumer.is_alive()
+    assert results == [None]
+
+
+def test_slow_inference_only_sees_latest_frames():
+    def process(image):
+        time.sleep(0.02)
+        return int(image[0, 0, 0])
+
+    pipeline = Pipeline(process, render=lambda image, results: image)
+    capture = FakeCapture(40, interval=0.002)
+    inference = threading.Thread(target=pipeline._infer)
+    inference.start()
+
+    pipeline._capture(capture)
+    inference.join(timeout=2)
+
+    assert capture.released and pipeline.stopped.is_set()
+    assert pipeline.captured == 40
+    assert 0 < pipeline.processed < 40
+    assert pipeline.inference_queue.dropped > 0
+    frame, result = pipeline.latestResults()
+    assert result == frame.index + 1
+    stats = pipeline.stats(elapsed=1.0)
+    assert stats["captured"] == 40 and stats["inference_latency_ms"]["p50"] > 0
+    assert "frames: 40 captured" in Pipeline.summary(stats)
+
+
+def test_inference_error_stops_pipeline():
+    def process(image):
+        raise ValueError("model failed")
+
+    pipeline = Pipeline(process, render=lambda image, results: image)
+    inference = threading.Thread(target=pipeline._infer)
+    inference.start()
+
+    pipeline._capture(FakeCapture(1000, interval=0.001))
+    inference.join(timeout=2)
+
+    assert isinstance(pipeline.error, ValueError)
+    assert pipeline.captured < 1000
+
+
+def test_process_gets_capture_timestamps():
+    seen = []
+    pipeline = Pipeline(lambda image, timestamp: seen.append(timestamp), render=lambda image, results: image,
+                        queue_size=10, timestamps=True)
+    inference = threading.Thread(target=pipeline._infer)
+    inference.start()
+    pipeline._capture(FakeCapture(5, interval=0.005))
+    inference.join()
+
+    assert seen
+    assert all(later > earlier for earlier, later in zip(seen, seen[1:]))
+
+
+def test_video_file_frames_are_timestamped_by_position(tmp_path):
+    path = str(tmp_path / "video.avi")
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), 10.0, (32, 24))
+    for i in range(5):
+        writer.write(np.full((24, 32, 3), 40 * i, dtype=np.uint8))
+    writer.release()
+
+    pipeline = Pipeline(lambda image: None, render=lambda image, results: image, source=path, queue_size=10)
+    pipeline._capture(pipeline._open())
+
+    timestamps = []
+    while True:
+        frame = pipeline.inference_queue.get(timeout=0.01)
+        if frame is None:
+            break
+        timestamps.append(frame.timestamp)
+    assert len(timestamps) == 5
+    # frames are read much faster than 10 fps, their timestamps are the source's
+    np.testing.assert_allclose(np.diff(timestamps), 0.1, atol=1e-3)
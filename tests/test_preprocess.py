@@ -0,0 +1,73 @@
+import cv2
+import numpy as np
+import pytest
+
+from frsystem.frs import FaceRecognitionSystem
+from frsystem.preprocess import FacePreprocessor, alignmentMatrices
+
+
+FEATURES = [{"left_eye": (60, 80), "right_eye": (110, 76), "nose": (85, 105)},
+            {"left_eye": (190, 60), "right_eye": (230, 70), "nose": (210, 85)}]
+
+
+@pytest.fixture
+def image():
+    rng = np.random.RandomState(0)
+    return cv2.GaussianBlur(rng.randint(0, 256, (240, 320, 3)).astype(np.uint8), (7, 7), 0)
+
+
+def test_alignment_matrices_match_rotation_matrix(image):
+    M = alignmentMatrices(image.shape, FEATURES[:1], 160)[0]
+    left, right = np.array(FEATURES[0]["left_eye"]), np.array(FEATURES[0]["right_eye"])
+    angle = np.degrees(np.arctan2(right[1] - left[1], right[0] - left[0]))
+    # 320x240 image: margin 0.2
+    scale = (0.65 - 0.35) * 160 / np.linalg.norm(right - left) + 0.2
+    center = tuple(float(c) for c in (left + right) // 2)
+
+    expected = cv2.getRotationMatrix2D(center, angle, scale)
+    expected[0, 2] += 80 - center[0]
+    expected[1, 2] += 0.35 * 160 - center[1]
+    np.testing.assert_allclose(M, expected, atol=1e-6)
+
+
+@pytest.mark.parametrize("interpolation", ["nearest", "linear", "cubic", "area"])
+def test_single_face_alignment_matches_batch(image, interpolation):
+    frs = FaceRecognitionSystem(embedding_model="facenet", interpolation=interpolation)
+    gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+
+    batch = frs.preprocessor(image, FEATURES).copy()
+
+    for i, (features, M) in enumerate(zip(FEATURES, alignmentMatrices(image.shape, FEATURES, 160))):
+        crop = cv2.warpAffine(gray, M, (160, 160), flags=frs.preprocessor.interpolation).astype(np.float32)
+        np.testing.assert_allclose(batch[i, ..., 0], (crop - crop.mean()) / crop.std(), atol=1e-4)
+
+        # the single face path warps the color image, then converts it to grayscale
+        aligned = cv2.cvtColor(frs.alignCropFace(image, facial_features=features), cv2.COLOR_RGB2GRAY)
+        assert np.abs(aligned.astype(int) - crop.astype(int)).max() <= 1
+
+
+def test_alignment_uses_configured_interpolation(image):
+    nearest = FaceRecognitionSystem(embedding_model="facenet", interpolation="nearest")
+    cubic = FaceRecognitionSystem(embedding_model="facenet", interpolation="cubic")
+    M = alignmentMatrices(image.shape, FEATURES[:1], 160)[0]
+
+    aligned = nearest.alignCropFace(image, facial_features=FEATURES[0])
+
+    np.testing.assert_array_equal(aligned, cv2.warpAffine(image, M, (160, 160), flags=cv2.INTER_NEAREST))
+    assert not np.array_equal(aligned, cubic.alignCropFace(image, facial_features=FEATURES[0]))
+
+
+def test_batch_of_images_matches_single_images(image):
+    preprocessor = FacePreprocessor(224)
+    flipped = np.ascontiguousarray(image[:, ::-1])
+
+    first = preprocessor(image, FEATURES).copy()
+    second = preprocessor(flipped, FEATURES[:1]).copy()
+    batch = preprocessor.batch([image, np.zeros_like(image), flipped], [FEATURES, [], FEATURES[:1]])
+
+    np.testing.assert_array_equal(batch, np.concatenate([first, second]))
+
+
+def test_invalid_face_size():
+    with pytest.raises(ValueError):
+        FacePreprocessor(128)
@@ -0,0 +1,101 @@
+import numpy as np
+import pytest
+
+from conftest import writeLinearModel
+from frsystem.quantize import splitFaces, embeddingGate, classifierGate, quantizeModel
+
+
+def face(name, i):
+    return (None, (0, 0, 10, 10), {"index": i}, name)
+
+
+def test_split_holds_out_faces_of_every_person():
+    faces = [face("alice", i) for i in range(4)] + [face("bob", i) for i in range(3)] + [face("carol", 0)]
+    calibration, evaluation = splitFaces(faces, holdout=0.5)
+
+    assert len(calibration) + len(evaluation) == len(faces)
+    assert not set(map(id, calibration)) & set(map(id, evaluation))
+    assert sorted(f[3] for f in evaluation) == ["alice", "alice", "bob"]
+    # a single face always calibrates
+    assert [f[3] for f in calibration].count("carol") == 1
+    assert {f[3] for f in calibration} == {"alice", "bob", "carol"}
+
+
+def test_split_without_holdout():
+    faces = [face("alice", i) for i in range(3)]
+    assert splitFaces(faces, holdout=0.0) == (faces, [])
+
+
+def enrolled(dim=8, people=4, seed=0):
+    rng = np.random.RandomState(seed)
+    centers = rng.randn(people, dim)
+    embeddings_dict = {ref_id: list(centers[ref_id] + 0.01 * rng.randn(3, dim)) for ref_id in range(people)}
+    return centers, embeddings_dict
+
+
+def test_embedding_gate_identical_models_pass():
+    centers, embeddings_dict = enrolled()
+    model = lambda x: np.asarray(x)
+    report = embeddingGate(model, model, centers, embeddings_dict, ids=[0, 1, 2, 3])
+
+    assert report["passed"]
+    assert report["agreement"] == 1.0
+    assert report["accuracy_fp32"] == report["accuracy_quantized"] == 1.0
+    assert report["distance_change_p95"] == 0.0
+    assert report["unknown_faces"] == 0
+
+
+def test_embedding_gate_fails_on_swapped_identities():
+    centers, embeddings_dict = enrolled()
+    report = embeddingGate(lambda x: np.asarray(x), lambda x: np.asarray(x)[::-1], centers, embeddings_dict)
+
+    assert not report["passed"]
+    assert report["agreement"] == 0.0
+
+
+def test_embedding_gate_leaves_unknown_people_out_of_accuracy():
+    centers, embeddings_dict = enrolled()
+    model = lambda x: np.asarray(x)
+    report = embeddingGate(model, model, centers, embeddings_dict, ids=[0, None, 2, None])
+
+    assert report["unknown_faces"] == 2
+    assert report["accuracy_fp32"] == 1.0
+    assert report["passed"]
+
+    with pytest.raises(AttributeError):
+        embeddingGate(model, model, centers, embeddings_dict, ids=[None] * 4)
+
+
+def test_classifier_gate():
+    probabilities = np.array([[0.9, 0.1], [0.2, 0.8], [0.6, 0.4]], dtype=np.float32)
+    assert classifierGate(lambda x: x, lambda x: x, probabilities)["passed"]
+
+    report = classifierGate(lambda x: x, lambda x: x[:, ::-1], probabilities)
+    assert not report["passed"]
+    assert report["agreement"] == 0.0
+
+
+@pytest.mark.parametrize("mode", ["dynamic", "static"])
+def test_quantize_model_passes_gate(tmp_path, mode):
+    pytest.importorskip("onnxruntime.quantization")
+    from frsystem.onnx_backend import OnnxPredictor
+
+    path, output = str(tmp_path / "model.onnx"), str(tmp_path / "model_int8.onnx")
+    writeLinearModel(path, 32, 2, softmax=True)
+    rng = np.random.RandomState(0)
+    calibration, inputs = rng.uniform(-1, 1, (16, 32, 32, 3)), rng.uniform(-1, 1, (16, 32, 32, 3))
+
+    assert quantizeModel(path, output, mode=mode, calibration=calibration) == output
+    report = classifierGate(OnnxPredictor(path), OnnxPredictor(output), inputs.astype(np.float32),
+                            min_agreement=0.9, max_probability_change=0.1)
+    assert report["passed"], report
+
+
+def test_static_quantization_needs_calibration(tmp_path):
+    pytest.importorskip("onnxruntime.quantization")
+    path = str(tmp_path / "model.onnx")
+    writeLinearModel(path, 32, 2)
+    with pytest.raises(AttributeError):
+        quantizeModel(path, str(tmp_path / "model_int8.onnx"), mode="static")
+    with pytest.raises(AttributeError):
+        quantizeModel(path, str(tmp_path / "model_int8.onnx"), mode="int4")
@@ -0,0 +1,135 @@
+import json
+
+import numpy as np
+import pytest
+
+from frsystem.store import EmbeddingStore, EmbeddingsView
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "faces")
+
+
+def test_append_and_reopen(path):
+    store = EmbeddingStore(path, dim=4)
+    store.addName(1, "alice")
+    store.append(1, np.ones((2, 4)))
+    store.append([2, 3], np.arange(8).reshape(2, 4))
+
+    reopened = EmbeddingStore(path, readonly=True)
+
+    assert len(reopened) == 4
+    assert reopened.names == {1: "alice"}
+    np.testing.assert_array_equal(reopened.ids, [1, 1, 2, 3])
+    np.testing.assert_array_equal(reopened.matrix[3], [4, 5, 6, 7])
+    assert {k: v.tolist() for k, v in reopened.rowsById().items()} == {1: [0, 1], 2: [2], 3: [3]}
+
+
+def test_crash_repair_drops_torn_row_and_record(path):
+    store = EmbeddingStore(path, dim=4)
+    store.addName(1, "alice")
+    store.append(1, np.ones((2, 4)))
+    # crash in the middle of the next enrollment
+    with open(store.matrix_file, "ab") as f:
+        f.write(np.zeros(4, dtype=np.float32).tobytes()[:6])
+    with open(store.log_file, "a") as f:
+        f.write('{"op": "name", "id": 2, "na')
+
+    repaired = EmbeddingStore(path)
+
+    assert len(repaired) == 2
+    assert repaired.names == {1: "alice"}
+    assert repaired.matrix.shape == (2, 4)
+    # the next records are appended after the last complete one
+    repaired.addName(2, "bob")
+    repaired.append(2, np.zeros(4))
+    reopened = EmbeddingStore(path, readonly=True)
+    assert reopened.names == {1: "alice", 2: "bob"}
+    np.testing.assert_array_equal(reopened.ids, [1, 1, 2])
+
+
+def test_row_without_id_is_invisible(path):
+    store = EmbeddingStore(path, dim=4)
+    store.append(1, np.ones(4))
+    with open(store.matrix_file, "ab") as f:
+        f.write(np.ones(4, dtype=np.float32).tobytes())
+
+    reader = EmbeddingStore(path, readonly=True)
+
+    assert len(reader) == 1
+
+
+def test_refresh_sees_names_and_rows_of_writer(path):
+    writer = EmbeddingStore(path, dim=4)
+    writer.addName(1, "alice")
+    writer.append(1, np.ones(4))
+    reader = EmbeddingStore(path, readonly=True)
+    assert reader.refresh() is False
+
+    writer.begin()
+    writer.addName(2, "bob")
+    writer.append(2, np.full((2, 4), 2.0))
+    writer.commit()
+
+    assert reader.refresh() is True
+    assert reader.names == {1: "alice", 2: "bob"}
+    np.testing.assert_array_equal(reader.ids, [1, 2, 2])
+    assert reader.refresh() is False
+
+    writer.addName(3, "carol")
+    assert reader.refresh() is True
+    assert reader.names[3] == "carol"
+    assert len(reader) == 3
+
+
+def test_refresh_waits_for_a_complete_log_record(path):
+    writer = EmbeddingStore(path, dim=4)
+    reader = EmbeddingStore(path, readonly=True)
+    record = json.dumps({"op": "name", "id": 1, "name": "alice"}) + "\n"
+
+    with open(writer.log_file, "a") as f:
+        f.write(record[:10])
+    assert reader.refresh() is False
+    assert reader.names == {}
+
+    with open(writer.log_file, "a") as f:
+        f.write(record[10:])
+    assert reader.refresh() is True
+    assert reader.names == {1: "alice"}
+
+
+def test_transaction_rollback(path):
+    store = EmbeddingStore(path, dim=4)
+    store.begin()
+    store.addName(1, "alice")
+    store.append(1, np.ones(4))
+    assert store.pending(1)
+    store.rollback()
+
+    assert store.names == {}
+    assert len(store) == 0
+    assert EmbeddingStore(path, readonly=True).names == {}
+
+
+def test_embeddings_view(path):
+    store = EmbeddingStore(path, dim=2)
+    view = EmbeddingsView(store)
+    view[1] = [np.zeros(2)]
+    view[1] += [np.ones(2)]
+
+    assert len(store) == 2
+    assert list(view) == [1]
+    with pytest.raises(ValueError):
+        view[1] = []
+    with pytest.raises(KeyError):
+        view[2]
+
+
+def test_readonly(path):
+    EmbeddingStore(path, dim=2)
+    reader = EmbeddingStore(path, readonly=True)
+    with pytest.raises(PermissionError):
+        reader.append(1, np.zeros(2))
+    with pytest.raises(FileNotFoundError):
+        EmbeddingStore(path + "_missing", readonly=True)
@@ -0,0 +1,90 @@
+import threading
+
+import numpy as np
+
+from frsystem.pipeline import Frame
+from frsystem.streams import MultiStreamRunner
+
+
+def runner(n_streams, max_batch_frames=None, process_batch=None):
+    process_batch = process_batch or (lambda frames: [frame.stream for frame in frames])
+    return MultiStreamRunner(["camera {}".format(i) for i in range(n_streams)], process_batch,
+                             max_batch_frames=max_batch_frames)
+
+
+def put(runner, stream_index, index=0):
+    frame = Frame(index, np.zeros((2, 2, 3), dtype=np.uint8), 0.0)
+    frame.stream = stream_index
+    runner.streams[stream_index].queue.put(frame)
+
+
+def test_batch_takes_the_newest_frame_of_every_stream():
+    multi = runner(3)
+    for index in range(3):
+        put(multi, 0, index)
+    put(multi, 2)
+
+    frames = multi._collect()
+
+    assert [(frame.stream, frame.index) for frame in frames] == [(0, 2), (2, 0)]
+    assert multi.streams[0].queue.dropped == 2
+
+
+def test_small_batches_serve_every_stream_in_turn():
+    multi = runner(4, max_batch_frames=2)
+    served = []
+    for _ in range(6):
+        # every camera always has a new frame
+        for stream_index in range(4):
+            put(multi, stream_index)
+        served.append([frame.stream for frame in multi._collect()])
+
+    assert served == [[0, 1], [2, 3], [0, 1], [2, 3], [0, 1], [2, 3]]
+
+
+def test_busy_stream_does_not_starve_the_others():
+    multi = runner(3, max_batch_frames=1)
+    counts = np.zeros(3, dtype=int)
+    for step in range(30):
+        put(multi, 0, step)
+        if step % 3 == 0:
+            put(multi, 1, step)
+            put(multi, 2, step)
+        counts[[frame.stream for frame in multi._collect()]] += 1
+
+    assert counts[1] > 0 and counts[2] > 0
+    assert counts.sum() == 30
+
+
+def test_inference_loop_processes_pending_frames_then_ends():
+    multi = runner(2)
+    put(multi, 0)
+    put(multi, 1)
+    for stream in multi.streams:
+        stream.finished = True
+    multi._ready.set()
+
+    thread = threading.Thread(target=multi._infer)
+    thread.start()
+    thread.join(timeout=2)
+
+    assert not thread.is_alive()
+    assert [stream.processed for stream in multi.streams] == [1, 1]
+    assert [stream.last[1] for stream in multi.streams] == [0, 1]
+    stats = multi.stats()
+    assert stats["batches"] == 1 and stats["frames_per_batch"] == 2
+    assert "camera 1: 0 captured, 1 processed" in MultiStreamRunner.summary(stats)
+
+
+def test_process_error_is_kept():
+    def fail(frames):
+        raise RuntimeError("model failed")
+
+    multi = runner(1, process_batch=fail)
+    put(multi, 0)
+    multi._ready.set()
+
+    multi._infer()
+
+    assert isinstance(multi.error, RuntimeError)
+    assert multi.stopped.is_set()
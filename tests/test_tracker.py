@@ -0,0 +1,74 @@
+import numpy as np
+
+from frsystem.tracker import FaceTracker, cornerBoxes
+
+
+def test_corner_boxes():
+    np.testing.assert_array_equal(cornerBoxes([[10, 20, 30, 40]]), [[10, 20, 40, 60]])
+
+
+def test_moving_faces_keep_their_track():
+    tracker = FaceTracker()
+    ids = []
+    for step in range(10):
+        # two faces moving in opposite directions, returned in a changing order
+        boxes = [[100 + 8 * step, 50, 40, 40], [300 - 8 * step, 60, 40, 40]]
+        tracks = tracker.update(boxes if step % 2 == 0 else boxes[::-1])
+        ids.append([track.track_id for track in (tracks if step % 2 == 0 else tracks[::-1])])
+
+    assert all(frame_ids == [0, 1] for frame_ids in ids)
+    np.testing.assert_allclose(tracker.tracks[0].velocity, [8, 0], atol=0.1)
+
+
+def test_velocity_predicts_box_after_missed_frames():
+    tracker = FaceTracker()
+    for step in range(5):
+        tracker.update([[20 * step, 0, 50, 50]])
+    tracker.update([])
+    tracker.update([])
+
+    # the face moved 60 pixels in 3 frames: only the motion-predicted box overlaps it
+    track = tracker.update([[20 * 7, 0, 50, 50]])[0]
+
+    assert track.track_id == 0
+    assert track.missed == 0
+
+
+def test_lost_tracks_are_removed():
+    tracker = FaceTracker(max_missed=2)
+    first = tracker.update([[0, 0, 50, 50]])[0]
+    for _ in range(3):
+        tracker.update([])
+
+    assert tracker.tracks == []
+    assert tracker.update([[0, 0, 50, 50]])[0].track_id != first.track_id
+
+
+def test_each_detection_matches_one_track():
+    tracker = FaceTracker()
+    tracker.update([[0, 0, 50, 50]])
+
+    tracks = tracker.update([[2, 0, 50, 50], [4, 0, 50, 50]])
+
+    assert tracks[0].track_id == 0
+    assert tracks[1].track_id == 1
+
+
+def test_identity_is_reused_until_refresh_or_big_move():
+    tracker = FaceTracker(refresh_interval=5, reidentify_iou=0.5)
+    track = tracker.update([[0, 0, 50, 50]])[0]
+    assert tracker.needIdentity([track]) == [track]
+    tracker.setIdentity(track, "alice", 0.9)
+
+    for step in range(1, 5):
+        assert tracker.needIdentity(tracker.update([[step, 0, 50, 50]])) == []
+    assert tracker.reuses == 4
+    # refresh interval reached
+    assert tracker.needIdentity(tracker.update([[5, 0, 50, 50]])) == [track]
+
+    tracker.setIdentity(track, "alice", 0.9)
+    assert tracker.needIdentity(tracker.update([[15, 0, 50, 50]])) == []
+    # moved far from the box it was identified on
+    assert tracker.needIdentity(tracker.update([[30, 0, 50, 50]])) == [track]
+    assert track.identity == "alice"
+    assert tracker.identifications == 2
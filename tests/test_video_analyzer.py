@@ -0,0 +1,97 @@
+import io
+import json
+import os
+import subprocess
+import sys
+
+import cv2
+import numpy as np
+import pytest
+
+from conftest import writeConstantDetector, writeLinearModel
+from frsapp.video_analyzer import readFrames, analyzeVideo
+
+FPS = 10.0
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def video(tmp_path):
+    """
+    20 frames of 10 fps video whose pixels all hold the frame index * 10.
+    """
+    path = str(tmp_path / "video.avi")
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), FPS, (160, 120))
+    for i in range(20):
+        writer.write(np.full((120, 160, 3), 10 * i, dtype=np.uint8))
+    writer.release()
+    return path
+
+
+def frameValue(frame):
+    return int(round(frame.mean() / 10.0))
+
+
+def test_read_frames(video):
+    frames = list(readFrames(video))
+    assert [index for index, _, _ in frames] == list(range(20))
+    assert [frameValue(frame) for _, _, frame in frames] == list(range(20))
+    np.testing.assert_allclose([timestamp for _, timestamp, _ in frames], np.arange(20) / FPS)
+
+
+def test_read_frames_stride_start_end(video):
+    frames = list(readFrames(video, start=0.5, end=1.5, stride=3))
+    assert [index for index, _, _ in frames] == [5, 8, 11, 14]
+    # skipped frames are grabbed: the decoded frames are the right ones
+    assert [frameValue(frame) for _, _, frame in frames] == [5, 8, 11, 14]
+    np.testing.assert_allclose([timestamp for _, timestamp, _ in frames], [0.5, 0.8, 1.1, 1.4])
+
+
+def test_read_frames_rejects_invalid_stride(video):
+    with pytest.raises(AttributeError):
+        list(readFrames(video, stride=0))
+
+
+def test_command_line_rejects_invalid_stride(video):
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    result = subprocess.run([sys.executable, os.path.join("frsapp", "video_analyzer.py"), video, "--stride", "0"],
+                            cwd=ROOT, env=env, capture_output=True, text=True)
+    assert result.returncode == 2
+    assert "--stride must be at least 1" in result.stderr
+
+
+def test_analyze_video_writes_one_json_line_per_face(video, tmp_path):
+    pytest.importorskip("onnxruntime")
+    from frsystem.frs import FaceRecognitionSystem
+    from frsystem.gallery import GalleryIndex
+    from frsystem.mask import MaskClassifier
+
+    detector_path, embedding_path, mask_path = (str(tmp_path / name) for name in ("detector.onnx", "facenet.onnx", "mask.onnx"))
+    writeConstantDetector(detector_path, [[0.1, 0.9]], [[0.25, 0.2, 0.75, 0.8]], input_size=(640, 480))
+    writeLinearModel(embedding_path, 160, 128)
+    writeLinearModel(mask_path, 299, 2, softmax=True)
+
+    frs = FaceRecognitionSystem(embedding_model="facenet", weights=embedding_path, engine="onnx",
+                                detector="ultralight", detector_path=detector_path,
+                                db_file=str(tmp_path / "db.pkl"), embeddings_file=str(tmp_path / "embeddings.pkl"))
+    # the face of the first frame is enrolled
+    _, _, first = next(readFrames(video))
+    image = cv2.cvtColor(first, cv2.COLOR_BGR2RGB)
+    detections = frs.detect(image)
+    embedding = frs.faceEmbeddingsBatch([image], [detections.features])[0][0]
+    with frs.connection.batch():
+        ref_id = frs.connection.generateFaceID("alice")
+        frs.embeddings[ref_id] = [embedding]
+
+    output = io.StringIO()
+    n_frames, n_faces = analyzeVideo(frs, GalleryIndex.fromDatabase(frs.connection), MaskClassifier(mask_path),
+                                     video, output, end=0.95, stride=2, batch_size=3)
+
+    records = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert (n_frames, n_faces) == (5, 5)
+    assert [record["frame"] for record in records] == [0, 2, 4, 6, 8]
+    assert [record["timestamp"] for record in records] == [0.0, 0.2, 0.4, 0.6, 0.8]
+    assert all(record["video"] == video and record["box"] == [40, 24, 80, 72] for record in records)
+    assert all(0.0 <= record["mask"] <= 1.0 and record["distance"] >= 0.0 for record in records)
+    assert records[0]["identity"] == "alice" and records[0]["id"] == ref_id
+    assert records[0]["distance"] == pytest.approx(0.0, abs=1e-4)